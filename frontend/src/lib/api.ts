@@ -3,7 +3,7 @@ export const API_BASE =
 
 async function unwrapResponseJson(res: Response) {
 	const data = await res.json();
-	// API Gateway non-proxy may return {"statusCode", "headers", "body": "<json string>"}
+	// Older non-proxy deployments return {"statusCode", "headers", "body": "<json string>"}
 	if (data && typeof data.body === "string") {
 		try {
 			const inner = JSON.parse(data.body);
@@ -15,18 +15,46 @@ async function unwrapResponseJson(res: Response) {
 	return data;
 }
 
-export async function fetchPatches() {
-	console.log("fetching patches");
+// Run several actions in a single /invoke round trip. Returns the keyed result
+// map: { [action]: { status, elapsedMs, body } }.
+export async function invokeBatch(actions: string[]) {
 	const res = await fetch(`${API_BASE}/invoke`, {
 		method: "POST",
 		headers: { "Content-Type": "application/json" },
-		body: JSON.stringify({ action: "list_patches" }),
+		body: JSON.stringify({ actions }),
 	});
-	// console.log(await res.json());
-	if (!res.ok) throw new Error("Failed to fetch patches");
+	if (!res.ok) throw new Error("Batch request failed");
+	const data = await unwrapResponseJson(res);
+	return data?.results ?? {};
+}
+
+// Cached GET read route; repeat calls within the cache TTL don't reach Lambda
+async function getRoute(path: string, errorMessage: string) {
+	const res = await fetch(`${API_BASE}${path}`);
+	if (!res.ok) throw new Error(errorMessage);
 	return unwrapResponseJson(res);
 }
 
+export async function fetchDashboard() {
+	// GET /dashboard runs list_patches, list_assets and summary as one batch
+	const { results = {} } = await getRoute("/dashboard", "Failed to fetch dashboard");
+	return {
+		patches: results.list_patches?.body?.patches ?? [],
+		assets: results.list_assets?.body?.assets ?? [],
+		summary: results.summary?.body?.summary ?? null,
+	};
+}
+
+// The list routes leave out patch descriptions unless asked; the queue shows them
+const PATCH_QUEUE_FIELDS = [
+	"patchId", "cve", "severity", "status", "impactScore", "kev", "epssPercentile",
+	"vendor", "product", "createdAt", "updatedAt", "description",
+].join(",");
+
+export async function fetchPatches() {
+	return getRoute(`/patches?fields=${PATCH_QUEUE_FIELDS}`, "Failed to fetch patches");
+}
+
 export async function runSandbox(patchId: string) {
 	const res = await fetch(`${API_BASE}/invoke`, {
 		method: "POST",
@@ -48,33 +76,13 @@ export async function prioritize(cve_info: string) {
 }
 
 export async function fetchEvents() {
-	console.log("fetching events");
-	const res = await fetch(`${API_BASE}/invoke`, {
-		method: "POST",
-		headers: { "Content-Type": "application/json" },
-		body: JSON.stringify({ action: "list_events" }),
-	});
-    console.log(await res.json());
-	if (!res.ok) throw new Error("Failed to fetch events");
-	return unwrapResponseJson(res);
+	return getRoute("/events", "Failed to fetch events");
 }
 
 export async function fetchCompliance() {
-	const res = await fetch(`${API_BASE}/invoke`, {
-		method: "POST",
-		headers: { "Content-Type": "application/json" },
-		body: JSON.stringify({ action: "list_compliance" }),
-	});
-	if (!res.ok) throw new Error("Failed to fetch compliance");
-	return unwrapResponseJson(res);
+	return getRoute("/compliance", "Failed to fetch compliance");
 }
 
 export async function fetchAssets() {
-	const res = await fetch(`${API_BASE}/invoke`, {
-		method: "POST",
-		headers: { "Content-Type": "application/json" },
-		body: JSON.stringify({ action: "list_assets" }),
-	});
-	if (!res.ok) throw new Error("Failed to fetch assets");
-	return unwrapResponseJson(res);
+	return getRoute("/assets", "Failed to fetch assets");
 }
@@ -4,23 +4,25 @@ import StatCard from "@/components/StatCard";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
 import UpcomingDeployment from "@/components/UpcomingDeployment";
-import { fetchAssets, fetchPatches } from "@/lib/api";
+import { fetchDashboard } from "@/lib/api";
 import { DeploymentItem, PatchItem, StatCardProps } from "@/types/dashboard";
 import { useQuery } from "@tanstack/react-query";
 import { Play, RotateCcw } from "lucide-react";
 
 const DashboardView = () => {
-	const { data: assetsData } = useQuery({
-		queryKey: ["assets"],
-		queryFn: fetchAssets,
+	// Patches and assets arrive together from one batched request
+	const { data, isLoading, error } = useQuery({
+		queryKey: ["dashboard"],
+		queryFn: fetchDashboard,
 	});
 
-	const assetCount = (assetsData?.assets ?? []).length;
+	const assetCount = (data?.assets ?? []).length;
+	const criticalCount = data?.summary?.bySeverity?.CRITICAL ?? 0;
 
 	const stats: StatCardProps[] = [
 		{
 			title: "Critical Patches",
-			value: "18",
+			value: String(criticalCount),
 			subtitle: "Requires immediate attention",
 		},
 		{
@@ -40,10 +42,6 @@ const DashboardView = () => {
 		},
 	];
 
-	const { data, isLoading, error } = useQuery({
-		queryKey: ["patches"],
-		queryFn: fetchPatches,
-	});
 	// Normalize backend patch items to the frontend PatchItem shape
 	const rawPatches = data?.patches ?? [];
 	const patches: PatchItem[] = rawPatches.map((p: any, idx: number) => {
@@ -0,0 +1,224 @@
+"""Benchmark lambda_handler actions against the in-memory fake backend.
+
+Fills the patches, assets and events tables at each size, then drives every
+action through agent.lambda_handler and records p50/p95/p99 latency, peak
+traced memory and backend calls per invocation.
+
+Usage:
+  python scripts/benchmark_actions.py
+  python scripts/benchmark_actions.py --sizes 1000,100000 --iterations 100 --latency-ms 5
+
+Results are written as JSON (see --output) so runs can be compared. The
+sandbox action's fixed one second sleep is skipped so its data-dependent
+cost is visible.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import types
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'super_hacks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import agent  # noqa: E402
+import patch_state  # noqa: E402
+import tools  # noqa: E402
+from scripts.bulk_load import generate_assets, generate_events, generate_patches, summary_item  # noqa: E402
+from tests.fakes import FakeBackend, text_response, tool_use_response  # noqa: E402
+
+ACTIONS = ['list_patches', 'prioritize', 'run_sandbox', 'list_events', 'list_compliance', 'prompt']
+DEFAULT_SIZES = '1000,100000,1000000'
+COMPLIANCE_REPORTS = 20
+# Statuses run_sandbox accepts; finished runs stay in them, so patches can be rerun
+SANDBOX_STATUSES = frozenset(patch_state.sources_of('SANDBOX_TESTING'))
+
+
+def seed_backend(size, seed, faults, patches=None):
+    """Seed a fake backend; ``patches`` (from generate_patches) is generated when not given."""
+    if patches is None:
+        patches = list(generate_patches(size, size, seed))
+    backend = FakeBackend(seed=seed)
+    backend.load('PATCHES_TABLE_NAME', patches)
+    backend.load('ASSETS_TABLE_NAME', generate_assets(size, seed))
+    backend.load('EVENTS_TABLE_NAME', generate_events(size, size, seed))
+    backend.load('SUMMARY_TABLE_NAME', [summary_item(patches)])
+    for i in range(COMPLIANCE_REPORTS):
+        body = json.dumps({'framework': f'framework-{i}', 'status': 'COMPLIANT', 'controls': 100 + i})
+        backend.s3.put_object(Bucket=backend.environ['COMPLIANCE_BUCKET_NAME'],
+                              Key=f'reports/framework-{i}.json', Body=body)
+    # Prompts ask for a tool first and answer once the tool result comes back
+    backend.bedrock.default = _bedrock_responder
+    for service, config in faults.items():
+        backend.faults.configure(service, **config)
+    backend.faults.reset_counters()
+    return backend
+
+
+def sandbox_patch_ids(patches) -> list:
+    """IDs of seeded patches run_sandbox accepts, so runs measure the real path, not rejections."""
+    return [p['patchId'] for p in patches if p['status'] in SANDBOX_STATUSES]
+
+
+def _bedrock_responder(request):
+    for message in request.get('messages', []):
+        if any('toolResult' in block for block in message.get('content', [])):
+            return text_response('Here is a summary of the pending patches.')
+    return tool_use_response('list_patches', {'limit': 50})
+
+
+def _request(action, rng, patch_ids):
+    if action == 'prompt':
+        body = {'prompt': 'Which critical patches should we roll out first and why?'}
+    elif action == 'prioritize':
+        body = {'action': 'prioritize', 'cve_info': 'CVE-2024-0001'}
+    elif action == 'run_sandbox':
+        body = {'action': 'run_sandbox', 'patch_id': rng.choice(patch_ids)}
+    else:
+        body = {'action': action}
+    return {'httpMethod': 'POST', 'body': json.dumps(body)}
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return round(ordered[rank], 3)
+
+
+@contextlib.contextmanager
+def _no_sandbox_delay():
+    # Give tools a private copy of the time module whose sleep returns at once
+    fast_time = types.ModuleType('time')
+    fast_time.__dict__.update(time.__dict__)
+    fast_time.sleep = lambda seconds: None
+    original, tools.time = tools.time, fast_time
+    try:
+        yield
+    finally:
+        tools.time = original
+
+
+def bench_action(backend, action, patch_ids, iterations, warmup, memory_iterations, rng):
+    for _ in range(warmup):
+        agent.lambda_handler(_request(action, rng, patch_ids), None)
+
+    backend.faults.reset_counters()
+    timings, errors = [], 0
+    for _ in range(iterations):
+        event = _request(action, rng, patch_ids)
+        start = time.perf_counter()
+        resp = agent.lambda_handler(event, None)
+        timings.append((time.perf_counter() - start) * 1000)
+        if resp.get('statusCode') != 200 or '"status":"error"' in resp.get('body', ''):
+            errors += 1
+    stats = backend.faults.stats()
+
+    # Traced runs are slower, so memory is measured separately from latency
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            agent.lambda_handler(_request(action, rng, patch_ids), None)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(timings)
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'p50Ms': _percentile(ordered, 50),
+        'p95Ms': _percentile(ordered, 95),
+        'p99Ms': _percentile(ordered, 99),
+        'meanMs': round(sum(ordered) / len(ordered), 3),
+        'maxMs': round(ordered[-1], 3),
+        'peakMemoryKiB': round(peak / 1024, 1),
+        'callsPerInvocation': {k: round(v / iterations, 2) for k, v in sorted(stats['calls'].items())},
+        'bytesPerInvocation': {k: round(v / iterations) for k, v in sorted(stats['bytes'].items())},
+        'throttles': stats['throttles'],
+    }
+
+
+def run_size(size, args, faults):
+    print(f'Seeding {size} patches, assets and events...', file=sys.stderr)
+    started = time.perf_counter()
+    patches = list(generate_patches(size, size, args.seed))
+    backend = seed_backend(size, args.seed, faults, patches)
+    load_seconds = time.perf_counter() - started
+    rng = random.Random(args.seed)
+    patch_ids = sandbox_patch_ids(patches)
+    del patches
+    results = {}
+    with backend.install(), _no_sandbox_delay():
+        for action in args.actions:
+            print(f'  {action}...', file=sys.stderr)
+            # Handlers print freely; keep that out of the timings and the report
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                results[action] = bench_action(backend, action, patch_ids, args.iterations, args.warmup,
+                                               args.memory_iterations, rng)
+    return {'size': size, 'loadSeconds': round(load_seconds, 2), 'actions': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='Comma-separated item counts per table (default: %(default)s)')
+    parser.add_argument('--actions', default=','.join(ACTIONS),
+                        help='Comma-separated actions to run (default: all)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--memory-iterations', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Injected latency per DynamoDB and S3 call')
+    parser.add_argument('--bedrock-latency-ms', type=float, default=0.0,
+                        help='Injected latency per Bedrock converse call')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Probability a DynamoDB call is throttled')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_actions.json')
+    parser.add_argument('--verbose', action='store_true', help='Keep handler output')
+    args = parser.parse_args(argv)
+    args.actions = [a for a in args.actions.split(',') if a]
+    unknown = set(args.actions) - set(ACTIONS)
+    if unknown:
+        parser.error(f'unknown actions: {", ".join(sorted(unknown))}')
+
+    faults = {
+        'dynamodb': {'latency_ms': args.latency_ms, 'throttle_rate': args.throttle_rate},
+        's3': {'latency_ms': args.latency_ms},
+        'bedrock': {'latency_ms': args.bedrock_latency_ms},
+    }
+    report = {
+        'generatedAt': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'iterations': args.iterations, 'warmup': args.warmup, 'seed': args.seed,
+                   'faults': faults, 'sandboxDelaySkipped': True},
+        'results': [run_size(int(s), args, faults) for s in args.sizes.split(',') if s],
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for result in report['results']:
+        print(f"\n{result['size']} items (seeded in {result['loadSeconds']}s)")
+        print(f"{'action':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>12}  calls/invocation")
+        for action, r in result['actions'].items():
+            calls = ', '.join(f'{k.split(".")[1]}={v:g}' for k, v in r['callsPerInvocation'].items())
+            print(f"{action:<16}{r['p50Ms']:>10}{r['p95Ms']:>10}{r['p99Ms']:>10}{r['peakMemoryKiB']:>12}  {calls}")
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
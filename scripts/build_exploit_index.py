@@ -0,0 +1,45 @@
+"""Build the exploit intelligence index from KEV and EPSS snapshot files.
+
+Functions given EXPLOIT_INTEL_INDEX map a prebuilt index instead of parsing
+the EPSS CSV (a quarter of a million rows) on every cold start.
+
+Usage:
+  curl -o kev.json https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json
+  curl -o epss.csv.gz https://epss.empiricalsecurity.com/epss_scores-current.csv.gz
+  python scripts/build_exploit_index.py --kev kev.json --epss epss.csv.gz --out exploit_intel.idx
+  aws s3 cp exploit_intel.idx s3://<bucket>/exploit-intel/exploit_intel.idx
+
+Sources may also be s3://bucket/key locations.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'super_hacks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import exploit_intel  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--kev', help='CISA KEV catalogue (JSON or CSV)')
+    parser.add_argument('--epss', help='EPSS scores CSV, optionally gzipped')
+    parser.add_argument('--out', required=True, help='Index file to write')
+    args = parser.parse_args(argv)
+    if not (args.kev or args.epss):
+        parser.error('give --kev, --epss or both')
+
+    started = time.perf_counter()
+    index = exploit_intel.build_from_sources(args.kev, args.epss)
+    index.save(args.out)
+    print(f"Indexed {len(index)} CVEs ({index.header['kev']} in KEV, {index.header['epss']} with EPSS) "
+          f"into {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB, {time.perf_counter() - started:.1f}s)")
+    return index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+"""Generate and bulk-load realistic synthetic patches, assets and events.
+
+Data is generated deterministically from --seed: patches carry CVSS-derived
+severities, a vendor/product/fixed version and the assets they affect;
+assets carry a CPE 2.3 software inventory and a maintenance window; events
+reference patches. Items are written with parallel BatchWriteItem workers
+that retry unprocessed items and throttling errors with jittered backoff,
+and the dashboard summary item is written to match the loaded patches.
+
+Usage:
+  # Generate straight into the tables named by *_TABLE_NAME
+  python scripts/bulk_load.py load --patches 500000 --assets 200000 --events 1000000
+  # Write the same dataset to compressed NDJSON, then load it later
+  python scripts/bulk_load.py dump --patches 500000 --assets 200000 --out seed-data/
+  python scripts/bulk_load.py load --from seed-data/ --workers 16
+
+Supports DynamoDB Local by setting DYNAMODB_ENDPOINT_URL.
+"""
+import argparse
+import gzip
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'super_hacks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import patch_state  # noqa: E402
+import summary  # noqa: E402
+from event_archive import expires_at  # noqa: E402
+from responses import to_jsonable  # noqa: E402
+
+BATCH_SIZE = 25
+MAX_AFFECTED_ASSETS = 200
+THROTTLE_CODES = {'ProvisionedThroughputExceededException', 'ThrottlingException',
+                  'RequestLimitExceeded', 'InternalServerError'}
+EPOCH = datetime(2024, 1, 1)
+
+# (vendor, product, versions) used for both asset inventories and patches
+CATALOG = [
+    ('apache', 'http_server', ['2.4.52', '2.4.57', '2.4.58']),
+    ('apache', 'log4j', ['2.14.1', '2.17.1', '2.20.0']),
+    ('nginx', 'nginx', ['1.20.2', '1.22.1', '1.24.0']),
+    ('openssl', 'openssl', ['1.1.1w', '3.0.12', '3.1.4']),
+    ('microsoft', 'windows_server_2019', ['10.0.17763.4737', '10.0.17763.5122']),
+    ('microsoft', 'exchange_server', ['15.2.1118', '15.2.1258']),
+    ('microsoft', 'sql_server', ['15.0.4312', '16.0.4085']),
+    ('oracle', 'mysql', ['8.0.33', '8.0.35', '8.2.0']),
+    ('postgresql', 'postgresql', ['13.12', '14.9', '15.5']),
+    ('redis', 'redis', ['6.2.13', '7.0.14', '7.2.3']),
+    ('vmware', 'esxi', ['7.0.3', '8.0.1']),
+    ('cisco', 'ios_xe', ['17.6.5', '17.9.4']),
+    ('fortinet', 'fortios', ['7.0.12', '7.2.6']),
+    ('openbsd', 'openssh', ['8.9p1', '9.3p1', '9.6p1']),
+    ('linux', 'linux_kernel', ['5.15.0', '6.1.0', '6.5.0']),
+    ('docker', 'docker', ['20.10.24', '24.0.7']),
+    ('kubernetes', 'kubernetes', ['1.26.9', '1.27.6', '1.28.3']),
+    ('jenkins', 'jenkins', ['2.414.3', '2.426.1']),
+    ('google', 'chrome', ['119.0.6045', '120.0.6099']),
+    ('mozilla', 'firefox', ['119.0', '120.0.1']),
+]
+OPERATING_SYSTEMS = ['ubuntu-20.04', 'ubuntu-22.04', 'rhel-8', 'rhel-9', 'windows-2019', 'windows-2022']
+ENVIRONMENTS = [('production', 5), ('staging', 2), ('development', 2), ('dr', 1)]
+CRITICALITY = [('high', 2), ('medium', 5), ('low', 3)]
+STATUSES = [('PENDING', 40), ('ANALYZED', 30), ('SANDBOX_PASSED', 15), ('SANDBOX_FAILED', 5),
+            ('SANDBOX_TESTING', 2), ('DEPLOYED', 8)]
+DAYS = ['SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT']
+WEAKNESSES = ['buffer overflow', 'SQL injection', 'remote code execution', 'privilege escalation',
+              'cross-site scripting', 'path traversal', 'deserialization of untrusted data',
+              'authentication bypass', 'denial of service', 'information disclosure']
+EVENT_SOURCES = [('cve_ingest', 4), ('prioritize', 3), ('sandbox', 3)]
+
+
+def _weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], [w for _, w in choices])[0]
+
+
+def severity_for(cvss: float) -> str:
+    """CVSS v3 qualitative rating."""
+    if cvss >= 9.0:
+        return 'CRITICAL'
+    if cvss >= 7.0:
+        return 'HIGH'
+    if cvss >= 4.0:
+        return 'MEDIUM'
+    return 'LOW'
+
+
+def cpe(vendor: str, product: str, version: str) -> str:
+    return f'cpe:2.3:a:{vendor}:{product}:{version}:*:*:*:*:*:*:*'
+
+
+def generate_assets(count: int, seed: int = 42):
+    """Yield ``count`` assets with software inventories, deterministic for ``seed``."""
+    rng = random.Random(f'assets-{seed}')
+    for i in range(count):
+        software = []
+        for vendor, product, versions in rng.sample(CATALOG, rng.randint(3, 12)):
+            version = rng.choice(versions)
+            software.append({'cpe': cpe(vendor, product, version), 'vendor': vendor,
+                             'product': product, 'version': version})
+        environment = _weighted(rng, ENVIRONMENTS)
+        yield {
+            'assetId': f'a-{i:08d}',
+            'hostname': f'{environment[:4]}-{rng.choice(["web", "db", "app", "edge", "batch"])}-{i}.corp.example.com',
+            'os': rng.choice(OPERATING_SYSTEMS),
+            'environment': environment,
+            'businessCriticality': _weighted(rng, CRITICALITY),
+            'owner': f'team-{rng.randint(1, 40):02d}',
+            'software': software,
+            'maintenanceWindow': {'day': rng.choice(DAYS), 'startHour': rng.choice([0, 1, 2, 3, 22, 23]),
+                                  'hours': rng.choice([2, 4, 6])},
+        }
+
+
+def _patch_identity(i: int, seed: int):
+    """CVE and catalog entry of generated patch ``i``, independent of the rest of the stream."""
+    vendor, product, versions = CATALOG[zlib.crc32(f'{seed}-{i}'.encode()) % len(CATALOG)]
+    year = (EPOCH + timedelta(seconds=i * 37)).year
+    return f'CVE-{year}-{10000 + i}', vendor, product, versions
+
+
+def patch_id_at(i: int, seed: int = 42) -> str:
+    """The patchId generate_patches gives patch ``i``: the deterministic key ingest would use."""
+    cve, _, product, _ = _patch_identity(i, seed)
+    return patch_state.patch_id_for(cve, product)
+
+
+def generate_patches(count: int, asset_count: int = 0, seed: int = 42):
+    """Yield ``count`` patches; each affects a sample of the first ``asset_count`` assets."""
+    rng = random.Random(f'patches-{seed}')
+    for i in range(count):
+        cve, vendor, product, versions = _patch_identity(i, seed)
+        cvss = round(min(10.0, max(0.1, rng.gauss(6.8, 1.9))), 1)
+        weakness = rng.choice(WEAKNESSES)
+        created = EPOCH + timedelta(seconds=i * 37 + rng.randint(0, 36))
+        status = _weighted(rng, STATUSES)
+        item = {
+            'patchId': patch_state.patch_id_for(cve, product),
+            'cve': cve,
+            'description': (f'A {weakness} vulnerability in {vendor} {product} before '
+                            f'{versions[-1]} allows attackers to compromise affected systems.'),
+            'severity': severity_for(cvss),
+            'cvss': Decimal(str(cvss)),
+            'vendor': vendor,
+            'product': product,
+            'fixedVersion': versions[-1],
+            'status': status,
+            'createdAt': created.isoformat() + 'Z',
+            'updatedAt': created.isoformat() + 'Z',
+        }
+        if asset_count:
+            # Most patches touch a handful of assets, a few touch many
+            k = min(asset_count, MAX_AFFECTED_ASSETS, int(rng.paretovariate(1.5)) * 3)
+            item['affectedAssets'] = [f'a-{n:08d}' for n in sorted(rng.sample(range(asset_count), k))]
+        if status != 'PENDING':
+            item['impactScore'] = rng.randint(50, 95)
+        yield item
+
+
+def generate_events(count: int, patch_count: int = 1, seed: int = 42):
+    """Yield ``count`` pipeline events spread over time, each about a patch."""
+    rng = random.Random(f'events-{seed}')
+    now = time.time()
+    for i in range(count):
+        source = _weighted(rng, EVENT_SOURCES)
+        patch_id = patch_id_at(rng.randrange(max(1, patch_count)), seed)
+        yield {
+            'eventId': f'e-{i:09d}',
+            'timestamp': (EPOCH + timedelta(seconds=i * 11)).isoformat() + 'Z',
+            'source': source,
+            'message': f'{source} event for {patch_id}',
+            'patchId': patch_id,
+            'expiresAt': expires_at(now),
+        }
+
+
+def summary_item(patches) -> dict:
+    """Build the dashboard summary item (flat counters) for a set of patches."""
+    counters = {'total': 0}
+
+    def bump(name):
+        counters[name] = counters.get(name, 0) + 1
+
+    for patch in patches:
+        counters['total'] += 1
+        bump(f"status#{patch.get('status')}")
+        bump(f"severity#{patch.get('severity') or 'UNKNOWN'}")
+        band = summary.score_band(patch.get('impactScore'))
+        if band:
+            bump(f"band#{band}")
+    return {'summaryId': summary.SUMMARY_ID, **counters,
+            'updatedAt': datetime.utcnow().isoformat() + 'Z'}
+
+
+# -- NDJSON dump/load ----------------------------------------------------------
+
+def dump_ndjson(path: str, items) -> int:
+    """Write items as gzip-compressed NDJSON; returns the number written."""
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        for item in items:
+            f.write(json.dumps(to_jsonable(item), separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def read_ndjson(path: str):
+    """Yield items from a gzip NDJSON file with numbers restored as Decimal/int."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line, parse_float=Decimal)
+
+
+# -- parallel batch writer -----------------------------------------------------
+
+class LoadStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.throttles = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+def _error_code(exc):
+    return getattr(exc, 'response', {}).get('Error', {}).get('Code')
+
+
+def write_batch(resource, table_name: str, items: list, stats: LoadStats,
+                max_attempts: int = 10, base_backoff: float = 0.05, max_backoff: float = 5.0,
+                sleep=time.sleep, rng=random):
+    """Write up to 25 items, resending UnprocessedItems and throttled calls with backoff."""
+    requests = [{'PutRequest': {'Item': item}} for item in items]
+    for attempt in range(max_attempts):
+        try:
+            resp = resource.batch_write_item(RequestItems={table_name: requests})
+            stats.add(batches=1)
+        except Exception as e:
+            if _error_code(e) not in THROTTLE_CODES:
+                raise
+            stats.add(throttles=1)
+        else:
+            unprocessed = resp.get('UnprocessedItems', {}).get(table_name, [])
+            stats.add(written=len(requests) - len(unprocessed))
+            if not unprocessed:
+                return
+            stats.add(throttles=1)
+            requests = unprocessed
+        stats.add(retries=1)
+        # Full jitter keeps parallel workers from retrying in lockstep
+        sleep(rng.uniform(0, min(max_backoff, base_backoff * 2 ** attempt)))
+    stats.add(failed=len(requests))
+    print(f'Gave up on {len(requests)} items for {table_name} after {max_attempts} attempts',
+          file=sys.stderr)
+
+
+def load_items(resource_factory, table_name: str, items, workers: int = 8,
+               progress_every: float = 5.0, **batch_options) -> dict:
+    """Write ``items`` with ``workers`` parallel batch writers; returns load stats.
+
+    ``resource_factory`` is called once per worker because boto3 resources
+    are not thread-safe. A bounded queue keeps memory flat for any dataset size.
+    """
+    stats = LoadStats()
+    batches = queue.Queue(maxsize=workers * 4)
+    errors = []
+
+    def worker():
+        try:
+            resource = resource_factory()
+        except Exception as e:
+            # Keep draining so the producer never blocks; this worker's batches count as failed
+            errors.append(e)
+            resource = None
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            try:
+                if resource is None:
+                    stats.add(failed=len(batch))
+                    continue
+                write_batch(resource, table_name, batch, stats, **batch_options)
+            except Exception as e:
+                errors.append(e)
+                stats.add(failed=len(batch))
+
+    def put(batch):
+        # Never wait forever: if every worker has died, nothing will drain the queue
+        while True:
+            try:
+                batches.put(batch, timeout=1)
+                return
+            except queue.Full:
+                if all(future.done() for future in futures):
+                    raise RuntimeError(f'All {table_name} writers stopped; '
+                                       f'first error: {errors[0] if errors else "unknown"}')
+
+    started = time.perf_counter()
+    last_report = started
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(worker) for _ in range(workers)]
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == BATCH_SIZE:
+                put(batch)
+                batch = []
+            now = time.perf_counter()
+            if progress_every and now - last_report >= progress_every:
+                last_report = now
+                print(f'  {table_name}: {stats.written} items, '
+                      f'{stats.written / (now - started):,.0f} items/s', file=sys.stderr)
+        if batch:
+            put(batch)
+        for _ in range(workers):
+            put(None)
+    for future in futures:
+        if future.exception() is not None:
+            errors.append(future.exception())
+    elapsed = time.perf_counter() - started
+    if errors:
+        print(f'{len(errors)} batches failed for {table_name}; first error: {errors[0]}', file=sys.stderr)
+    return {'table': table_name, 'written': stats.written, 'failed': stats.failed,
+            'batches': stats.batches, 'retries': stats.retries, 'throttles': stats.throttles,
+            'seconds': round(elapsed, 2),
+            'itemsPerSecond': round(stats.written / elapsed, 1) if elapsed else None}
+
+
+def _resource_factory():
+    import boto3
+    endpoint = os.getenv('DYNAMODB_ENDPOINT_URL')
+
+    def factory():
+        session = boto3.session.Session()
+        if endpoint:
+            return session.resource('dynamodb', endpoint_url=endpoint)
+        return session.resource('dynamodb')
+    return factory
+
+
+def _datasets(args):
+    """(kind, env var, items iterator) for each table that has data to write."""
+    if getattr(args, 'source', None):
+        out = []
+        for kind, env in (('patches', 'PATCHES_TABLE_NAME'), ('assets', 'ASSETS_TABLE_NAME'),
+                          ('events', 'EVENTS_TABLE_NAME')):
+            path = os.path.join(args.source, f'{kind}.ndjson.gz')
+            if os.path.exists(path):
+                out.append((kind, env, lambda p=path: read_ndjson(p)))
+        return out
+    return [
+        ('patches', 'PATCHES_TABLE_NAME',
+         lambda: generate_patches(args.patches, args.assets, args.seed)),
+        ('assets', 'ASSETS_TABLE_NAME', lambda: generate_assets(args.assets, args.seed)),
+        ('events', 'EVENTS_TABLE_NAME', lambda: generate_events(args.events, args.patches, args.seed)),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('load', 'dump'):
+        p = sub.add_parser(name)
+        p.add_argument('--patches', type=int, default=1000)
+        p.add_argument('--assets', type=int, default=500)
+        p.add_argument('--events', type=int, default=2000)
+        p.add_argument('--seed', type=int, default=42)
+    sub.choices['dump'].add_argument('--out', required=True, help='Directory for *.ndjson.gz files')
+    load = sub.choices['load']
+    load.add_argument('--from', dest='source', help='Load a directory written by "dump" instead of generating')
+    load.add_argument('--workers', type=int, default=8)
+    load.add_argument('--max-attempts', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == 'dump':
+        os.makedirs(args.out, exist_ok=True)
+        for kind, _, items in _datasets(args):
+            started = time.perf_counter()
+            path = os.path.join(args.out, f'{kind}.ndjson.gz')
+            count = dump_ndjson(path, items())
+            print(f'Wrote {count} {kind} to {path} ({os.path.getsize(path) / 1e6:.1f} MB, '
+                  f'{time.perf_counter() - started:.1f}s)')
+        return
+
+    factory = _resource_factory()
+    results = []
+    for kind, env, items in _datasets(args):
+        table_name = os.getenv(env)
+        if not table_name:
+            print(f'{env} not set; skipping {kind}')
+            continue
+        print(f'Loading {kind} into {table_name}...')
+        result = load_items(factory, table_name, items(), workers=args.workers,
+                            max_attempts=args.max_attempts)
+        results.append(result)
+        print(f"  {result['written']} written, {result['failed']} failed, {result['retries']} retries "
+              f"in {result['seconds']}s = {result['itemsPerSecond']:,} items/s")
+        if kind == 'patches' and os.getenv('SUMMARY_TABLE_NAME'):
+            factory().Table(os.getenv('SUMMARY_TABLE_NAME')).put_item(Item=summary_item(items()))
+            print('  Wrote dashboard summary')
+    total = sum(r['written'] for r in results)
+    seconds = sum(r['seconds'] for r in results)
+    if seconds:
+        print(f'Total: {total} items in {seconds:.1f}s = {total / seconds:,.0f} items/s')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""Drive a weighted mix of /invoke actions under load and report how it holds up.
+
+Targets a deployed API (--url) or the handler in-process against the fake
+backend (--local). Load is either open-loop at a fixed request rate (--rps)
+or closed-loop with a fixed number of workers (--concurrency).
+
+Usage:
+  python scripts/load_test.py --url https://.../prod --rps 20 --duration 60
+  python scripts/load_test.py --local --concurrency 16 --duration 30 \\
+      --mix list_patches=5,list_events=3,prioritize=1,prompt=1
+
+Open-loop latency is measured from each request's scheduled send time, so
+queueing inside the generator counts against the service instead of hiding
+it. The report gives latency histograms per action, error and throttle
+rates, and throughput per --interval seconds; --output writes it as JSON.
+"""
+import argparse
+import asyncio
+import bisect
+import concurrent.futures
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'super_hacks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import patch_state  # noqa: E402
+
+DEFAULT_MIX = 'list_patches=5,list_events=3,list_compliance=1,prioritize=1,run_sandbox=1,prompt=1'
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+THROTTLE_MARKERS = ('Throttl', 'Rate exceeded', 'ProvisionedThroughputExceeded',
+                    'TooManyRequests', 'SlowDown')
+# Statuses run_sandbox accepts; finished runs stay in them, so patches can be rerun
+SANDBOX_STATUSES = frozenset(patch_state.sources_of('SANDBOX_TESTING'))
+
+
+def parse_mix(text: str) -> dict:
+    """Parse "action=weight,..." into {action: weight}; a bare action has weight 1."""
+    mix = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        action, _, weight = part.partition('=')
+        mix[action.strip()] = float(weight) if weight else 1.0
+    if not mix or any(w < 0 for w in mix.values()) or sum(mix.values()) <= 0:
+        raise ValueError(f'Invalid mix: {text!r}')
+    return mix
+
+
+def build_payload(action: str, rng: random.Random, patch_ids: list) -> dict:
+    if action == 'prompt':
+        return {'prompt': 'Which critical patches should we roll out first and why?'}
+    if action == 'prioritize':
+        return {'action': 'prioritize', 'cve_info': 'CVE-2024-0001'}
+    if action == 'run_sandbox':
+        return {'action': 'run_sandbox', 'patch_id': rng.choice(patch_ids) if patch_ids else 'p-unknown'}
+    return {'action': action}
+
+
+def classify(status: int, body: str) -> str:
+    """Return 'ok', 'throttled' or 'error' for one response."""
+    if status == 429 or any(marker in body for marker in THROTTLE_MARKERS):
+        return 'throttled'
+    if status >= 400 or '"status":"error"' in body.replace(' ', ''):
+        return 'error'
+    return 'ok'
+
+
+class Histogram:
+    """Fixed-bucket latency histogram plus the raw samples for exact percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.samples = []
+
+    def add(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.samples.append(ms)
+
+    def percentile(self, pct: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+        return round(ordered[rank], 2)
+
+    def to_dict(self) -> dict:
+        labels = [f'<={b}ms' for b in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        return {
+            'count': len(self.samples),
+            'p50Ms': self.percentile(50), 'p90Ms': self.percentile(90),
+            'p95Ms': self.percentile(95), 'p99Ms': self.percentile(99),
+            'maxMs': round(max(self.samples), 2) if self.samples else None,
+            'buckets': {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+def summarize(results: list, duration: float, interval: float) -> dict:
+    """Aggregate (offset_s, action, latency_ms, outcome) tuples into the report."""
+    overall, by_action = Histogram(), {}
+    outcomes = {'ok': 0, 'error': 0, 'throttled': 0}
+    timeline = {}
+    for offset, action, latency, outcome in results:
+        overall.add(latency)
+        by_action.setdefault(action, Histogram()).add(latency)
+        outcomes[outcome] += 1
+        slot = timeline.setdefault(int(offset // interval), {'requests': 0, 'errors': 0,
+                                                             'throttled': 0, 'latencies': Histogram()})
+        slot['requests'] += 1
+        slot['errors'] += outcome == 'error'
+        slot['throttled'] += outcome == 'throttled'
+        slot['latencies'].add(latency)
+
+    total = len(results)
+    return {
+        'requests': total,
+        'durationSeconds': round(duration, 2),
+        'throughputRps': round(total / duration, 2) if duration else None,
+        'errorRate': round(outcomes['error'] / total, 4) if total else 0.0,
+        'throttleRate': round(outcomes['throttled'] / total, 4) if total else 0.0,
+        'latency': overall.to_dict(),
+        'actions': {a: h.to_dict() for a, h in sorted(by_action.items())},
+        'timeline': [
+            {'t': round(slot * interval, 2), 'requests': s['requests'],
+             'rps': round(s['requests'] / interval, 2), 'errors': s['errors'],
+             'throttled': s['throttled'], 'p50Ms': s['latencies'].percentile(50),
+             'p99Ms': s['latencies'].percentile(99)}
+            for slot, s in sorted(timeline.items())
+        ],
+    }
+
+
+class HttpTarget:
+    """POSTs to <url>/invoke with a pooled requests.Session per worker thread."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.url = base_url.rstrip('/') + '/invoke'
+        self.timeout = timeout
+        self._sessions = {}
+
+    def call(self, payload: dict):
+        session = self._sessions.get(threading.get_ident())
+        if session is None:
+            session = self._sessions[threading.get_ident()] = requests.Session()
+        try:
+            resp = session.post(self.url, json=payload, timeout=self.timeout,
+                                headers={'Origin': 'http://localhost:8080'})
+            return resp.status_code, resp.text
+        except requests.RequestException as e:
+            return 599, f'{type(e).__name__}: {e}'
+
+    def patch_ids(self) -> list:
+        """Patches run_sandbox accepts; any others would only exercise the rejection path."""
+        status, body = self.call({'action': 'list_patches', 'fields': 'status'})
+        try:
+            return [p['patchId'] for p in json.loads(body).get('patches', [])
+                    if p.get('patchId') and p.get('status') in SANDBOX_STATUSES]
+        except Exception:
+            return []
+
+    @contextlib.contextmanager
+    def running(self):
+        yield self
+
+
+class LocalTarget:
+    """Calls agent.lambda_handler in-process against a seeded fake backend."""
+
+    def __init__(self, seed_size: int = 1000, seed: int = 7, latency_ms: float = 0.0,
+                 throttle_rate: float = 0.0):
+        from scripts.benchmark_actions import sandbox_patch_ids, seed_backend
+        from scripts.bulk_load import generate_patches
+        faults = {'dynamodb': {'latency_ms': latency_ms, 'throttle_rate': throttle_rate},
+                  's3': {'latency_ms': latency_ms}}
+        patches = list(generate_patches(seed_size, seed_size, seed))
+        self.backend = seed_backend(seed_size, seed, faults, patches)
+        self._patch_ids = sandbox_patch_ids(patches)
+        self.seed_size = seed_size
+        self.seed = seed
+
+    def call(self, payload: dict):
+        import agent
+        resp = agent.lambda_handler({'httpMethod': 'POST', 'body': json.dumps(payload)}, None)
+        return resp.get('statusCode', 500), resp.get('body', '')
+
+    def patch_ids(self) -> list:
+        return list(self._patch_ids)
+
+    @contextlib.contextmanager
+    def running(self):
+        # Handlers print on every call; keep that off the console
+        with open(os.devnull, 'w') as devnull:
+            with self.backend.install(), contextlib.redirect_stdout(devnull):
+                yield self
+
+
+async def _timed_call(loop, pool, target, action, payload, scheduled, started, results):
+    status, body = await loop.run_in_executor(pool, target.call, payload)
+    finished = time.perf_counter()
+    results.append((scheduled - started, action, (finished - scheduled) * 1000, classify(status, body)))
+
+
+async def run_load(target, mix: dict, duration: float, rps: float = None, concurrency: int = None,
+                   max_inflight: int = 256, seed: int = 1, poisson: bool = False) -> tuple:
+    """Run the load and return (results, elapsed seconds)."""
+    rng = random.Random(seed)
+    actions, weights = list(mix), list(mix.values())
+    patch_ids = target.patch_ids() if 'run_sandbox' in mix else []
+    workers = concurrency or max_inflight
+    loop = asyncio.get_running_loop()
+    results = []
+    started = time.perf_counter()
+    deadline = started + duration
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        if concurrency:
+            async def worker():
+                while time.perf_counter() < deadline:
+                    action = rng.choices(actions, weights)[0]
+                    await _timed_call(loop, pool, target, action, build_payload(action, rng, patch_ids),
+                                      time.perf_counter(), started, results)
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        else:
+            tasks = []
+            next_send = started
+            while next_send < deadline:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                action = rng.choices(actions, weights)[0]
+                tasks.append(asyncio.ensure_future(_timed_call(
+                    loop, pool, target, action, build_payload(action, rng, patch_ids),
+                    next_send, started, results)))
+                next_send += rng.expovariate(rps) if poisson else 1.0 / rps
+            await asyncio.gather(*tasks)
+    return results, time.perf_counter() - started
+
+
+def print_report(report: dict):
+    lat = report['latency']
+    print(f"\n{report['requests']} requests in {report['durationSeconds']}s "
+          f"= {report['throughputRps']} req/s")
+    print(f"errors {report['errorRate']:.2%}, throttled {report['throttleRate']:.2%}")
+    print(f"latency p50 {lat['p50Ms']} ms, p95 {lat['p95Ms']} ms, p99 {lat['p99Ms']} ms, max {lat['maxMs']} ms")
+    print('\nLatency histogram:')
+    peak = max(lat['buckets'].values(), default=1)
+    for label, count in lat['buckets'].items():
+        print(f"  {label:>10} {count:>7} {'#' * max(1, int(40 * count / peak))}")
+    print(f"\n{'action':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for action, h in report['actions'].items():
+        print(f"{action:<16}{h['count']:>8}{h['p50Ms']:>10}{h['p95Ms']:>10}{h['p99Ms']:>10}")
+    print(f"\n{'t (s)':>7}{'rps':>9}{'errors':>8}{'throttled':>11}{'p50 ms':>10}{'p99 ms':>10}")
+    for slot in report['timeline']:
+        print(f"{slot['t']:>7}{slot['rps']:>9}{slot['errors']:>8}{slot['throttled']:>11}"
+              f"{slot['p50Ms']:>10}{slot['p99Ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--url', help='Base API URL (e.g. https://abcd.execute-api.us-east-1.amazonaws.com/prod)')
+    where.add_argument('--local', action='store_true', help='Call the handler in-process against the fakes')
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument('--rps', type=float, help='Open-loop target request rate')
+    load.add_argument('--concurrency', type=int, help='Closed-loop number of concurrent workers')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to generate load')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weighted actions (default: %(default)s)')
+    parser.add_argument('--poisson', action='store_true', help='Poisson arrivals instead of evenly spaced')
+    parser.add_argument('--max-inflight', type=int, default=256, help='Open-loop cap on concurrent requests')
+    parser.add_argument('--interval', type=float, default=1.0, help='Timeline bucket width in seconds')
+    parser.add_argument('--timeout', type=float, default=30.0, help='HTTP timeout per request')
+    parser.add_argument('--seed-size', type=int, default=1000, help='--local: items per fake table')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='--local: injected backend latency')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='--local: DynamoDB throttle probability')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.url:
+        target = HttpTarget(args.url, timeout=args.timeout)
+    else:
+        target = LocalTarget(args.seed_size, latency_ms=args.latency_ms, throttle_rate=args.throttle_rate)
+
+    with target.running():
+        results, elapsed = asyncio.run(run_load(
+            target, mix, args.duration, rps=args.rps, concurrency=args.concurrency,
+            max_inflight=args.max_inflight, seed=args.seed, poisson=args.poisson))
+
+    report = summarize(results, elapsed, args.interval)
+    report['config'] = {'target': args.url or 'local', 'mix': mix, 'rps': args.rps,
+                        'concurrency': args.concurrency, 'duration': args.duration}
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nWrote {args.output}')
+    return report
+
+
+if __name__ == '__main__':
+    main()
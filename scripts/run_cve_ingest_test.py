@@ -1,42 +1,18 @@
-import requests
-from super_hacks import cve_ingest
-import os
 import json
+import os
 import sys
 
-# Ensure the repo root is on sys.path
-ROOT = os.path.dirname(os.path.dirname(__file__))
-if ROOT not in sys.path:
-    sys.path.insert(0, ROOT)
-
-os.environ['PATCHES_TABLE_NAME'] = 'demo-patches'
-os.environ['EVENTS_TABLE_NAME'] = 'demo-events'
-
-# Inline fake 'boto3' shim so this test runner doesn't need boto3 installed
-
-
-class FakeTable:
-    def __init__(self, name):
-        self.name = name
-
-    def put_item(self, Item):
-        print(
-            f"Fake put_item to {self.name}: {{'patchId': Item.get('patchId')}}")
-        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
-
-
-class FakeResource:
-    def Table(self, name):
-        return FakeTable(name)
-
-
-class FakeBoto3:
-    def resource(self, *a, **k):
-        return FakeResource()
+import requests
 
+# Ensure the repo root (for tests.fakes) and the Lambda asset directory (for
+# the flat module imports the functions use) are on sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'super_hacks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
 
-# Install the fake boto3 into sys.modules so imports in the project work
-sys.modules['boto3'] = FakeBoto3()
+import cve_ingest  # noqa: E402
+from tests.fakes import FakeBackend  # noqa: E402
 
 # Monkeypatch requests.get to return a small fake feed
 
@@ -59,9 +35,16 @@ requests.get = lambda url, timeout=10: FakeResponse({'synthetic': True, 'cves':
 
 
 def main():
-    print('Running cve_ingest.lambda_handler...')
-    res = cve_ingest.lambda_handler({}, None)
-    print('Result:', json.dumps(res, indent=2))
+    # In-memory DynamoDB/S3/SQS instead of AWS; tables named as in the stack
+    backend = FakeBackend()
+    with backend.install():
+        os.environ.pop('INGEST_QUEUE_URL', None)
+        print('Running cve_ingest.lambda_handler...')
+        res = cve_ingest.lambda_handler({}, None)
+        print('Result:', json.dumps(res, indent=2))
+        for item in backend.table('PATCHES_TABLE_NAME').all_items():
+            print(f"Stored patch: {{'patchId': '{item['patchId']}', 'cve': '{item.get('cve')}'}}")
+        print('Calls:', json.dumps(backend.faults.stats()['calls'], indent=2))
 
 
 if __name__ == '__main__':
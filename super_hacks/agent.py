@@ -1,11 +1,21 @@
 # super_hacks/agent.py
 
+import base64
 import boto3
+import contextvars
 import json
-from decimal import Decimal
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 import os
 from tools import prioritize_patch, run_sandbox_test, list_patches
+import delta_sync
+import projection
+import resilience
+from responses import make_response, not_modified
+from event_buffer import flushing
+from profiling import profiled
+from tool_results import shape_tool_result
+from model_router import ModelRouter, classify_prompt
 
 # Load local .env for developer convenience if python-dotenv is available.
 try:
@@ -30,12 +40,14 @@ def get_bedrock_client():
         region = os.getenv('AWS_REGION', os.getenv(
             'AWS_DEFAULT_REGION', 'us-east-1'))
         _bedrock = boto3.client(
-            service_name='bedrock-runtime', region_name=region)
-    return _bedrock
+            service_name='bedrock-runtime', region_name=region,
+            config=resilience.client_config('bedrock'))
+    # One breaker per model: a throttled or failing model must not cut off the fallbacks
+    return resilience.guard(_bedrock, 'bedrock', breaker_key='modelId')
 
 
-MODEL_ID = os.getenv('BEDROCK_MODEL_ID',
-                     'anthropic.claude-3-5-sonnet-20240620-v1:0')
+# Routes each prompt to a model tier and falls back across models on throttling
+router = ModelRouter(lambda: get_bedrock_client())
 
 # Define the tools in the format Bedrock understands
 tool_config = {
@@ -61,143 +73,309 @@ tool_config = {
                     "required": ["patch_info"]
                 }}
             }
+        },
+        {
+            "toolSpec": {
+                "name": "list_patches",
+                "description": "Lists known patches with their CVE, severity, status and impact score.",
+                "inputSchema": {"json": {"type": "object", "properties": {}}}
+            }
+        },
+        {
+            "toolSpec": {
+                "name": "list_assets",
+                "description": "Lists managed assets with their hostname and business criticality.",
+                "inputSchema": {"json": {"type": "object", "properties": {}}}
+            }
+        },
+        {
+            "toolSpec": {
+                "name": "list_events",
+                "description": "Lists recent pipeline events such as CVE ingestion, newest first.",
+                "inputSchema": {"json": {"type": "object", "properties": {}}}
+            }
         }
     ]
 }
 
 
-def lambda_handler(event, context):
-    # Helper to consistently format HTTP responses with CORS
-    def make_response(status_code: int, body_obj):
-        def _decimal_default(o):
-            # Convert Decimal to int/float, bytes to str, datetime to ISO, sets to lists
-            if isinstance(o, Decimal):
-                # Prefer int when there's no fractional part
-                if o == o.to_integral_value():
-                    return int(o)
-                return float(o)
-            if isinstance(o, (set,)):
-                return list(o)
-            if isinstance(o, (bytes, bytearray)):
-                try:
-                    return o.decode('utf-8')
-                except Exception:
-                    return str(o)
-            if isinstance(o, datetime):
-                return o.isoformat()
-            raise TypeError(f"Type {type(o)} not JSON serializable")
-
-        return {
-            "statusCode": status_code,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            },
-            "body": json.dumps(body_obj, default=_decimal_default),
-        }
+def _list_tool(name: str):
+    def _call(**_ignored):
+        import tools
+        return getattr(tools, name)()
+    return _call
+
+
+# Tools the model may call directly; their results go through shape_tool_result
+TOOL_FUNCTIONS = {
+    'prioritize_patch': lambda **args: prioritize_patch(args.get('cve_info', '')),
+    'list_patches': _list_tool('list_patches'),
+    'list_assets': _list_tool('list_assets'),
+    'list_events': _list_tool('list_events'),
+}
+
+# Actions that only read state; a batch runs these side by side on a thread pool
+READ_ACTIONS = {'list_patches', 'list_assets', 'list_events', 'list_compliance',
+                'summary', 'list_event_history', 'plan_rollout', 'query_patches'}
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+
+
+# Read-only GET routes served through the API Gateway cache, mapped to actions
+GET_ROUTES = {
+    '/patches': 'list_patches',
+    '/assets': 'list_assets',
+    '/events': 'list_events',
+    '/compliance': 'list_compliance',
+    '/summary': 'summary',
+    '/events/history': 'list_event_history',
+    '/rollout': 'plan_rollout',
+    '/patches/query': 'query_patches',
+}
+# GET /dashboard returns everything the dashboard view needs as one batch
+DASHBOARD_ACTIONS = [{'action': 'list_patches', 'fields': list(projection.PATCH_QUEUE_FIELDS)},
+                     'list_assets', 'summary']
 
+
+def _limit(params: dict):
+    """Return the optional positive integer 'limit' parameter, or None."""
     try:
-        # Quick CORS preflight handling for API Gateway proxy
-        # If invoked by EventBridge scheduled rule, run the CVE ingestion flow and exit
-        if event.get('source') == 'aws.events' or event.get('detail-type') == 'Scheduled Event':
-            try:
-                # Import the ingestion module and delegate
-                import cve_ingest
-                result = cve_ingest.lambda_handler(event, context)
-                # Return a simple acknowledgement for scheduled runs
-                return make_response(200, {"ingest_result": result})
-            except Exception as e:
-                print('Ingestion delegation error:', e)
-                return make_response(500, {"error": "ingestion failed", "detail": str(e)})
-
-        method = event.get('httpMethod') or event.get(
-            'requestContext', {}).get('http', {}).get('method')
-
-        # Debug: log the incoming event for CloudWatch to inspect request shape
-        print('DEBUG: raw event ->', event)
+        limit = int(params.get('limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
+def _list_kwargs(params: dict) -> dict:
+    """List arguments: optional limit, and the attributes to return ('fields')."""
+    kwargs = {}
+    limit = _limit(params)
+    if limit:
+        kwargs['limit'] = limit
+    if params.get('fields'):
+        kwargs['fields'] = params['fields']
+    return kwargs
+
+
+def _sync_kwargs(params: dict) -> dict:
+    """List arguments plus the optional delta-sync version ('since')."""
+    kwargs = _list_kwargs(params)
+    if params.get('since'):
+        kwargs['since'] = params['since']
+    return kwargs
 
-        if method == 'OPTIONS':
-            return make_response(200, {"ok": True})
 
-        # Be tolerant: API Gateway may send body as a JSON string (proxy) or as an already-parsed dict (non-proxy)
-        raw_body = event.get('body', {})
+def dispatch_action(action: str, params: dict):
+    """Run a single named action and return (status_code, body_obj).
+
+    ``params`` is the request body for POST /invoke or the query string for
+    GET routes. Returns None when the action is not recognised so the caller
+    can fall back to treating the request as a prompt.
+    """
+    if action == 'list_patches':
+        return 200, list_patches(**_sync_kwargs(params))
+
+    if action == 'list_assets':
         try:
-            if isinstance(raw_body, str):
-                body = json.loads(raw_body) if raw_body else {}
-            elif isinstance(raw_body, dict):
-                body = raw_body
-            else:
-                body = {}
+            from tools import list_assets
+            return 200, list_assets(**_list_kwargs(params))
+        except Exception:
+            return 500, {"error": "list_assets tool not available"}
+
+    if action == 'list_events':
+        try:
+            from tools import list_events
+            return 200, list_events(**_sync_kwargs(params))
         except Exception as e:
-            print('DEBUG: Failed to parse body:', e, 'raw_body=', raw_body)
-            body = {}
+            print('list_events error:', e)
+            return 500, {"error": "list_events failed"}
+
+    if action == 'list_compliance':
+        try:
+            from tools import list_compliance
+            limit = _limit(params)
+            return 200, list_compliance(**({'max_items': limit} if limit else {}))
+        except Exception as e:
+            print('list_compliance error:', e)
+            return 500, {"error": "list_compliance failed"}
+
+    if action == 'list_event_history':
+        from event_archive import list_event_history
+        return 200, list_event_history(params)
+
+    if action == 'plan_rollout':
+        from scheduler import plan_rollout
+        return 200, plan_rollout(params)
+
+    if action == 'query_patches':
+        from patch_snapshot import query_patches
+        return 200, query_patches(params)
+
+    if action == 'export':
+        from export import start_export
+        return start_export(params)
+
+    if action == 'summary':
+        from tools import get_summary
+        return 200, get_summary()
+
+    if action == 'recompute_summary':
+        from tools import recompute_summary
+        return 200, recompute_summary()
+
+    if action == 'run_sandbox':
+        patch_id = params.get('patch_id') or params.get('patchId')
+        if not patch_id:
+            return 400, {"error": "patch_id required"}
+        return 200, run_sandbox_test(patch_id)
+
+    if action == 'delete_patch':
+        patch_id = params.get('patch_id') or params.get('patchId')
+        if not patch_id:
+            return 400, {"error": "patch_id required"}
+        from tools import delete_patch
+        return 200, delete_patch(patch_id)
+
+    if action == 'prioritize':
+        cve_info = params.get('cve_info') or params.get('cve')
+        if not cve_info:
+            return 400, {"error": "cve_info required"}
+        return 200, prioritize_patch(cve_info)
+
+    return None
+
+
+def _timed_dispatch(action: str, params: dict) -> dict:
+    """Run one batch entry and wrap its outcome with status and timing."""
+    started = time.perf_counter()
+    try:
+        dispatched = dispatch_action(action, params)
+        if dispatched is None:
+            dispatched = (400, {"error": f"unknown action '{action}'"})
+    except Exception as e:
+        print(f'Batch action {action} error:', e)
+        dispatched = (500, {"error": str(e)})
+    status_code, body_obj = dispatched
+    return {
+        "status": status_code,
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+        "body": body_obj,
+    }
+
+
+def run_actions(actions: list) -> dict:
+    """Execute a batch of actions and return a result map keyed per entry.
+
+    Each entry is either an action name or a dict with an 'action' key plus
+    that action's parameters, and an optional 'id' used as the result key.
+    Read-only actions run concurrently; anything that changes state runs
+    sequentially in request order while the reads are in flight.
+    """
+    started = time.perf_counter()
+    keys = []
+    results = {}
+    reads = []
+    writes = []
+    for index, spec in enumerate(actions):
+        if isinstance(spec, str):
+            spec = {'action': spec}
+        if not isinstance(spec, dict) or not spec.get('action'):
+            key = f"#{index}"
+            results[key] = {"status": 400, "elapsedMs": 0,
+                            "body": {"error": "action required"}}
+            keys.append(key)
+            continue
+        key = str(spec.get('id') or spec['action'])
+        if key in keys:
+            key = f"{key}#{index}"
+        keys.append(key)
+        target = reads if spec['action'] in READ_ACTIONS else writes
+        target.append((key, spec))
+
+    if reads:
+        workers = max(1, min(BATCH_MAX_WORKERS, len(reads)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each read runs in a copy of this context so it keeps the request deadline
+            futures = {key: pool.submit(contextvars.copy_context().run, _timed_dispatch, spec['action'], spec)
+                       for key, spec in reads}
+            for key, spec in writes:
+                results[key] = _timed_dispatch(spec['action'], spec)
+            for key, future in futures.items():
+                results[key] = future.result()
+    else:
+        for key, spec in writes:
+            results[key] = _timed_dispatch(spec['action'], spec)
+
+    return {
+        # Keep the caller's ordering in the result map
+        "results": {key: results[key] for key in keys},
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def parse_body(event: dict) -> dict:
+    """Decode the JSON body of an API Gateway proxy event."""
+    raw_body = event.get('body') or ''
+    try:
+        if event.get('isBase64Encoded'):
+            raw_body = base64.b64decode(raw_body).decode('utf-8')
+        body = json.loads(raw_body) if raw_body else {}
+    except Exception as e:
+        # The body may carry secrets or patch data; log only why it was rejected
+        print('Failed to parse body:', e)
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+@profiled
+@flushing
+@resilience.within_deadline
+def lambda_handler(event, context):
+    try:
+        method = event.get('httpMethod') or 'POST'
 
-        print('DEBUG: parsed body ->', body)
+        if method == 'OPTIONS':
+            return make_response(200, {"ok": True}, event)
+
+        # Cacheable read routes: parameters come from the query string
+        if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            path = event.get('resource') or event.get('path') or ''
+            if path != '/dashboard' and path not in GET_ROUTES:
+                return make_response(404, {"error": f"unknown route {path}"}, event)
+            # An unchanged poll is answered from memory: no table reads, no serialization
+            key = delta_sync.cache_key(path, params)
+            etag = delta_sync.cached_etag(event, key)
+            if etag:
+                return not_modified(etag)
+            read_generation = delta_sync.generation()
+            if path == '/dashboard':
+                resp = make_response(200, run_actions(DASHBOARD_ACTIONS), event)
+            else:
+                resp = make_response(*dispatch_action(GET_ROUTES[path], params), event)
+            delta_sync.remember(key, resp['headers'].get('ETag'), read_generation)
+            return resp
+
+        body = parse_body(event)
 
-        # If caller supplies an 'action' (usually inside the request body), handle it directly via tools
-        action = body.get('action') or event.get('action')
+        # A batch of actions runs in one invocation so the dashboard needs a single round trip
+        actions = body.get('actions')
+        if isinstance(actions, list):
+            return make_response(200, run_actions(actions), event)
+
+        # If caller supplies an 'action' in the request body, handle it directly via tools
+        action = body.get('action')
         if action:
-            if action == 'list_patches':
-                print('DEBUG: action=list_patches')
-                return make_response(200, list_patches())
-
-            if action == 'list_assets':
-                try:
-                    from tools import list_assets
-                    return make_response(200, list_assets())
-                except Exception:
-                    return make_response(500, {"error": "list_assets tool not available"})
-
-            if action == 'list_events':
-                try:
-                    from tools import list_events
-                    return make_response(200, list_events())
-                except Exception as e:
-                    print('list_events error:', e)
-                    return make_response(500, {"error": "list_events failed"})
-
-            if action == 'list_compliance':
-                try:
-                    from tools import list_compliance
-                    return make_response(200, list_compliance())
-                except Exception as e:
-                    print('list_compliance error:', e)
-                    return make_response(500, {"error": "list_compliance failed"})
-
-            if action == 'run_sandbox':
-                # Accept patch id from body or from top-level event (API Gateway may put fields at top-level)
-                patch_id = (
-                    body.get('patch_id')
-                    or body.get('patchId')
-                    or event.get('patch_id')
-                    or event.get('patchId')
-                )
-                if not patch_id:
-                    return make_response(400, {"error": "patch_id required"})
-                return make_response(200, run_sandbox_test(patch_id))
-
-            if action == 'prioritize':
-                # Accept CVE info from body or top-level event
-                cve_info = (
-                    body.get('cve_info')
-                    or body.get('cve')
-                    or event.get('cve_info')
-                    or event.get('cve')
-                )
-                if not cve_info:
-                    return make_response(400, {"error": "cve_info required"})
-                return make_response(200, prioritize_patch(cve_info))
+            dispatched = dispatch_action(action, body)
+            if dispatched is not None:
+                return make_response(*dispatched, event)
 
         # otherwise treat as a user prompt to Bedrock
-        user_prompt = body.get('prompt') or event.get(
-            'prompt') or "No prompt provided."
+        user_prompt = body.get('prompt') or "No prompt provided."
 
         # First call to the model to see if it wants to use a tool
-        bedrock = get_bedrock_client()
-        response = bedrock.converse(
-            modelId=MODEL_ID,
+        tier = classify_prompt(user_prompt)
+        response, route = router.converse(
+            tier,
             messages=[{"role": "user", "content": [{"text": user_prompt}]}],
             toolConfig=tool_config,
         )
@@ -217,12 +395,16 @@ def lambda_handler(event, context):
             tool_name = tool_request['name']
             tool_args = tool_request['input']
 
-            if tool_name == 'prioritize_patch':
-                tool_result = prioritize_patch(**tool_args)
+            if tool_name in TOOL_FUNCTIONS:
+                # Project, top-k and budget the result so large tables don't flood the context
+                tool_result = shape_tool_result(
+                    TOOL_FUNCTIONS[tool_name](**tool_args))
 
                 # --- Call the model AGAIN with the tool's result ---
-                second_response = bedrock.converse(
-                    modelId=MODEL_ID,
+                # Stay on the model that issued the tool call when it is available
+                second_response, route = router.converse(
+                    tier,
+                    prefer=route["model"],
                     messages=[
                         {"role": "user", "content": [{"text": user_prompt}]},
                         response_message,  # The model's previous turn
@@ -248,11 +430,19 @@ def lambda_handler(event, context):
             final_response_text = [
                 content['text'] for content in response_message['content'] if 'text' in content][0]
 
-        return make_response(200, {"response": final_response_text})
+        return make_response(200, {
+            "response": final_response_text,
+            "model": route["model"],
+            "modelLatencyMs": route["latencyMs"],
+        }, event)
 
+    except resilience.Unavailable as e:
+        # A dependency is down or the time budget ran out: tell the client to retry later
+        print(f"Unavailable: {e}")
+        return make_response(503, {"error": str(e)}, event)
     except Exception as e:
         print(f"Error: {e}")
-        return make_response(500, {"error": str(e)})
+        return make_response(500, {"error": str(e)}, event)
 
 
 def invoke(payload: dict) -> dict:
@@ -260,8 +450,8 @@ def invoke(payload: dict) -> dict:
     Agent Core compatible invocation. Accepts a dict payload and returns a dict.
     The payload is expected to contain a 'prompt' key or full body equivalent.
     """
-    # Build a minimal event object compatible with lambda_handler
-    event = {"body": json.dumps(payload)}
+    # Build a minimal API Gateway proxy event for lambda_handler
+    event = {"httpMethod": "POST", "body": json.dumps(payload)}
     resp = lambda_handler(event, None)
     # lambda_handler returns a dict with string body; unwrap it into dict
     try:
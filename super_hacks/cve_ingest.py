@@ -1,12 +1,17 @@
 import os
 import json
-import uuid
 import time
 from datetime import datetime
 
 import boto3
 import requests
 
+import event_buffer
+import exploit_intel
+import patch_state
+import resilience
+import summary
+
 # Load local .env for developer convenience if python-dotenv is available.
 try:
     from dotenv import load_dotenv
@@ -15,36 +20,56 @@ except Exception:
     pass
 
 
-def lambda_handler(event, context):
-    """Simple CVE ingestion Lambda.
+# Feed entries parsed per run; the queued path can handle far more than inline writes
+INGEST_MAX_ITEMS = int(os.getenv('INGEST_MAX_ITEMS', '20'))
+# Feed download timeout, shortened to whatever is left of the invocation
+FEED_TIMEOUT_SECONDS = float(os.getenv('FEED_TIMEOUT_SECONDS', '10'))
+# Entries per queue message, i.e. per worker invocation record
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', '25'))
+# SendMessageBatch attempts for chunks SQS reports as Failed
+ENQUEUE_ATTEMPTS = 3
 
-    - Fetches a sample CVE feed (or vendor URL configured via env)
-    - Parses entries and writes new patches to the PATCHES_TABLE_NAME
-    - Emits an event record to EVENTS_TABLE_NAME for each ingest
-    This is intentionally simple and safe for hackathon/demo use.
+
+class IngestError(Exception):
+    """Some entries or chunks were not stored; the caller should retry them.
+
+    Creates are idempotent, so retrying the whole batch is safe.
     """
-    patches_table_name = os.getenv('PATCHES_TABLE_NAME')
-    events_table_name = os.getenv('EVENTS_TABLE_NAME')
 
-    if not patches_table_name:
-        return {"status": "error", "message": "PATCHES_TABLE_NAME not configured"}
+    def __init__(self, message: str, written: int = 0, failed: list = None):
+        super().__init__(message)
+        self.written = written
+        self.failed = failed or []
+
+
+def _get_tables():
+    """Resolve the patches and summary tables from the environment."""
+    dynamodb = boto3.resource('dynamodb', config=resilience.client_config('dynamodb'))
+    patches_table = resilience.guard(dynamodb.Table(os.getenv('PATCHES_TABLE_NAME')), 'dynamodb')
+    summary_table = None
+    if os.getenv('SUMMARY_TABLE_NAME'):
+        summary_table = resilience.guard(dynamodb.Table(os.getenv('SUMMARY_TABLE_NAME')), 'dynamodb')
+    return patches_table, summary_table
+
+
+def _download(url: str):
+    resp = requests.get(url, timeout=resilience.timeout(FEED_TIMEOUT_SECONDS, 'nvd'))
+    # Inside the breaker so 5xx answers count against the feed's health
+    resp.raise_for_status()
+    return resp
 
-    dynamodb = boto3.resource('dynamodb')
-    patches_table = dynamodb.Table(patches_table_name)
-    events_table = None
-    if events_table_name:
-        events_table = dynamodb.Table(events_table_name)
 
+def fetch_feed() -> dict:
+    """Download the CVE feed, falling back to a synthetic entry on failure."""
     # Use a minimal sample feed if none provided
     feed_url = os.getenv(
         'CVE_FEED_URL', 'https://nvd.nist.gov/feeds/json/cve/1.1/nvdcve-1.1-modified.json')
     try:
-        resp = requests.get(feed_url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        resp = resilience.breaker('nvd').call(_download, feed_url)
+        return resp.json()
     except Exception as e:
         # Fallback: create a single synthetic CVE
-        data = {
+        return {
             "synthetic": True,
             "cves": [
                 {"cve": "CVE-2025-0001",
@@ -52,14 +77,17 @@ def lambda_handler(event, context):
             ]
         }
 
-    new_count = 0
+
+def parse_feed(data: dict, max_items: int = None) -> list:
+    """Turn a feed document into a list of {'cve', 'description', 'severity'} entries."""
+    max_items = max_items or INGEST_MAX_ITEMS
     # Parse simple structure for demo purposes
     items = []
     if data.get('synthetic'):
         items = data['cves']
     else:
         # NVD feed parsing is complex. For demo, try to read 'CVE_Items'
-        for item in data.get('CVE_Items', [])[:20]:
+        for item in data.get('CVE_Items', [])[:max_items]:
             cve_id = item.get('cve', {}).get('CVE_data_meta', {}).get('ID')
             descs = item.get('cve', {}).get(
                 'description', {}).get('description_data', [])
@@ -68,9 +96,20 @@ def lambda_handler(event, context):
             severity = 'UNKNOWN'
             items.append(
                 {'cve': cve_id, 'description': desc, 'severity': severity})
+    return items
+
 
-    for entry in items:
-        patch_id = f"p-{uuid.uuid4().hex[:8]}"
+def write_entries(entries: list, patches_table, summary_table=None) -> int:
+    """Write parsed entries as PENDING patches and return how many were stored.
+
+    Every entry is attempted; if any write fails (throttling, an open
+    breaker, the deadline) IngestError is raised afterwards listing them.
+    """
+    new_count = 0
+    failed = []
+    for entry in entries:
+        # Keyed on CVE and product, so retried or overlapping runs find the existing patch
+        patch_id = patch_state.patch_id_for(entry.get('cve'), entry.get('product'))
         now = datetime.utcnow().isoformat() + 'Z'
         patch_item = {
             'patchId': patch_id,
@@ -78,20 +117,139 @@ def lambda_handler(event, context):
             'description': entry.get('description', '')[:1024],
             'severity': entry.get('severity', 'UNKNOWN'),
             'createdAt': now,
+            'updatedAt': now,
             'status': 'PENDING'
         }
+        # KEV listing and EPSS score, so triage can see exploitation from the start
+        patch_item.update(exploit_intel.attributes(exploit_intel.lookup(entry.get('cve'))))
+        if entry.get('product'):
+            patch_item['product'] = entry['product']
         try:
-            patches_table.put_item(Item=patch_item)
+            if not patch_state.create(patches_table, patch_item):
+                print(f"Patch {patch_id} for {entry.get('cve')} already ingested")
+                continue
             new_count += 1
-            if events_table is not None:
-                events_table.put_item(Item={
-                    'eventId': str(uuid.uuid4()),
-                    'timestamp': now,
-                    'source': 'cve_ingest',
-                    'patchId': patch_id,
-                    'message': f"Ingested CVE {entry.get('cve')}",
-                })
         except Exception as e:
-            print('Failed to write item', e)
+            print('Failed to write item', patch_id, e)
+            failed.append(entry)
+            continue
+
+        if summary_table is not None:
+            try:
+                summary.record_patch_change(
+                    summary_table, created=True, severity=patch_item['severity'],
+                    new_status='PENDING')
+            except Exception as e:
+                print('Failed to update summary', e)
+
+        event_buffer.emit('cve_ingest', f"Ingested CVE {entry.get('cve')}",
+                          patch_id=patch_id)
+    if failed:
+        raise IngestError(f"{len(failed)} of {len(entries)} entries were not written",
+                          written=new_count, failed=failed)
+    return new_count
+
+
+def enqueue_entries(entries: list, queue_url: str, chunk_size: int = None) -> int:
+    """Fan entries out to the ingest queue in chunks; returns messages sent.
+
+    Chunks SQS reports as Failed are resent; IngestError is raised if any
+    are still failing after ENQUEUE_ATTEMPTS.
+    """
+    chunk_size = chunk_size or INGEST_CHUNK_SIZE
+    sqs = boto3.client('sqs')
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    sent = 0
+    failed = []
+    # SendMessageBatch accepts at most 10 messages per call
+    for start in range(0, len(chunks), 10):
+        batch = [{"Id": str(start + i), "MessageBody": json.dumps({"entries": chunk})}
+                 for i, chunk in enumerate(chunks[start:start + 10])]
+        for attempt in range(ENQUEUE_ATTEMPTS):
+            if attempt:
+                time.sleep(0.1 * 2 ** attempt)
+            resp = sqs.send_message_batch(QueueUrl=queue_url, Entries=batch)
+            retry = {f['Id'] for f in resp.get('Failed', [])}
+            sent += len(batch) - len(retry)
+            batch = [message for message in batch if message['Id'] in retry]
+            if not batch:
+                break
+            print('Failed to enqueue chunks', resp.get('Failed'))
+        failed.extend(batch)
+    if failed:
+        raise IngestError(f"{len(failed)} of {len(chunks)} chunks were not enqueued",
+                          written=sent, failed=failed)
+    return sent
 
+
+@event_buffer.flushing
+@resilience.within_deadline
+def lambda_handler(event, context):
+    """Simple CVE ingestion Lambda.
+
+    - Fetches a sample CVE feed (or vendor URL configured via env)
+    - Parses entries and writes new patches to the PATCHES_TABLE_NAME, or,
+      when INGEST_QUEUE_URL is set, fans them out to worker invocations
+    - Emits an event record to EVENTS_TABLE_NAME for each ingest (buffered,
+      flushed in batches and always at the end of the invocation)
+    This is intentionally simple and safe for hackathon/demo use.
+
+    Raises IngestError when entries could not be stored or queued, so the
+    invocation fails and is retried.
+    """
+    if not os.getenv('PATCHES_TABLE_NAME'):
+        return {"status": "error", "message": "PATCHES_TABLE_NAME not configured"}
+
+    entries = parse_feed(fetch_feed())
+    patches_table, summary_table = _get_tables()
+
+    queue_url = os.getenv('INGEST_QUEUE_URL')
+    if queue_url:
+        # lastIngestAt is stamped by the workers once the patches are written
+        messages = enqueue_entries(entries, queue_url)
+        return {"status": "ok", "queued": len(entries), "messages": messages}
+
+    new_count = write_entries(entries, patches_table, summary_table)
+    _record_ingest(summary_table)
     return {"status": "ok", "ingested": new_count}
+
+
+def _record_ingest(summary_table) -> None:
+    if summary_table is None:
+        return
+    try:
+        summary.record_ingest(summary_table)
+    except Exception as e:
+        print('Failed to update summary', e)
+
+
+@event_buffer.flushing
+@resilience.within_deadline
+def worker_handler(event, context):
+    """SQS worker: write one queued chunk of entries per record.
+
+    Failed records (malformed, or with any entry that could not be written)
+    are reported individually so only they are retried and, after the
+    queue's maxReceiveCount, land in the dead-letter queue.
+    """
+    if not os.getenv('PATCHES_TABLE_NAME'):
+        raise RuntimeError("PATCHES_TABLE_NAME not configured")
+
+    patches_table, summary_table = _get_tables()
+    failures = []
+    ingested = 0
+    for record in event.get('Records', []):
+        try:
+            entries = json.loads(record['body']).get('entries', [])
+            ingested += write_entries(entries, patches_table, summary_table)
+        except IngestError as e:
+            print('Failed to write ingest record', record.get('messageId'), e)
+            ingested += e.written
+            failures.append({"itemIdentifier": record.get('messageId')})
+        except Exception as e:
+            print('Failed to process ingest record', record.get('messageId'), e)
+            failures.append({"itemIdentifier": record.get('messageId')})
+    if len(failures) < len(event.get('Records', [])):
+        _record_ingest(summary_table)
+    print(f"Ingest worker wrote {ingested} patches")
+    return {"batchItemFailures": failures}
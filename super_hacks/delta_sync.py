@@ -0,0 +1,148 @@
+# super_hacks/delta_sync.py
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import projection
+from responses import etag_matches
+
+# Version tokens trail the clock by this much so writes from other Lambdas
+# with slightly skewed clocks, or still in flight, land in the next delta.
+SYNC_SKEW_SECONDS = float(os.getenv('SYNC_SKEW_SECONDS', '2'))
+# How long this container answers a matching If-None-Match with 304 straight
+# from memory; writes made by other containers become visible after this.
+ETAG_CACHE_SECONDS = float(os.getenv('ETAG_CACHE_SECONDS', '5'))
+ETAG_CACHE_MAX_ENTRIES = 512
+# Deleted items leave a tombstone for this long so delta polls report them;
+# a client away longer than this must reload the full list
+TOMBSTONE_TTL_DAYS = int(os.getenv('TOMBSTONE_TTL_DAYS', '7'))
+
+# Tokens always carry microseconds so they compare correctly, as strings,
+# against the timestamps stored by datetime.isoformat()
+_TOKEN_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def version_token(now: float = None) -> str:
+    """Version a client should send as ``since`` on its next poll."""
+    moment = datetime.fromtimestamp((time.time() if now is None else now) - SYNC_SKEW_SECONDS, tz=timezone.utc)
+    return moment.strftime(_TOKEN_FORMAT)
+
+
+def tombstone_expiry(now: float = None) -> int:
+    """Epoch seconds at which DynamoDB's TTL may remove a tombstone written now."""
+    return int((time.time() if now is None else now) + TOMBSTONE_TTL_DAYS * 86400)
+
+
+def parse_since(value) -> str:
+    """Normalise a version token or ISO timestamp; raises ValueError when it is neither."""
+    moment = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime(_TOKEN_FORMAT)
+
+
+def high_water(items, attribute: str, floor: str = None, started: float = None) -> str:
+    """Version covering ``items``: their latest ``attribute``, or ``floor`` when none.
+
+    Capped at version_token(started) so a write still in flight on another
+    Lambda, stamped just before our read, is returned by the next delta. On
+    a quiet table the version is stable, so repeated polls produce identical
+    bodies (and ETags).
+    """
+    stamps = [str(item[attribute]) for item in items if item.get(attribute)]
+    latest = parse_since(max(stamps)) if stamps else floor
+    if latest is None:
+        return None
+    return min(latest, version_token(started))
+
+
+def changed_since(table, attribute: str, since: str, limit: int, fields=None) -> tuple:
+    """Items whose ``attribute`` is later than ``since``, oldest change first.
+
+    Returns (items, version, more). When more than ``limit`` items changed the
+    oldest ``limit`` are returned with the version of the last one, so the
+    client catches up over several polls without skipping anything. Items
+    sharing a timestamp are never split across pages, so a page may run
+    over ``limit`` when more than ``limit`` of them share the cut.
+    ``fields`` limits the attributes read; it must include ``attribute``.
+    Deleted items come back as their tombstones, for as long as those live.
+
+    Each poll is a filtered Scan: DynamoDB reads (and bills) the whole table
+    and only the returned items shrink. A GSI can't help here, since every
+    item would share one partition key, so the API Gateway cache and the
+    ETag short-circuit below are what keep repeated polls cheap.
+    """
+    started = time.time()
+    kwargs = {
+        'FilterExpression': '#v > :since',
+        'ExpressionAttributeNames': {'#v': attribute},
+        'ExpressionAttributeValues': {':since': since},
+    }
+    projection.add(kwargs, fields)
+    items = []
+    while True:
+        resp = table.scan(**kwargs)
+        items.extend(resp.get('Items', []))
+        if 'LastEvaluatedKey' not in resp:
+            break
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+    items.sort(key=lambda item: str(item.get(attribute, '')))
+    if len(items) > limit:
+        page = items[:limit]
+        cut = page[-1][attribute]
+        if items[limit][attribute] == cut:
+            # Never split items sharing a timestamp across pages: '>' would skip the rest.
+            # Stop before them, or, when they fill the page, return all of them.
+            page = [item for item in page if item[attribute] != cut] or \
+                [item for item in items if item[attribute] <= cut]
+        return page, high_water(page, attribute, since, started), len(page) < len(items)
+    return items, high_water(items, attribute, since, started), False
+
+
+# In-process record of the ETags this container has served, so an unchanged
+# poll is answered before any table read or serialization happens.
+_etags = {}
+_etags_lock = threading.Lock()
+# Bumped on every local change; every state change in this app emits a
+# pipeline event, so event_buffer.emit calls mark_changed
+_generation = 0
+
+
+def mark_changed() -> None:
+    global _generation
+    _generation += 1
+
+
+def generation() -> int:
+    """Take this before reading, and pass it to remember() with the response."""
+    return _generation
+
+
+def cache_key(route: str, params: dict) -> str:
+    return route + '?' + json.dumps(params or {}, sort_keys=True, default=str)
+
+
+def cached_etag(event, key: str, now: float = None):
+    """Return the ETag to answer with 304 when the client already has the current response."""
+    with _etags_lock:
+        entry = _etags.get(key)
+    if entry is None:
+        return None
+    etag, expires, generation = entry
+    if generation != _generation or (time.monotonic() if now is None else now) >= expires:
+        return None
+    return etag if etag_matches(event, etag) else None
+
+
+def remember(key: str, etag: str, read_generation: int, now: float = None) -> None:
+    if not etag:
+        return
+    expires = (time.monotonic() if now is None else now) + ETAG_CACHE_SECONDS
+    with _etags_lock:
+        if len(_etags) >= ETAG_CACHE_MAX_ENTRIES and key not in _etags:
+            # Cheap bound on memory: drop the oldest remembered response
+            _etags.pop(next(iter(_etags)))
+        _etags[key] = (etag, expires, read_generation)
@@ -0,0 +1,158 @@
+# super_hacks/event_archive.py
+
+import gzip
+import io
+import json
+import os
+import time
+from datetime import datetime, timedelta, date
+
+from responses import to_jsonable
+
+# Events expire from the hot table after this many days (DynamoDB TTL)...
+EVENTS_TTL_DAYS = int(os.getenv('EVENTS_TTL_DAYS', '30'))
+# ...and are compacted into S3 once they are this old, well before they expire.
+ARCHIVE_AFTER_DAYS = int(os.getenv('EVENTS_ARCHIVE_AFTER_DAYS', '7'))
+ARCHIVE_PREFIX = os.getenv('EVENTS_ARCHIVE_PREFIX', 'events')
+# Upper bound on days read by a single history query
+MAX_HISTORY_DAYS = 93
+# Events returned by one history query, by default and at most
+HISTORY_DEFAULT_LIMIT = 500
+HISTORY_MAX_LIMIT = 1000
+
+
+def expires_at(now: float = None) -> int:
+    """Epoch seconds at which a new event should expire from the hot table."""
+    return int((now or time.time()) + EVENTS_TTL_DAYS * 86400)
+
+
+def partition_key(day: date) -> str:
+    """S3 key of the compacted object for one UTC day of events."""
+    return f"{ARCHIVE_PREFIX}/dt={day.isoformat()}/events.ndjson.gz"
+
+
+def _scan_day(events_table, day: date):
+    """Yield every event whose timestamp falls on ``day``, following pagination."""
+    kwargs = {
+        'FilterExpression': 'begins_with(#ts, :day)',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ExpressionAttributeValues': {':day': day.isoformat()},
+    }
+    while True:
+        resp = events_table.scan(**kwargs)
+        yield from resp.get('Items', [])
+        if 'LastEvaluatedKey' not in resp:
+            return
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+
+def compact_day(events_table, s3, bucket: str, day: date) -> dict:
+    """Roll one day of events into a gzip-compressed NDJSON object.
+
+    The object key depends only on the day, so re-running the job for the
+    same day rewrites the same object instead of duplicating history.
+    """
+    events = sorted(_scan_day(events_table, day), key=lambda e: e.get('timestamp', ''))
+    if not events:
+        return {"day": day.isoformat(), "events": 0}
+
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+        for event in events:
+            gz.write(json.dumps(to_jsonable(event), separators=(',', ':')).encode('utf-8'))
+            gz.write(b'\n')
+
+    key = partition_key(day)
+    s3.put_object(Bucket=bucket, Key=key, Body=buf.getvalue(),
+                  ContentType='application/x-ndjson', ContentEncoding='gzip')
+    return {"day": day.isoformat(), "events": len(events), "key": key,
+            "bytes": buf.tell()}
+
+
+def read_history(s3, bucket: str, start: date, end: date, source: str = None,
+                 patch_id: str = None, limit: int = 500) -> list:
+    """Read archived events for the inclusive day range, newest first."""
+    events = []
+    day = end
+    while day >= start and len(events) < limit:
+        try:
+            obj = s3.get_object(Bucket=bucket, Key=partition_key(day))
+        except Exception as e:
+            # A missing partition simply means no events were archived that day
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code not in ('NoSuchKey', '404'):
+                raise
+            day -= timedelta(days=1)
+            continue
+        lines = gzip.decompress(obj['Body'].read()).splitlines()
+        for line in reversed(lines):
+            event = json.loads(line)
+            if source and event.get('source') != source:
+                continue
+            if patch_id and event.get('patchId') != patch_id:
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                break
+        day -= timedelta(days=1)
+    return events
+
+
+def _parse_day(value, default: date) -> date:
+    if not value:
+        return default
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def list_event_history(params: dict) -> dict:
+    """Action entry point: query archived events by day range, source or patch."""
+    import tools
+
+    bucket = os.getenv('EVENT_ARCHIVE_BUCKET_NAME')
+    if not bucket:
+        return {"status": "error", "message": "EVENT_ARCHIVE_BUCKET_NAME not configured in environment."}
+    today = datetime.utcnow().date()
+    try:
+        end = _parse_day(params.get('end'), today)
+        start = _parse_day(params.get('start'), end - timedelta(days=EVENTS_TTL_DAYS))
+        limit = params.get('limit')
+        limit = HISTORY_DEFAULT_LIMIT if limit in (None, '') else int(limit)
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid history range: {e}"}
+    if limit < 1:
+        return {"status": "error", "message": "limit must be a positive integer."}
+    limit = min(HISTORY_MAX_LIMIT, limit)
+    if (end - start).days > MAX_HISTORY_DAYS:
+        return {"status": "error", "message": f"History range is limited to {MAX_HISTORY_DAYS} days."}
+    try:
+        events = read_history(tools.get_s3_client(), bucket, start, end,
+                              source=params.get('source'),
+                              patch_id=params.get('patch_id') or params.get('patchId'),
+                              limit=limit)
+    except Exception as e:
+        return {"status": "error", "message": f"S3 read failed: {e}"}
+    return {"events": events, "start": start.isoformat(), "end": end.isoformat()}
+
+
+def lambda_handler(event, context):
+    """Daily compaction job.
+
+    Archives the day that is ARCHIVE_AFTER_DAYS old by default. A scheduled
+    rule or an operator can pass {"day": "YYYY-MM-DD"} or {"days": N} to
+    backfill the N days ending at that day.
+    """
+    import tools
+
+    bucket = os.getenv('EVENT_ARCHIVE_BUCKET_NAME')
+    events_table = tools.get_table('EVENTS_TABLE_NAME')
+    if not bucket or events_table is None:
+        return {"status": "error", "message": "EVENTS_TABLE_NAME and EVENT_ARCHIVE_BUCKET_NAME must be configured"}
+
+    event = event or {}
+    last_day = _parse_day(event.get('day'),
+                          datetime.utcnow().date() - timedelta(days=ARCHIVE_AFTER_DAYS))
+    days = max(1, int(event.get('days', 1)))
+    s3 = tools.get_s3_client()
+    results = [compact_day(events_table, s3, bucket, last_day - timedelta(days=i))
+               for i in range(days)]
+    return {"status": "ok", "archived": results}
@@ -0,0 +1,293 @@
+# super_hacks/event_buffer.py
+
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+
+import delta_sync
+import ws_publisher
+from event_archive import expires_at
+from responses import dumps
+
+# DynamoDB BatchWriteItem takes at most 25 items, so flush at that size...
+EVENT_BUFFER_MAX_ITEMS = int(os.getenv('EVENT_BUFFER_MAX_ITEMS', '25'))
+# ...or once the oldest buffered event has waited this long.
+EVENT_BUFFER_MAX_AGE_SECONDS = float(os.getenv('EVENT_BUFFER_MAX_AGE_SECONDS', '2'))
+FLUSH_ATTEMPTS = 3
+# Events still unwritten after FLUSH_ATTEMPTS are sent here; replay_handler
+# writes them once the table recovers
+EVENTS_FALLBACK_QUEUE_URL = os.getenv('EVENTS_FALLBACK_QUEUE_URL')
+# Events per fallback message, far inside SQS's 256 KB message limit
+FALLBACK_MESSAGE_EVENTS = 25
+
+
+class EventFlushError(Exception):
+    """Events could be neither written nor handed to the fallback queue; they stay buffered."""
+
+    def __init__(self, message: str, pending: int):
+        super().__init__(message)
+        self.pending = pending
+
+
+def _events_table():
+    if not os.getenv('EVENTS_TABLE_NAME'):
+        return None
+    import tools
+    return tools.get_table('EVENTS_TABLE_NAME')
+
+
+def _write(table, items: list) -> None:
+    # batch_writer groups puts into BatchWriteItem calls and
+    # resubmits any unprocessed items itself
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+
+def send_to_fallback(items: list, queue_url: str = None) -> bool:
+    """Queue events the table would not take; False when no fallback queue is configured."""
+    queue_url = queue_url or EVENTS_FALLBACK_QUEUE_URL
+    if not queue_url:
+        return False
+    sqs = boto3.client('sqs')
+    chunks = [items[i:i + FALLBACK_MESSAGE_EVENTS] for i in range(0, len(items), FALLBACK_MESSAGE_EVENTS)]
+    # SendMessageBatch accepts at most 10 messages per call
+    for start in range(0, len(chunks), 10):
+        batch = [{"Id": str(start + i), "MessageBody": dumps({"events": chunk}).decode('utf-8')}
+                 for i, chunk in enumerate(chunks[start:start + 10])]
+        resp = sqs.send_message_batch(QueueUrl=queue_url, Entries=batch)
+        if resp.get('Failed'):
+            raise RuntimeError(f"{len(resp['Failed'])} fallback messages were not sent")
+    return True
+
+
+class EventBuffer:
+    """In-memory buffer of pipeline event records, written in batches.
+
+    ``emit`` only appends under a lock, so any module (and any thread) can
+    record an event cheaply. Buffered events are written with the table's
+    batch writer when the buffer is full, when the oldest event is older than
+    ``max_age`` seconds (checked on emit and by a timer, so a quiet buffer is
+    flushed too), or when ``flush`` is called at the end of an invocation.
+    Events the table still refuses after FLUSH_ATTEMPTS go to the fallback
+    queue; without one they stay buffered and flush raises EventFlushError.
+    Written batches are handed to ``publisher`` for WebSocket fan-out on a
+    background thread; ``wait_published`` waits for that.
+    """
+
+    def __init__(self, table_resolver=_events_table, max_items: int = EVENT_BUFFER_MAX_ITEMS,
+                 max_age: float = EVENT_BUFFER_MAX_AGE_SECONDS, clock=time.monotonic,
+                 publisher=None, fallback=send_to_fallback, timer: bool = True):
+        self._table_resolver = table_resolver
+        self._publisher = publisher
+        self._fallback = fallback
+        self.max_items = max_items
+        self.max_age = max_age
+        self._clock = clock
+        self._items = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        # Serialises flushes so two threads never write the same batch twice
+        self._flush_lock = threading.Lock()
+        self._use_timer = timer
+        self._timer = None
+        # One publishing thread keeps batches in order without blocking emit
+        self._publish_pool = None
+        self._published = []
+
+    def __len__(self):
+        return len(self._items)
+
+    def emit(self, source: str, message: str, patch_id: str = None, **fields) -> dict:
+        """Buffer one event record and return it."""
+        item = {
+            'eventId': str(uuid.uuid4()),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'source': source,
+            'message': message,
+            'expiresAt': expires_at(),
+            **fields,
+        }
+        if patch_id:
+            item['patchId'] = patch_id
+        # Whatever produced the event changed state, so cached ETags are stale
+        delta_sync.mark_changed()
+        with self._lock:
+            if not self._items:
+                self._oldest = self._clock()
+                self._arm_timer()
+            self._items.append(item)
+            due = (len(self._items) >= self.max_items
+                   or self._clock() - self._oldest >= self.max_age)
+        if due:
+            self._flush_quietly()
+        return item
+
+    def _arm_timer(self) -> None:
+        # Called under self._lock when the first event is buffered
+        if not self._use_timer:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.max_age, self._flush_quietly)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_quietly(self) -> None:
+        # The event was recorded; a failed write must not fail whatever emitted it
+        try:
+            self.flush()
+        except EventFlushError as e:
+            print('Event flush failed, events kept for the next flush:', e)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of events written.
+
+        Raises EventFlushError when the events could be neither written nor
+        queued for replay; they stay buffered for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._items, self._oldest = self._items, [], None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return 0
+
+            table = self._table_resolver()
+            if table is None:
+                print(f'EVENTS_TABLE_NAME not configured; dropping {len(pending)} events')
+                return 0
+
+            last_error = None
+            for attempt in range(FLUSH_ATTEMPTS):
+                if attempt:
+                    time.sleep(0.1 * (2 ** (attempt - 1)))
+                try:
+                    _write(table, pending)
+                    break
+                except Exception as e:
+                    last_error = e
+            else:
+                try:
+                    queued = self._fallback(pending)
+                except Exception as e:
+                    print('Failed to queue events for replay:', e)
+                    queued = False
+                if queued:
+                    print(f'Queued {len(pending)} unwritten events for replay:', last_error)
+                    return 0
+                # Keep the events for the next flush rather than losing them
+                with self._lock:
+                    self._items = pending + self._items
+                    self._oldest = self._clock()
+                    self._arm_timer()
+                raise EventFlushError(f'Failed to write {len(pending)} events: {last_error}', len(pending))
+
+            self._publish(pending)
+            return len(pending)
+
+    def _publish(self, items: list) -> None:
+        """Push a written batch to WebSocket subscribers without holding up the writer."""
+        if self._publish_pool is None:
+            self._publish_pool = ThreadPoolExecutor(max_workers=1)
+        future = self._publish_pool.submit(self._publish_now, items)
+        with self._lock:
+            self._published = [f for f in self._published if not f.done()] + [future]
+
+    def _publish_now(self, items: list) -> None:
+        try:
+            (self._publisher or ws_publisher.publish)(items)
+        except Exception as e:
+            print('Failed to publish events:', e)
+
+    def wait_published(self, timeout: float = None) -> None:
+        """Wait for batches handed to the publisher, e.g. before the invocation ends."""
+        with self._lock:
+            pending = list(self._published)
+        if pending:
+            wait(pending, timeout=timeout)
+
+    def discard(self) -> None:
+        """Drop anything buffered without writing it."""
+        with self._lock:
+            self._items, self._oldest = [], None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_buffer = EventBuffer()
+
+
+def emit(source: str, message: str, patch_id: str = None, **fields) -> dict:
+    """Record a pipeline event on the process-wide buffer."""
+    return _buffer.emit(source, message, patch_id=patch_id, **fields)
+
+
+def flush() -> int:
+    return _buffer.flush()
+
+
+def wait_published(timeout: float = None) -> None:
+    _buffer.wait_published(timeout)
+
+
+def flushing(handler):
+    """Decorate a Lambda handler so buffered events are flushed when it returns or raises.
+
+    A flush that loses events (EventFlushError) fails an otherwise successful
+    invocation, so the caller or event source sees it; a handler's own
+    exception is never masked.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            result = handler(event, context)
+        except BaseException:
+            try:
+                flush()
+                wait_published()
+            except Exception as e:
+                print('Event flush failed:', e)
+            raise
+        flush()
+        # Lambda freezes the container on return; finish pushing to subscribers first
+        wait_published()
+        return result
+    return wrapper
+
+
+def replay_handler(event, context):
+    """SQS consumer for the fallback queue: write queued events to the table.
+
+    Records that still can't be written are reported individually so only
+    they are retried and, after maxReceiveCount, land in the dead-letter queue.
+    """
+    table = _events_table()
+    if table is None:
+        raise RuntimeError("EVENTS_TABLE_NAME not configured")
+    failures = []
+    written = []
+    for record in event.get('Records', []):
+        try:
+            # DynamoDB takes numbers as Decimal, never float
+            items = json.loads(record['body'], parse_float=Decimal).get('events', [])
+            _write(table, items)
+            written.extend(items)
+        except Exception as e:
+            print('Failed to replay events', record.get('messageId'), e)
+            failures.append({"itemIdentifier": record.get('messageId')})
+    if written:
+        _buffer._publish_now(written)
+    print(f"Replayed {len(written)} events")
+    return {"batchItemFailures": failures}
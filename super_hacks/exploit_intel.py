@@ -0,0 +1,424 @@
+# super_hacks/exploit_intel.py
+
+import csv
+import gzip
+import io
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from array import array
+from decimal import Decimal
+from typing import Optional
+
+# Sources are read from the environment when the index is loaded:
+#   KEV_SOURCE           CISA Known Exploited Vulnerabilities catalogue (JSON or CSV)
+#   EPSS_SOURCE          FIRST EPSS scores (CSV, optionally gzipped)
+#   EXPLOIT_INTEL_INDEX  a prebuilt index (published by lambda_handler or
+#                        scripts/build_exploit_index.py), preferred while it is readable
+# each a local path or an s3://bucket/key copy.
+
+# Where indexes built or downloaded by this container are kept
+EXPLOIT_INTEL_CACHE_DIR = os.getenv('EXPLOIT_INTEL_CACHE_DIR', '/tmp/exploit_intel')
+# EPSS is republished daily; warm containers reload the index this often
+EXPLOIT_INTEL_REFRESH_SECONDS = int(os.getenv('EXPLOIT_INTEL_REFRESH_SECONDS', str(6 * 3600)))
+# After a failed load, try again this much later rather than on every lookup
+EXPLOIT_INTEL_RETRY_SECONDS = 300
+
+# Impact score points for exploitation evidence
+KEV_BONUS = 20
+RANSOMWARE_BONUS = 5
+EPSS_MAX_BONUS = 10
+
+# Sequence numbers above this (e.g. the CVE-2017-1000xxx block) are kept in a
+# small dict instead of stretching their year's dense table to a million slots
+DENSE_MAX_SEQUENCE = 200_000
+
+_MAGIC = b'IPOXI1\n'
+_SCALE = 100_000
+_MISSING = 0xFFFFFFFF
+_FLAG_KEV = 1
+_FLAG_RANSOMWARE = 2
+
+
+def parse_cve(cve_id) -> Optional[tuple]:
+    """(year, sequence) for an ID like CVE-2024-12345, or None."""
+    if not cve_id:
+        return None
+    parts = str(cve_id).strip().upper().split('-')
+    if len(parts) != 3 or parts[0] != 'CVE' or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return int(parts[1]), int(parts[2])
+
+
+def _scaled(value) -> int:
+    try:
+        return min(_SCALE, max(0, round(float(value) * _SCALE)))
+    except (TypeError, ValueError):
+        return _MISSING
+
+
+class ExploitIndex:
+    """CVE-keyed KEV/EPSS data in dense per-year arrays.
+
+    Each year owns a contiguous run of slots indexed by CVE sequence number,
+    so a lookup is a dict hit on the year plus three array reads. Saved
+    indexes are opened with mmap, which makes loading one independent of
+    its size.
+    """
+
+    def __init__(self, header: dict, epss, percentile, flags, mapped=None):
+        self.header = header
+        self._years = {int(year): tuple(span) for year, span in header['years'].items()}
+        self._overflow = header.get('overflow', {})
+        self._epss = epss
+        self._percentile = percentile
+        self._flags = flags
+        self._mapped = mapped
+
+    @classmethod
+    def build(cls, kev: dict = None, epss: dict = None, meta: dict = None) -> 'ExploitIndex':
+        """Index ``kev`` ({cve: ransomware bool}) and ``epss`` ({cve: (score, percentile)})."""
+        kev, epss = kev or {}, epss or {}
+        rows = {}
+        for cve, (score, percentile) in epss.items():
+            rows[cve] = [_scaled(score), _scaled(percentile), 0]
+        for cve, ransomware in kev.items():
+            row = rows.setdefault(cve, [_MISSING, _MISSING, 0])
+            row[2] = _FLAG_KEV | (_FLAG_RANSOMWARE if ransomware else 0)
+
+        spans, overflow, dense = {}, {}, []
+        for cve, row in rows.items():
+            parsed = parse_cve(cve)
+            if parsed is None:
+                continue
+            year, seq = parsed
+            if seq > DENSE_MAX_SEQUENCE:
+                overflow[f'CVE-{year}-{seq}'] = row
+                continue
+            spans[year] = max(spans.get(year, 0), seq + 1)
+            dense.append((year, seq, row))
+        years, offset = {}, 0
+        for year in sorted(spans):
+            years[str(year)] = [offset, spans[year]]
+            offset += spans[year]
+
+        epss_values = array('I', [_MISSING]) * offset
+        percentiles = array('I', [_MISSING]) * offset
+        flags = array('B', [0]) * offset
+        for year, seq, (score, percentile, flag) in dense:
+            slot = years[str(year)][0] + seq
+            epss_values[slot], percentiles[slot], flags[slot] = score, percentile, flag
+
+        header = dict(meta or {})
+        header.update({'years': years, 'overflow': overflow, 'slots': offset,
+                       'entries': len(dense) + len(overflow),
+                       'kev': len(kev), 'epss': len(epss), 'byteorder': sys.byteorder})
+        return cls(header, epss_values, percentiles, flags)
+
+    def save(self, path: str) -> None:
+        """Write the index atomically so open mappings of an older file stay valid."""
+        header = json.dumps(self.header, separators=(',', ':')).encode('utf-8')
+        # Pad so the arrays start on an 8 byte boundary
+        prefix = _MAGIC + len(header).to_bytes(4, 'little') + header
+        prefix += b'\0' * (-len(prefix) % 8)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(prefix)
+            f.write(bytes(self._epss))
+            f.write(bytes(self._percentile))
+            f.write(bytes(self._flags))
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path: str) -> 'ExploitIndex':
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(_MAGIC)] != _MAGIC:
+            mapped.close()
+            raise ValueError(f'{path} is not an exploit intelligence index')
+        size = int.from_bytes(mapped[len(_MAGIC):len(_MAGIC) + 4], 'little')
+        start = len(_MAGIC) + 4
+        header = json.loads(mapped[start:start + size])
+        start += size
+        start += -start % 8
+        slots = header['slots']
+        if header.get('byteorder') != sys.byteorder:
+            # Built on a machine of the other endianness: copy and swap instead of mapping
+            epss, percentile = array('I'), array('I')
+            epss.frombytes(mapped[start:start + 4 * slots])
+            percentile.frombytes(mapped[start + 4 * slots:start + 8 * slots])
+            epss.byteswap()
+            percentile.byteswap()
+            flags = array('B', mapped[start + 8 * slots:start + 9 * slots])
+            mapped.close()
+            return cls(header, epss, percentile, flags)
+        view = memoryview(mapped)
+        return cls(header,
+                   view[start:start + 4 * slots].cast('I'),
+                   view[start + 4 * slots:start + 8 * slots].cast('I'),
+                   view[start + 8 * slots:start + 9 * slots],
+                   mapped=mapped)
+
+    def __len__(self) -> int:
+        return self.header['entries']
+
+    def lookup(self, cve_id) -> Optional[dict]:
+        """KEV and EPSS data for one CVE, or None when neither source lists it."""
+        parsed = parse_cve(cve_id)
+        if parsed is None:
+            return None
+        year, seq = parsed
+        span = self._years.get(year)
+        if span is not None and seq < span[1]:
+            slot = span[0] + seq
+            score, percentile, flag = self._epss[slot], self._percentile[slot], self._flags[slot]
+        elif f'CVE-{year}-{seq}' in self._overflow:
+            score, percentile, flag = self._overflow[f'CVE-{year}-{seq}']
+        else:
+            return None
+        if score == _MISSING and not flag:
+            return None
+        return {
+            'kev': bool(flag & _FLAG_KEV),
+            'ransomware': bool(flag & _FLAG_RANSOMWARE),
+            'epss': None if score == _MISSING else score / _SCALE,
+            'epssPercentile': None if percentile == _MISSING else percentile / _SCALE,
+        }
+
+
+def parse_kev(data: bytes) -> tuple:
+    """({cve: known ransomware use}, catalogue version) from the CISA JSON or CSV file."""
+    text = data.decode('utf-8-sig')
+    if text.lstrip().startswith('{'):
+        doc = json.loads(text)
+        rows = doc.get('vulnerabilities', [])
+        version = doc.get('catalogVersion') or doc.get('dateReleased')
+    else:
+        rows = csv.DictReader(io.StringIO(text))
+        version = None
+    kev = {}
+    for row in rows:
+        cve = (row.get('cveID') or '').strip().upper()
+        if cve:
+            kev[cve] = (row.get('knownRansomwareCampaignUse') or '').strip().lower() == 'known'
+    return kev, version
+
+
+def parse_epss(data: bytes) -> tuple:
+    """({cve: (epss, percentile)}, score date) from a FIRST EPSS CSV."""
+    score_date = None
+    epss = {}
+    for line in data.decode('utf-8-sig').splitlines():
+        if line.startswith('#'):
+            # e.g. #model_version:v2023.03.01,score_date:2024-05-01T00:00:00+0000
+            for part in line[1:].split(','):
+                name, _, value = part.partition(':')
+                if name.strip() == 'score_date':
+                    score_date = value.strip()
+            continue
+        fields = line.split(',')
+        if len(fields) < 3 or not fields[0].upper().startswith('CVE-'):
+            continue
+        epss[fields[0].strip().upper()] = (fields[1], fields[2])
+    return epss, score_date
+
+
+def _split_s3(location: str) -> tuple:
+    bucket, _, key = location[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def _signature(location: str) -> str:
+    """Cheap change marker for a source: S3 ETag, or local mtime and size."""
+    if location.startswith('s3://'):
+        import tools
+        bucket, key = _split_s3(location)
+        return tools.get_s3_client().head_object(Bucket=bucket, Key=key)['ETag']
+    stat = os.stat(location)
+    return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+
+def _read(location: str) -> bytes:
+    if location.startswith('s3://'):
+        import tools
+        bucket, key = _split_s3(location)
+        data = tools.get_s3_client().get_object(Bucket=bucket, Key=key)['Body'].read()
+    else:
+        with open(location, 'rb') as f:
+            data = f.read()
+    return gzip.decompress(data) if data[:2] == b'\x1f\x8b' else data
+
+
+def build_from_sources(kev_source: str = None, epss_source: str = None) -> ExploitIndex:
+    meta = {'sources': {}}
+    kev, epss = {}, {}
+    if kev_source:
+        kev, meta['kevVersion'] = parse_kev(_read(kev_source))
+    if epss_source:
+        epss, meta['scoreDate'] = parse_epss(_read(epss_source))
+    return ExploitIndex.build(kev, epss, meta)
+
+
+def _open_prebuilt(index_location: str, cache_dir: str) -> ExploitIndex:
+    if not index_location.startswith('s3://'):
+        return ExploitIndex.open(index_location)
+    path = os.path.join(cache_dir, 'prebuilt.idx')
+    signature = _signature(index_location)
+    if not os.path.exists(path) or _cached_signature(path) != signature:
+        raw = _read(index_location)
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(raw)
+        os.replace(path + '.tmp', path)
+        with open(path + '.sig', 'w') as f:
+            f.write(signature)
+    return ExploitIndex.open(path)
+
+
+def load(kev_source: str = None, epss_source: str = None, index_location: str = None,
+         cache_dir: str = None) -> ExploitIndex:
+    """Open the index, downloading or rebuilding it only when its sources changed.
+
+    A prebuilt ``index_location`` is copied into ``cache_dir`` and mapped.
+    When there is none, or it can't be read (not published yet), the
+    KEV/EPSS sources are parsed once and the result is cached there, tagged
+    with the sources' signatures.
+    """
+    cache_dir = cache_dir or EXPLOIT_INTEL_CACHE_DIR
+    if index_location:
+        try:
+            return _open_prebuilt(index_location, cache_dir)
+        except Exception as e:
+            if not (kev_source or epss_source):
+                raise
+            print('Prebuilt exploit intelligence index unavailable, parsing the sources', e)
+
+    sources = {name: location for name, location in (('kev', kev_source), ('epss', epss_source)) if location}
+    signatures = {name: _signature(location) for name, location in sources.items()}
+    path = os.path.join(cache_dir, 'sources.idx')
+    if os.path.exists(path):
+        try:
+            cached = ExploitIndex.open(path)
+            if cached.header.get('sources') == signatures:
+                return cached
+        except (OSError, ValueError) as e:
+            print('Ignoring unreadable exploit intelligence cache', e)
+    index = build_from_sources(kev_source, epss_source)
+    index.header['sources'] = signatures
+    index.save(path)
+    return ExploitIndex.open(path)
+
+
+def _cached_signature(path: str) -> Optional[str]:
+    try:
+        with open(path + '.sig') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+
+def publish(kev_source: str, epss_source: str, destination: str, cache_dir: str = None) -> ExploitIndex:
+    """Build the index from the sources and write it to ``destination`` (a path or s3:// copy)."""
+    cache_dir = cache_dir or EXPLOIT_INTEL_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, 'publish.idx')
+    index = build_from_sources(kev_source, epss_source)
+    index.save(path)
+    if destination.startswith('s3://'):
+        import tools
+        bucket, key = _split_s3(destination)
+        with open(path, 'rb') as f:
+            tools.get_s3_client().put_object(Bucket=bucket, Key=key, Body=f.read())
+    else:
+        os.replace(path, destination)
+    return index
+
+
+def lambda_handler(event, context):
+    """Rebuild and publish EXPLOIT_INTEL_INDEX from KEV_SOURCE and EPSS_SOURCE.
+
+    Runs whenever either snapshot is uploaded, so cold starts elsewhere map
+    the prebuilt index instead of parsing the EPSS CSV.
+    """
+    destination = os.getenv('EXPLOIT_INTEL_INDEX')
+    kev_source, epss_source = os.getenv('KEV_SOURCE'), os.getenv('EPSS_SOURCE')
+    if not destination or not (kev_source or epss_source):
+        return {"status": "error", "message": "EXPLOIT_INTEL_INDEX and KEV_SOURCE or EPSS_SOURCE must be configured"}
+    index = publish(kev_source, epss_source, destination)
+    return {"status": "ok", "index": destination, "cves": len(index),
+            "kev": index.header.get('kev'), "epss": index.header.get('epss')}
+
+_index = None
+_checked_at = None
+_pinned = False
+_lock = threading.Lock()
+
+
+def configure(index: Optional[ExploitIndex]) -> None:
+    """Use ``index`` instead of loading one from the environment (None forgets it)."""
+    global _index, _checked_at, _pinned
+    _index, _checked_at, _pinned = index, None, index is not None
+
+
+def _due(now: float) -> bool:
+    if _checked_at is None:
+        return True
+    wait = EXPLOIT_INTEL_REFRESH_SECONDS if _index is not None else EXPLOIT_INTEL_RETRY_SECONDS
+    return now - _checked_at >= wait
+
+
+def get_index() -> Optional[ExploitIndex]:
+    """The container's index, or None when no sources are configured or loading failed."""
+    global _index, _checked_at
+    if _pinned:
+        return _index
+    index_location = os.getenv('EXPLOIT_INTEL_INDEX')
+    kev_source, epss_source = os.getenv('KEV_SOURCE'), os.getenv('EPSS_SOURCE')
+    if not (index_location or kev_source or epss_source):
+        return None
+    if _due(time.monotonic()):
+        with _lock:
+            if _due(time.monotonic()):
+                try:
+                    _index = load(kev_source, epss_source, index_location)
+                except Exception as e:
+                    # Scoring and ingest carry on without enrichment; keep any older index
+                    print('Failed to load exploit intelligence', e)
+                _checked_at = time.monotonic()
+    return _index
+
+
+def lookup(cve_id) -> Optional[dict]:
+    index = get_index()
+    return index.lookup(cve_id) if index is not None else None
+
+
+def attributes(intel: Optional[dict]) -> dict:
+    """Patch attributes recording ``intel``, in DynamoDB-ready types."""
+    if not intel:
+        return {}
+    attrs = {'kev': intel['kev']}
+    if intel['ransomware']:
+        attrs['knownRansomware'] = True
+    if intel['epss'] is not None:
+        attrs['epss'] = Decimal(str(intel['epss']))
+    if intel['epssPercentile'] is not None:
+        attrs['epssPercentile'] = Decimal(str(intel['epssPercentile']))
+    return attrs
+
+
+def score_bonus(intel: Optional[dict]) -> int:
+    """Impact score points for exploitation evidence: KEV listing and EPSS percentile."""
+    if not intel:
+        return 0
+    bonus = 0
+    if intel['kev']:
+        bonus += KEV_BONUS + (RANSOMWARE_BONUS if intel['ransomware'] else 0)
+    if intel['epssPercentile'] is not None:
+        bonus += round(EPSS_MAX_BONUS * intel['epssPercentile'])
+    return bonus
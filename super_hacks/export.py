@@ -0,0 +1,251 @@
+# super_hacks/export.py
+
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import boto3
+
+import resilience
+from responses import dumps
+
+# Tables that may be exported, by the name used in requests
+EXPORT_TABLES = {'patches': 'PATCHES_TABLE_NAME', 'assets': 'ASSETS_TABLE_NAME'}
+EXPORT_PREFIX = os.getenv('EXPORT_PREFIX', 'exports')
+# Parallel scan segments, each read by its own thread
+EXPORT_SEGMENTS = int(os.getenv('EXPORT_SEGMENTS', '4'))
+# Compressed bytes per multipart part; S3 needs at least 5 MB for all but the last
+EXPORT_PART_BYTES = max(5 * 1024 * 1024, int(os.getenv('EXPORT_PART_MB', '8')) * 1024 * 1024)
+EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', '6'))
+# Scan pages (up to 1 MB of items each) waiting to be compressed
+EXPORT_QUEUE_PAGES = int(os.getenv('EXPORT_QUEUE_PAGES', '4'))
+# Parts uploading while the next one is compressed
+EXPORT_UPLOADS_IN_FLIGHT = 2
+# Stop this long before the Lambda timeout so the upload can be aborted cleanly
+DEADLINE_MARGIN_SECONDS = 30
+# "wait": true exports run inside the API request; they are abandoned after
+# this long (or at the request deadline, if sooner) and must run asynchronously
+EXPORT_INLINE_SECONDS = float(os.getenv('EXPORT_INLINE_SECONDS', '20'))
+
+_lambda_client = None
+
+
+def _scan_segment(table, segment: int, total: int, pages: queue.Queue, stop: threading.Event):
+    # Deleted patches linger as tombstones until their TTL; they are not exported
+    kwargs = {'Segment': segment, 'TotalSegments': total,
+              'FilterExpression': 'attribute_not_exists(deleted)'}
+    try:
+        while not stop.is_set():
+            resp = table.scan(**kwargs)
+            _put(pages, resp.get('Items', []), stop)
+            if 'LastEvaluatedKey' not in resp:
+                break
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+    except Exception as e:
+        _put(pages, e, stop)
+    finally:
+        _put(pages, None, stop)
+
+
+def _put(pages: queue.Queue, value, stop: threading.Event):
+    # A bounded put that gives up once the consumer has stopped reading
+    while not stop.is_set():
+        try:
+            pages.put(value, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def export_table(table, s3, bucket: str, key: str, segments: int = None,
+                 part_bytes: int = None, deadline: float = None) -> dict:
+    """Stream every item of ``table`` into ``bucket/key`` as gzip NDJSON.
+
+    ``segments`` threads run a parallel scan and hand pages over a bounded
+    queue; the caller's thread serializes and compresses them and uploads a
+    multipart part each time ``part_bytes`` of compressed output is ready.
+    Memory stays at a few pages plus two parts whatever the table size.
+    ``deadline`` is a time.monotonic() value; once it passes the export stops
+    and the upload is aborted.
+    """
+    segments = max(1, segments or EXPORT_SEGMENTS)
+    part_bytes = part_bytes or EXPORT_PART_BYTES
+    started = time.perf_counter()
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType='application/x-ndjson', ContentEncoding='gzip')['UploadId']
+
+    pages = queue.Queue(maxsize=max(1, EXPORT_QUEUE_PAGES))
+    stop = threading.Event()
+    scanners = [threading.Thread(target=_scan_segment, args=(table, i, segments, pages, stop), daemon=True)
+                for i in range(segments)]
+    uploader = ThreadPoolExecutor(max_workers=EXPORT_UPLOADS_IN_FLIGHT)
+    uploads = []
+    parts = []
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    pending = bytearray()
+    items = raw_bytes = compressed_bytes = 0
+
+    def upload(data: bytes):
+        nonlocal compressed_bytes
+        compressed_bytes += len(data)
+        number = len(uploads) + 1
+        # Never hold more than EXPORT_UPLOADS_IN_FLIGHT parts in memory
+        running = [f for f in uploads if not f.done()]
+        if len(running) >= EXPORT_UPLOADS_IN_FLIGHT:
+            wait(running, return_when=FIRST_COMPLETED)
+        uploads.append(uploader.submit(
+            lambda: {'PartNumber': number, 'ETag': s3.upload_part(
+                Bucket=bucket, Key=key, PartNumber=number, UploadId=upload_id, Body=data)['ETag']}))
+
+    try:
+        for scanner in scanners:
+            scanner.start()
+        finished = 0
+        while finished < segments:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"export stopped after {items} items to stay within the time limit")
+            try:
+                page = pages.get(timeout=1)
+            except queue.Empty:
+                continue
+            if page is None:
+                finished += 1
+                continue
+            if isinstance(page, Exception):
+                raise page
+            chunk = b''.join(dumps(item) + b'\n' for item in page)
+            items += len(page)
+            raw_bytes += len(chunk)
+            pending += compressor.compress(chunk)
+            if len(pending) >= part_bytes:
+                upload(bytes(pending))
+                pending.clear()
+        pending += compressor.flush()
+        # The last part may be smaller than 5 MB (and is the only part of small exports)
+        upload(bytes(pending))
+        pending.clear()
+        parts = [f.result() for f in uploads]
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                     MultipartUpload={'Parts': parts})
+    except BaseException:
+        stop.set()
+        try:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            print('Failed to abort export upload', e)
+        raise
+    finally:
+        stop.set()
+        uploader.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "bucket": bucket,
+        "key": key,
+        "items": items,
+        "parts": len(parts),
+        "rawBytes": raw_bytes,
+        "compressedBytes": compressed_bytes,
+        "elapsedSeconds": round(elapsed, 3),
+        "itemsPerSecond": round(items / elapsed) if elapsed else None,
+        "rawMBPerSecond": round(raw_bytes / elapsed / 1e6, 2) if elapsed else None,
+    }
+
+
+def _export_key(table_name: str) -> str:
+    return f"{EXPORT_PREFIX}/{table_name}/{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.ndjson.gz"
+
+
+def _manifest_key(key: str) -> str:
+    return key[:-len('.ndjson.gz')] + '.manifest.json'
+
+
+def run_export(job: dict, deadline: float = None) -> dict:
+    """Export one table as described by ``job`` and write a manifest next to it."""
+    import tools
+
+    bucket = os.getenv('EXPORT_BUCKET_NAME')
+    table_name = job.get('table')
+    if not bucket:
+        return {"status": "error", "message": "EXPORT_BUCKET_NAME not configured in environment."}
+    if table_name not in EXPORT_TABLES:
+        return {"status": "error", "message": f"table must be one of {', '.join(sorted(EXPORT_TABLES))}"}
+    table = tools.get_table(EXPORT_TABLES[table_name])
+    if table is None:
+        return {"status": "error", "message": f"{EXPORT_TABLES[table_name]} not configured in environment."}
+    key = job.get('key') or _export_key(table_name)
+    s3 = tools.get_s3_client()
+    try:
+        result = export_table(table, s3, bucket, key, segments=job.get('segments'), deadline=deadline)
+    except TimeoutError as e:
+        result = {"status": "error", "message": f"Export failed: {e}", "key": key, "timedOut": True}
+    except Exception as e:
+        result = {"status": "error", "message": f"Export failed: {e}", "key": key}
+    else:
+        result = {"status": "ok", "table": table_name, **result}
+    # The manifest tells asynchronous callers how the job ended
+    try:
+        s3.put_object(Bucket=bucket, Key=_manifest_key(key), Body=json.dumps(result).encode('utf-8'),
+                      ContentType='application/json')
+    except Exception as e:
+        print('Failed to write export manifest', e)
+    return result
+
+
+def _get_lambda_client():
+    global _lambda_client
+    if _lambda_client is None:
+        _lambda_client = boto3.client('lambda')
+    return _lambda_client
+
+
+def start_export(params: dict) -> tuple:
+    """Action entry point; returns (status_code, body).
+
+    With EXPORT_FUNCTION_NAME set the export runs asynchronously on the
+    long-timeout export function and the response names the object and the
+    manifest to poll; otherwise (or with "wait": true) it runs inline for at
+    most EXPORT_INLINE_SECONDS and answers 504 if the table takes longer.
+    """
+    table_name = params.get('table') or 'patches'
+    if table_name not in EXPORT_TABLES:
+        return 400, {"error": f"table must be one of {', '.join(sorted(EXPORT_TABLES))}"}
+    job = {'table': table_name, 'key': _export_key(table_name)}
+    if params.get('segments'):
+        try:
+            job['segments'] = max(1, min(64, int(params['segments'])))
+        except (TypeError, ValueError):
+            return 400, {"error": "segments must be an integer"}
+
+    function_name = os.getenv('EXPORT_FUNCTION_NAME')
+    if function_name and not params.get('wait'):
+        try:
+            _get_lambda_client().invoke(FunctionName=function_name, InvocationType='Event',
+                                        Payload=json.dumps(job).encode('utf-8'))
+        except Exception as e:
+            return 500, {"error": f"Failed to start export: {e}"}
+        return 202, {"status": "started", "table": table_name, "bucket": os.getenv('EXPORT_BUCKET_NAME'),
+                     "key": job['key'], "manifestKey": _manifest_key(job['key'])}
+    limit = EXPORT_INLINE_SECONDS
+    left = resilience.remaining()
+    if left is not None:
+        limit = min(limit, left)
+    result = run_export(job, deadline=time.monotonic() + limit)
+    if result.get('timedOut'):
+        return 504, {"error": f"{result['message']}; export without \"wait\" instead", "key": result['key']}
+    return 200, result
+
+
+def lambda_handler(event, context):
+    """Export job: {"table": "patches"|"assets", "key"?: str, "segments"?: int}."""
+    deadline = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN_SECONDS
+    result = run_export(event or {}, deadline=deadline)
+    print('EXPORT', json.dumps(result))
+    return result
@@ -0,0 +1,166 @@
+# super_hacks/model_router.py
+
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import resilience
+
+MODEL_ID = os.getenv('BEDROCK_MODEL_ID',
+                     'anthropic.claude-3-5-sonnet-20240620-v1:0')
+FAST_MODEL_ID = os.getenv('BEDROCK_FAST_MODEL_ID',
+                          'anthropic.claude-3-haiku-20240307-v1:0')
+
+
+def _model_list(env_name: str) -> list:
+    return [m.strip() for m in os.getenv(env_name, '').split(',') if m.strip()]
+
+
+# Extra models tried, in order, once the tier's own model is throttled
+FALLBACK_MODEL_IDS = _model_list('BEDROCK_FALLBACK_MODEL_IDS')
+
+MAX_ATTEMPTS = int(os.getenv('BEDROCK_MAX_ATTEMPTS', '4'))
+BASE_BACKOFF_SECONDS = float(os.getenv('BEDROCK_BASE_BACKOFF_SECONDS', '0.25'))
+MAX_BACKOFF_SECONDS = float(os.getenv('BEDROCK_MAX_BACKOFF_SECONDS', '4'))
+
+# Error codes Bedrock returns when a model is over capacity rather than broken
+THROTTLE_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+}
+
+# Lookups, listings and classification prompts don't need the large model
+SIMPLE_PROMPT = re.compile(
+    r'^\s*(list|show|get|count|how many|which|what is the status|classify|categori[sz]e|label|is there)\b',
+    re.IGNORECASE)
+SIMPLE_PROMPT_MAX_CHARS = 200
+
+FAST = 'fast'
+STANDARD = 'standard'
+
+
+def classify_prompt(prompt: str) -> str:
+    """Return the model tier for a prompt: FAST for short lookups, else STANDARD."""
+    if prompt and len(prompt) <= SIMPLE_PROMPT_MAX_CHARS and SIMPLE_PROMPT.match(prompt):
+        return FAST
+    return STANDARD
+
+
+def error_code(exc: Exception):
+    """Extract a botocore-style error code from an exception, if any."""
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+class ModelRouter:
+    """Pick a Bedrock model per request and ride out throttling.
+
+    Each tier has an ordered model chain. A throttled model is put on an
+    exponentially growing cooldown and the next model in the chain is tried;
+    successes shrink the cooldown again. When every model in the chain is
+    cooling down the router sleeps until the first one is available, up to
+    ``max_attempts`` passes over the chain. A model whose circuit breaker is
+    open is treated like a throttled one.
+    """
+
+    def __init__(self, client_factory, standard_models=None, fast_models=None,
+                 max_attempts: int = MAX_ATTEMPTS, base_backoff: float = BASE_BACKOFF_SECONDS,
+                 max_backoff: float = MAX_BACKOFF_SECONDS, sleep=time.sleep, clock=time.monotonic):
+        self._client_factory = client_factory
+        self.chains = {
+            STANDARD: list(standard_models or [MODEL_ID] + FALLBACK_MODEL_IDS),
+            FAST: list(fast_models or [FAST_MODEL_ID, MODEL_ID] + FALLBACK_MODEL_IDS),
+        }
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        # model id -> consecutive throttles / monotonic time it may be retried
+        self._throttles = {}
+        self._cooldown_until = {}
+
+    def _chain(self, tier: str, prefer: str = None) -> list:
+        chain = self.chains.get(tier, self.chains[STANDARD])
+        if prefer:
+            chain = [prefer] + [m for m in chain if m != prefer]
+        # dict.fromkeys keeps order while dropping duplicates
+        return list(dict.fromkeys(chain))
+
+    def _on_throttle(self, model: str):
+        with self._lock:
+            count = self._throttles.get(model, 0) + 1
+            self._throttles[model] = count
+            backoff = min(self.max_backoff, self.base_backoff * (2 ** (count - 1)))
+            # Equal jitter: at least half the backoff, so a throttled model gets a real
+            # rest, while the random half keeps containers from retrying in lockstep
+            self._cooldown_until[model] = self._clock() + random.uniform(backoff / 2, backoff)
+
+    def _on_success(self, model: str):
+        with self._lock:
+            count = self._throttles.get(model, 0)
+            if count:
+                self._throttles[model] = count - 1
+            self._cooldown_until.pop(model, None)
+
+    def converse(self, tier: str = STANDARD, prefer: str = None, **kwargs):
+        """Call ``converse`` on the first available model for ``tier``.
+
+        Returns ``(response, route)`` where ``route`` records the model that
+        served the call, its latency and any models that were throttled.
+        """
+        chain = self._chain(tier, prefer)
+        throttled = []
+        started = self._clock()
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            now = self._clock()
+            ready = [m for m in chain if self._cooldown_until.get(m, 0) <= now]
+            if not ready:
+                wait = min(self._cooldown_until[m] for m in chain) - now
+                left = resilience.remaining()
+                if left is not None and wait >= left:
+                    # Every model is cooling down past the request deadline
+                    resilience.count('bedrock', 'deadlineExceeded')
+                    raise resilience.DeadlineExceeded(
+                        f"all models throttled for {wait:.1f}s with {max(0.0, left):.1f}s left")
+                self._sleep(max(0.0, wait))
+                ready = chain
+            for model in ready:
+                resilience.check_deadline('bedrock')
+                call_started = self._clock()
+                try:
+                    response = self._client_factory().converse(modelId=model, **kwargs)
+                except resilience.DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    # An open breaker only rules out this model; the next one may be fine
+                    if error_code(e) not in THROTTLE_CODES and not isinstance(e, resilience.CircuitOpen):
+                        raise
+                    last_error = e
+                    throttled.append(model)
+                    self._on_throttle(model)
+                    continue
+                self._on_success(model)
+                route = {
+                    "model": model,
+                    "tier": tier,
+                    "latencyMs": round((self._clock() - call_started) * 1000, 2),
+                    "totalMs": round((self._clock() - started) * 1000, 2),
+                    "attempts": attempt,
+                    "throttled": throttled,
+                }
+                print('MODEL_ROUTE', json.dumps(route))
+                return response, route
+        if last_error is None:
+            # max_attempts < 1: no model was tried at all
+            raise RuntimeError(f"no attempts allowed for tier {tier!r} (max_attempts={self.max_attempts})")
+        raise last_error
@@ -0,0 +1,381 @@
+# super_hacks/patch_snapshot.py
+
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+
+import delta_sync
+
+# NumPy is optional; without it the same columns are filtered with plain loops
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Seconds between incremental refreshes (changed items only) of a warm snapshot.
+# A refresh is a filtered Scan: DynamoDB still reads, and bills, the whole
+# table, so each warm container querying the snapshot costs a full table read
+# per interval. Only the items returned and decoded shrink.
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv('SNAPSHOT_REFRESH_SECONDS', '5'))
+# Seconds between full rebuilds, which pick up writes that did not stamp
+# updatedAt; a deleted patch's tombstone triggers a rebuild straight away
+SNAPSHOT_FULL_REFRESH_SECONDS = float(os.getenv('SNAPSHOT_FULL_REFRESH_SECONDS', '900'))
+QUERY_MAX_IDS = 1000
+
+# Dictionary-encoded string columns
+STRING_COLUMNS = ('status', 'severity', 'vendor')
+GROUP_COLUMNS = STRING_COLUMNS + ('cve_year',)
+_PROJECTION = 'patchId, cve, #st, severity, vendor, impactScore, createdAt, updatedAt, deleted'
+
+
+class Dictionary:
+    """Maps each distinct string of a column to a small integer code."""
+
+    __slots__ = ('values', 'codes')
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values) -> list:
+        """Codes of the given strings that occur in the column."""
+        return [self.codes[v] for v in values if v in self.codes]
+
+
+def _epoch(value) -> float:
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _cve_year(cve) -> int:
+    try:
+        return int(str(cve)[4:8])
+    except ValueError:
+        return 0
+
+
+def _score(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _values(value) -> list:
+    """Accept a list or a comma-separated string (query strings are always strings)."""
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value]
+    return [v.strip() for v in str(value).split(',') if v.strip()]
+
+
+class PatchSnapshot:
+    """Column-per-attribute copy of the patches table.
+
+    Strings are stored as codes into a per-column Dictionary, numbers as
+    typed arrays, so a warm container holds 100k patches in a few MB and a
+    filter touches only the columns it needs.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.rows = {}
+        self.dicts = {name: Dictionary() for name in STRING_COLUMNS}
+        self.codes = {name: array('I') for name in STRING_COLUMNS}
+        self.score = array('d')    # NaN until the patch is scored
+        self.created = array('d')  # epoch seconds, NaN when unknown
+        self.cve_year = array('H')  # 0 when the CVE id has no year
+        self.high_water = ''        # largest updatedAt applied so far
+        self.since = None           # version the next incremental refresh reads from
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+        self.stale = False          # a loaded patch was deleted since; rebuild to drop it
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, item: dict) -> None:
+        patch_id = item.get('patchId')
+        if not patch_id:
+            return
+        row = self.rows.get(patch_id)
+        values = {name: self.dicts[name].encode(item.get(name) or 'UNKNOWN') for name in STRING_COLUMNS}
+        score, created, year = _score(item.get('impactScore')), _epoch(item.get('createdAt')), _cve_year(item.get('cve'))
+        if row is None:
+            self.rows[patch_id] = len(self.ids)
+            self.ids.append(patch_id)
+            for name, code in values.items():
+                self.codes[name].append(code)
+            self.score.append(score)
+            self.created.append(created)
+            self.cve_year.append(year)
+        else:
+            for name, code in values.items():
+                self.codes[name][row] = code
+            self.score[row] = score
+            self.created[row] = created
+            self.cve_year[row] = year
+        updated = str(item.get('updatedAt') or '')
+        if updated > self.high_water:
+            self.high_water = updated
+
+    def load(self, table, since: str = None) -> int:
+        """Apply every item of the table, or only those updated at or after ``since``."""
+        kwargs = {'ProjectionExpression': _PROJECTION, 'ExpressionAttributeNames': {'#st': 'status'}}
+        if since:
+            # DynamoDB still reads the whole table, but only changed items are returned and decoded
+            kwargs['FilterExpression'] = 'updatedAt >= :since'
+            kwargs['ExpressionAttributeValues'] = {':since': since}
+        applied = 0
+        while True:
+            resp = table.scan(**kwargs)
+            for item in resp.get('Items', []):
+                if item.get('deleted'):
+                    # Rows can't be removed in place; a loaded one forces a rebuild
+                    self.stale = self.stale or item.get('patchId') in self.rows
+                    continue
+                self.upsert(item)
+                applied += 1
+            if 'LastEvaluatedKey' not in resp:
+                return applied
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    def query(self, params: dict, now: float = None) -> dict:
+        """Filter, then either group (count, average and max score) or list matching patch ids."""
+        now = time.time() if now is None else now
+        group_by = _values(params.get('group_by'))
+        unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"cannot group by {', '.join(unknown)}; use {', '.join(GROUP_COLUMNS)}")
+        filters = {
+            name: self.dicts[name].lookup(_values(params.get(name)))
+            for name in STRING_COLUMNS if _values(params.get(name))
+        }
+        years = [int(y) for y in _values(params.get('cve_year'))]
+        bounds = {
+            'min_score': _optional_float(params.get('min_score')),
+            'max_score': _optional_float(params.get('max_score')),
+            # older_than_days=7 keeps patches created more than a week ago
+            'created_before': _days_ago(now, params.get('older_than_days')),
+            'created_after': _days_ago(now, params.get('newer_than_days')),
+        }
+        limit = _limit(params.get('limit'))
+
+        select, group, top = (_select_numpy, _group_numpy, _top_numpy) if np is not None else \
+            (_select_python, _group_python, _top_python)
+        rows = select(self, filters, years, bounds)
+        result = {"matched": int(len(rows))}
+        if group_by:
+            result["groups"] = group(self, rows, group_by)
+        else:
+            result["patchIds"] = top(self, rows, limit)
+        return result
+
+
+def _limit(value) -> int:
+    """Ids to return: 100 by default, at most QUERY_MAX_IDS; raises ValueError below 1."""
+    if value in (None, ''):
+        return 100
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"limit must be a positive integer, not {value!r}") from None
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(QUERY_MAX_IDS, limit)
+
+
+def _optional_float(value):
+    return None if value in (None, '') else float(value)
+
+
+def _days_ago(now: float, days):
+    return None if days in (None, '') else now - float(days) * 86400
+
+
+def _select_numpy(snap, filters, years, bounds):
+    n = len(snap)
+    mask = np.ones(n, dtype=bool)
+    for name, codes in filters.items():
+        mask &= np.isin(np.frombuffer(snap.codes[name], dtype=np.uint32, count=n), codes)
+    if years:
+        mask &= np.isin(np.frombuffer(snap.cve_year, dtype=np.uint16, count=n), years)
+    score = np.frombuffer(snap.score, dtype=np.float64, count=n)
+    created = np.frombuffer(snap.created, dtype=np.float64, count=n)
+    # Comparisons with NaN are False, so unscored/undated rows drop out of range filters
+    if bounds['min_score'] is not None:
+        mask &= score >= bounds['min_score']
+    if bounds['max_score'] is not None:
+        mask &= score <= bounds['max_score']
+    if bounds['created_before'] is not None:
+        mask &= created < bounds['created_before']
+    if bounds['created_after'] is not None:
+        mask &= created >= bounds['created_after']
+    return np.flatnonzero(mask)
+
+
+def _select_python(snap, filters, years, bounds):
+    checks = [(snap.codes[name], set(codes)) for name, codes in filters.items()]
+    if years:
+        checks.append((snap.cve_year, set(years)))
+    low, high = bounds['min_score'], bounds['max_score']
+    before, after = bounds['created_before'], bounds['created_after']
+    rows = []
+    score, created = snap.score, snap.created
+    for row in range(len(snap)):
+        if any(column[row] not in wanted for column, wanted in checks):
+            continue
+        s, c = score[row], created[row]
+        if (low is not None and not s >= low) or (high is not None and not s <= high):
+            continue
+        if (before is not None and not c < before) or (after is not None and not c >= after):
+            continue
+        rows.append(row)
+    return rows
+
+
+def _group_value(snap, name, code):
+    return snap.dicts[name].values[code] if name in snap.dicts else int(code)
+
+
+def _group_entry(key, count, scored, total, best):
+    entry = {"key": key, "count": int(count)}
+    if scored:
+        entry["avgScore"] = round(float(total) / int(scored), 2)
+        entry["maxScore"] = float(best)
+    return entry
+
+
+def _sorted_groups(groups):
+    return sorted(groups, key=lambda g: (-g["count"], [str(v) for v in g["key"].values()]))
+
+
+def _group_numpy(snap, rows, group_by):
+    n = len(snap)
+    combined = np.zeros(len(rows), dtype=np.int64)
+    decoders = []
+    for name in group_by:
+        column = snap.codes[name] if name in snap.codes else snap.cve_year
+        values = np.frombuffer(column, dtype=np.uint32 if name in snap.codes else np.uint16, count=n)[rows]
+        distinct, inverse = np.unique(values, return_inverse=True)
+        # Mixed-radix key over the distinct values of each grouped column
+        combined = combined * len(distinct) + inverse
+        decoders.append((name, distinct))
+    keys, inverse = np.unique(combined, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+    score = np.frombuffer(snap.score, dtype=np.float64, count=n)[rows]
+    scored = ~np.isnan(score)
+    totals = np.bincount(inverse[scored], weights=score[scored], minlength=len(keys))
+    scored_counts = np.bincount(inverse[scored], minlength=len(keys))
+    best = np.full(len(keys), -np.inf)
+    np.maximum.at(best, inverse[scored], score[scored])
+
+    groups = []
+    for i, key in enumerate(keys.tolist()):
+        decoded = {}
+        for name, distinct in reversed(decoders):
+            key, index = divmod(key, len(distinct))
+            decoded[name] = _group_value(snap, name, distinct[index])
+        decoded = {name: decoded[name] for name in group_by}
+        groups.append(_group_entry(decoded, counts[i], scored_counts[i], totals[i], best[i]))
+    return _sorted_groups(groups)
+
+
+def _group_python(snap, rows, group_by):
+    columns = [snap.codes[name] if name in snap.codes else snap.cve_year for name in group_by]
+    stats = {}
+    for row in rows:
+        key = tuple(column[row] for column in columns)
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = [0, 0, 0.0, -math.inf]
+        entry[0] += 1
+        s = snap.score[row]
+        if s == s:
+            entry[1] += 1
+            entry[2] += s
+            entry[3] = max(entry[3], s)
+    groups = [_group_entry({name: _group_value(snap, name, code) for name, code in zip(group_by, key)}, *entry)
+              for key, entry in stats.items()]
+    return _sorted_groups(groups)
+
+
+def _top_numpy(snap, rows, limit):
+    score = np.frombuffer(snap.score, dtype=np.float64, count=len(snap))[rows]
+    # Highest score first, unscored last, stable by row for ties
+    order = np.argsort(-np.nan_to_num(score, nan=-np.inf), kind='stable')[:limit]
+    return [snap.ids[i] for i in rows[order].tolist()]
+
+
+def _top_python(snap, rows, limit):
+    score = snap.score
+    ordered = sorted(rows, key=lambda row: -score[row] if score[row] == score[row] else math.inf)
+    return [snap.ids[i] for i in ordered[:limit]]
+
+
+_snapshot = None
+# Refreshes append to the column arrays, which cannot resize while a query
+# holds NumPy views of them, so both run under one lock
+_lock = threading.Lock()
+
+
+def _refresh(table, now: float) -> PatchSnapshot:
+    global _snapshot
+    snap = _snapshot
+    if snap is not None and now - snap.rebuilt_at < SNAPSHOT_FULL_REFRESH_SECONDS:
+        if now - snap.refreshed_at < SNAPSHOT_REFRESH_SECONDS:
+            return snap
+        # Items seen by the previous scan may be re-read; upserts make that harmless
+        snap.load(table, since=snap.since)
+        snap.refreshed_at = now
+    if snap is None or snap.stale or now - snap.rebuilt_at >= SNAPSHOT_FULL_REFRESH_SECONDS:
+        snap = PatchSnapshot()
+        snap.load(table)
+        snap.rebuilt_at = snap.refreshed_at = now
+        _snapshot = snap
+    # Next time, read from when this scan started, less the sync skew: a write
+    # stamped before then but committed after the scan passed it still lands
+    # in the next refresh, even if later writes raised the high-water mark.
+    snap.since = delta_sync.version_token(now)
+    return snap
+
+
+def query_patches(params: dict) -> dict:
+    """Action entry point: filter and group patches from the warm snapshot."""
+    import tools
+
+    patches_table = tools.get_table('PATCHES_TABLE_NAME')
+    if patches_table is None:
+        return {"status": "error", "message": "PATCHES_TABLE_NAME not configured in environment."}
+    now = time.time()
+    with _lock:
+        try:
+            snap = _refresh(patches_table, now)
+        except Exception as e:
+            return {"status": "error", "message": f"DynamoDB scan failed: {e}"}
+        started = time.perf_counter()
+        try:
+            result = snap.query(params, now)
+        except ValueError as e:
+            return {"status": "error", "message": f"Invalid query: {e}"}
+        result["elapsedMs"] = round((time.perf_counter() - started) * 1000, 3)
+        result["snapshot"] = {
+            "rows": len(snap),
+            "engine": "numpy" if np is not None else "array",
+            "refreshedAt": datetime.utcfromtimestamp(snap.refreshed_at).isoformat() + 'Z',
+            "highWater": snap.high_water or None,
+        }
+    return result
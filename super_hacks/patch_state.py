@@ -0,0 +1,122 @@
+# super_hacks/patch_state.py
+
+import hashlib
+
+import resilience
+
+# Status changes a patch may make; any other write is refused by DynamoDB.
+# Items written before statuses existed count as PENDING.
+TRANSITIONS = {
+    'PENDING': ('ANALYZED',),
+    'ANALYZED': ('SANDBOX_TESTING',),
+    'SANDBOX_TESTING': ('SANDBOX_PASSED', 'SANDBOX_FAILED'),
+    'SANDBOX_PASSED': ('SANDBOX_TESTING', 'DEPLOYED'),
+    'SANDBOX_FAILED': ('SANDBOX_TESTING',),
+}
+# Bumped by every write so a writer can insist nothing changed since its read
+REVISION = 'revision'
+# Set on the tombstone a deleted patch leaves behind (see delete)
+DELETED = 'deleted'
+
+
+class Conflict(Exception):
+    """The patch is missing, in the wrong status, or changed since it was read."""
+
+
+def patch_id_for(cve: str, product: str = None) -> str:
+    """Deterministic patch key: the same CVE and product always map to the same item."""
+    key = f"{(cve or '').strip().upper()}|{(product or '').strip().lower()}"
+    return 'p-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def sources_of(status: str) -> list:
+    """Statuses that may move to ``status``."""
+    return [source for source, targets in TRANSITIONS.items() if status in targets]
+
+
+def create(table, item: dict) -> bool:
+    """Write a new patch unless one with its key exists; False means it was a duplicate."""
+    item = {**item, REVISION: 1}
+    try:
+        table.put_item(Item=item, ConditionExpression='attribute_not_exists(patchId)')
+    except Exception as e:
+        if resilience.error_code(e) == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def transition(table, patch_id: str, status: str, timestamp: str, revision: int = None,
+               attributes: dict = None, condition: str = None) -> dict:
+    """Move a patch to ``status`` in one conditional UpdateItem.
+
+    The write only succeeds when the patch exists, its current status may
+    move to ``status``, and, when ``revision`` is given, nobody has written
+    it since that revision was read. ``attributes`` are set in the same
+    write and ``condition`` is ANDed with the checks. Returns the previous
+    values of the attributes it replaced (status, revision, ...); raises
+    Conflict when a check fails.
+    """
+    sources = sources_of(status)
+    names = {'#st': 'status', '#rev': REVISION}
+    values = {':status': status, ':u': timestamp, ':zero': 0, ':one': 1}
+    allowed = []
+    for i, source in enumerate(sources):
+        values[f':from{i}'] = source
+        allowed.append(f':from{i}')
+    status_check = f"#st IN ({', '.join(allowed)})"
+    if 'PENDING' in sources:
+        status_check = f"(attribute_not_exists(#st) OR {status_check})"
+    names['#del'] = DELETED
+    checks = ['attribute_exists(patchId)', 'attribute_not_exists(#del)', status_check]
+    if revision is not None:
+        if revision:
+            checks.append('#rev = :rev')
+            values[':rev'] = revision
+        else:
+            checks.append('attribute_not_exists(#rev)')
+    if condition:
+        checks.append(f'({condition})')
+
+    sets = ['#st = :status', 'updatedAt = :u', '#rev = if_not_exists(#rev, :zero) + :one']
+    for i, (name, value) in enumerate((attributes or {}).items()):
+        names[f'#a{i}'] = name
+        values[f':a{i}'] = value
+        sets.append(f'#a{i} = :a{i}')
+    try:
+        resp = table.update_item(
+            Key={'patchId': patch_id},
+            UpdateExpression='SET ' + ', '.join(sets),
+            ConditionExpression=' AND '.join(checks),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            # Only the attributes this write replaced, not the whole (large) item
+            ReturnValues='UPDATED_OLD',
+        )
+    except Exception as e:
+        if resilience.error_code(e) == 'ConditionalCheckFailedException':
+            raise Conflict(f"{patch_id} cannot move to {status}") from None
+        raise
+    return (resp or {}).get('Attributes', {})
+
+
+def delete(table, patch_id: str, timestamp: str, expires_at: int) -> dict:
+    """Replace a patch with a tombstone so delta polls learn it is gone.
+
+    The tombstone keeps only the key, DELETED, updatedAt and expiresAt, after
+    which DynamoDB's TTL removes it; until then the CVE is not re-ingested.
+    Returns the patch as it was; raises Conflict when it is missing or
+    already deleted.
+    """
+    try:
+        resp = table.put_item(
+            Item={'patchId': patch_id, DELETED: True, 'updatedAt': timestamp, 'expiresAt': expires_at},
+            ConditionExpression='attribute_exists(patchId) AND attribute_not_exists(#del)',
+            ExpressionAttributeNames={'#del': DELETED},
+            ReturnValues='ALL_OLD',
+        )
+    except Exception as e:
+        if resilience.error_code(e) == 'ConditionalCheckFailedException':
+            raise Conflict(f"{patch_id} does not exist") from None
+        raise
+    return (resp or {}).get('Attributes', {})
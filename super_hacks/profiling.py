@@ -0,0 +1,167 @@
+# super_hacks/profiling.py
+
+import base64
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+# Fraction of invocations profiled without being asked (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+# Honour {"profile": true} in the body / ?profile=1 on GET routes. Off by default:
+# the API is public, and any caller could otherwise slow requests and fill /tmp.
+PROFILE_ALLOW_REQUEST_FLAG = os.getenv('PROFILE_ALLOW_REQUEST_FLAG', 'false').lower() in ('1', 'true', 'yes')
+# Local directory or s3://bucket/prefix; /tmp is the only writable path on Lambda
+PROFILE_SINK = os.getenv('PROFILE_SINK', '/tmp/profiles')
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', '30'))
+PROFILE_TRACEBACK_FRAMES = int(os.getenv('PROFILE_TRACEBACK_FRAMES', '1'))
+
+
+def _body(event: dict) -> str:
+    """The raw request body, decoded like agent.parse_body when API Gateway base64-encoded it."""
+    body = event.get('body')
+    if not isinstance(body, str):
+        return ''
+    if event.get('isBase64Encoded'):
+        try:
+            return base64.b64decode(body).decode('utf-8')
+        except Exception:
+            return ''
+    return body
+
+
+def requested(event) -> bool:
+    """True when the request itself asks to be profiled."""
+    if not isinstance(event, dict):
+        return False
+    query = event.get('queryStringParameters') or {}
+    if str(query.get('profile', '')).lower() in ('1', 'true'):
+        return True
+    body = _body(event)
+    # Cheap substring test first so ordinary requests never pay for a parse
+    if '"profile"' not in body:
+        return False
+    try:
+        return bool(json.loads(body).get('profile'))
+    except Exception:
+        return False
+
+
+def _label(event) -> str:
+    event = event if isinstance(event, dict) else {}
+    if event.get('httpMethod') == 'GET':
+        return (event.get('resource') or event.get('path') or 'get').strip('/').replace('/', '-') or 'get'
+    try:
+        body = json.loads(_body(event) or '{}')
+    except Exception:
+        body = {}
+    if isinstance(body, dict):
+        if body.get('action'):
+            return str(body['action'])
+        if isinstance(body.get('actions'), list):
+            return 'batch'
+    return 'prompt'
+
+
+def top_allocators(snapshot, limit: int = None) -> list:
+    """Largest allocation sites of a tracemalloc snapshot, biggest first."""
+    stats = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    )).statistics('lineno')
+    return [{"location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+             "sizeKiB": round(s.size / 1024, 1), "count": s.count}
+            for s in stats[:limit or PROFILE_TOP_N]]
+
+
+def write_sink(sink: str, name: str, data: bytes) -> str:
+    """Write one profile artifact to a local directory or an s3:// prefix; returns its location."""
+    if sink.startswith('s3://'):
+        import tools
+        bucket, _, prefix = sink[len('s3://'):].partition('/')
+        key = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        tools.get_s3_client().put_object(Bucket=bucket, Key=key, Body=data)
+        return f"s3://{bucket}/{key}"
+    os.makedirs(sink, exist_ok=True)
+    path = os.path.join(sink, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _write_report(profiler, snapshot, memory, elapsed_ms, label, request_id) -> str:
+    stats_text = io.StringIO()
+    pstats.Stats(profiler, stream=stats_text).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+    # The binary form loads into pstats/snakeviz for deeper digging
+    with tempfile.NamedTemporaryFile(suffix='.prof') as tmp:
+        profiler.dump_stats(tmp.name)
+        raw = tmp.read()
+
+    base = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{label}-{request_id}"
+    report = {
+        "requestId": request_id,
+        "label": label,
+        "elapsedMs": round(elapsed_ms, 2),
+        "memory": {"currentKiB": round(memory[0] / 1024, 1), "peakKiB": round(memory[1] / 1024, 1)},
+        "topAllocators": top_allocators(snapshot),
+        "stats": stats_text.getvalue(),
+    }
+    write_sink(PROFILE_SINK, f"{base}.prof", raw)
+    return write_sink(PROFILE_SINK, f"{base}.json", json.dumps(report, indent=2).encode('utf-8'))
+
+
+def run_profiled(handler, event, context):
+    """Run one invocation under cProfile and tracemalloc and write the report."""
+    request_id = getattr(context, 'aws_request_id', None) or uuid.uuid4().hex[:12]
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(PROFILE_TRACEBACK_FRAMES)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = handler(event, context)
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        snapshot = tracemalloc.take_snapshot()
+        memory = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+    try:
+        location = _write_report(profiler, snapshot, memory, elapsed_ms, _label(event), request_id)
+        print('PROFILE', json.dumps({"requestId": request_id, "elapsedMs": round(elapsed_ms, 2),
+                                     "location": location}))
+        if isinstance(result, dict) and isinstance(result.get('headers'), dict):
+            result['headers']['X-Profile-Location'] = location
+    except Exception as e:
+        # Profiling must never break the request it observed
+        print('Failed to write profile', e)
+    return result
+
+
+def profiled(handler):
+    """Decorate a Lambda handler so selected invocations are profiled.
+
+    With sampling off and the request flag disallowed the handler is returned
+    unchanged, so disabled profiling costs nothing at all. Otherwise each
+    invocation pays a random draw and a substring check on the body.
+    """
+    if PROFILE_SAMPLE_RATE <= 0 and not PROFILE_ALLOW_REQUEST_FLAG:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if ((PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+                or (PROFILE_ALLOW_REQUEST_FLAG and requested(event))):
+            return run_profiled(handler, event, context)
+        return handler(event, context)
+    return wrapper
@@ -0,0 +1,77 @@
+# super_hacks/projection.py
+
+import re
+
+# Attributes list actions return when the caller gives no ``fields``; "*"
+# asks for whole items. Patch descriptions (up to 1 KB each) are left out.
+DEFAULT_FIELDS = {
+    'patches': ('patchId', 'cve', 'severity', 'status', 'impactScore', 'kev', 'epssPercentile',
+                'vendor', 'product', 'createdAt', 'updatedAt'),
+    'assets': ('assetId', 'hostname', 'environment', 'businessCriticality', 'owner', 'os'),
+    'events': ('eventId', 'timestamp', 'source', 'message', 'patchId'),
+}
+# What the dashboard's patch queue renders: the defaults plus the description
+PATCH_QUEUE_FIELDS = DEFAULT_FIELDS['patches'] + ('description',)
+# Read whatever is requested: the key, plus the attribute that versions the list
+# (and, for patches, the flag that marks a tombstone)
+REQUIRED_FIELDS = {
+    'patches': ('patchId', 'updatedAt', 'deleted'),
+    'assets': ('assetId',),
+    'events': ('eventId', 'timestamp'),
+}
+ALL_FIELDS = '*'
+MAX_FIELDS = 40
+
+_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_-]*$')
+
+
+def resolve(value, kind: str) -> tuple:
+    """Turn a ``fields`` parameter into (attributes to read, attributes to return).
+
+    ``value`` is a list or a comma-separated string of top-level attribute
+    names, None for the kind's defaults, or "*" for whole items, in which
+    case both are None. Raises ValueError for malformed names.
+    """
+    if value is None or value == '' or value == []:
+        requested = list(DEFAULT_FIELDS[kind])
+    elif value == ALL_FIELDS or value == [ALL_FIELDS]:
+        return None, None
+    else:
+        if isinstance(value, str):
+            value = value.split(',')
+        requested = [str(name).strip() for name in value if str(name).strip()]
+        bad = [name for name in requested if not _NAME.match(name)]
+        if bad or not requested:
+            raise ValueError(f"Invalid fields: {', '.join(bad) or 'none given'}")
+        if len(requested) > MAX_FIELDS:
+            raise ValueError(f"At most {MAX_FIELDS} fields may be requested")
+    key = REQUIRED_FIELDS[kind][0]
+    returned = list(dict.fromkeys([key] + requested))
+    read = list(dict.fromkeys(returned + list(REQUIRED_FIELDS[kind])))
+    return read, returned
+
+
+def add(kwargs: dict, fields) -> dict:
+    """Add a ProjectionExpression for ``fields`` (None = everything) to scan/query kwargs.
+
+    Names go through placeholders so reserved words (status, timestamp)
+    are safe, merged with any ExpressionAttributeNames already present.
+    """
+    if not fields:
+        return kwargs
+    names = dict(kwargs.get('ExpressionAttributeNames') or {})
+    placeholders = []
+    for i, name in enumerate(fields):
+        names[f'#p{i}'] = name
+        placeholders.append(f'#p{i}')
+    kwargs['ProjectionExpression'] = ', '.join(placeholders)
+    kwargs['ExpressionAttributeNames'] = names
+    return kwargs
+
+
+def trim(items: list, fields) -> list:
+    """Drop attributes that were read for bookkeeping but not requested."""
+    if not fields:
+        return items
+    wanted = set(fields)
+    return [{name: value for name, value in item.items() if name in wanted} for item in items]
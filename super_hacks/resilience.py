@@ -0,0 +1,413 @@
+# super_hacks/resilience.py
+
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+# Left over when a handler's deadline passes, to answer and flush buffered events
+DEADLINE_MARGIN_SECONDS = float(os.getenv('DEADLINE_MARGIN_SECONDS', '1.5'))
+# Consecutive failures that open a dependency's breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '10'))
+# Idempotent reads still running after this long get a second, racing request;
+# 0 disables hedging. Set it near the dependency's p95 latency.
+HEDGE_DELAY_MS = float(os.getenv('HEDGE_DELAY_MS', '0'))
+HEDGE_WORKERS = 8
+
+# Socket timeouts per dependency; the request deadline can only shorten them
+CONNECT_TIMEOUT_SECONDS = 2
+READ_TIMEOUT_SECONDS = {
+    'dynamodb': float(os.getenv('DYNAMODB_READ_TIMEOUT_SECONDS', '5')),
+    's3': float(os.getenv('S3_READ_TIMEOUT_SECONDS', '10')),
+    'bedrock': float(os.getenv('BEDROCK_READ_TIMEOUT_SECONDS', '20')),
+}
+# botocore attempts per call (standard mode, first try included). Bedrock gets
+# one so throttles reach ModelRouter's fallback instead of botocore's backoff.
+MAX_ATTEMPTS = {'dynamodb': 2, 's3': 2, 'bedrock': 1}
+
+# Error codes meaning the dependency is unhealthy, as opposed to the request
+# being wrong or merely rate limited (callers already back off on throttling)
+UNHEALTHY_CODES = {
+    'InternalServerError',
+    'InternalFailure',
+    'InternalError',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'RequestTimeout',
+    'RequestTimeoutException',
+}
+
+
+class Unavailable(Exception):
+    """A dependency call was not attempted or abandoned to protect the request."""
+
+
+class DeadlineExceeded(Unavailable):
+    pass
+
+
+class CircuitOpen(Unavailable):
+    pass
+
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """Bound everything called in this block to ``seconds`` from now.
+
+    Nested deadlines can only shorten the one already in force.
+    """
+    limit = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(limit if current is None else min(current, limit))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    limit = _deadline.get()
+    return None if limit is None else limit - time.monotonic()
+
+
+def check_deadline(dependency: str = None) -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        if dependency:
+            count(dependency, 'deadlineExceeded')
+        raise DeadlineExceeded(f"request deadline passed before calling {dependency or 'dependency'}")
+
+
+def timeout(default: float, dependency: str = None) -> float:
+    """``default`` shortened to the time left; raises DeadlineExceeded when none is."""
+    check_deadline(dependency)
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def within_deadline(handler):
+    """Run a Lambda handler under a deadline taken from its context.
+
+    Place it inside @flushing so buffered events are still written once the
+    handler gives up.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        before = stats()
+        try:
+            if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+                return handler(event, context)
+            budget = context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN_SECONDS
+            with deadline(max(0.0, budget)):
+                return handler(event, context)
+        finally:
+            _log(before, stats())
+
+    return wrapper
+
+
+def client_config(dependency: str):
+    """botocore Config with bounded timeouts and retries for ``dependency``.
+
+    These bound a call when no deadline is set; guarded clients also
+    abandon a call once the request deadline passes (see bounded).
+    """
+    from botocore.config import Config
+    return Config(connect_timeout=CONNECT_TIMEOUT_SECONDS,
+                  read_timeout=READ_TIMEOUT_SECONDS.get(dependency, 10),
+                  retries={'max_attempts': MAX_ATTEMPTS.get(dependency, 2), 'mode': 'standard'})
+
+
+# -- counters -----------------------------------------------------------------
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def count(dependency: str, name: str, amount: int = 1) -> None:
+    with _counters_lock:
+        counters = _counters.setdefault(dependency, {})
+        counters[name] = counters.get(name, 0) + amount
+
+
+def stats() -> dict:
+    """Counters per dependency since the container started, plus breaker states."""
+    with _counters_lock:
+        snapshot = {dependency: dict(counters) for dependency, counters in _counters.items()}
+    for dependency, breaker in list(_breakers.items()):
+        snapshot.setdefault(dependency, {})['state'] = breaker.state
+    return snapshot
+
+
+def _log(before: dict, after: dict) -> None:
+    """Print this invocation's counters as one RESILIENCE line (for metric filters)."""
+    delta = {}
+    for dependency, counters in after.items():
+        changed = {name: value - before.get(dependency, {}).get(name, 0)
+                   for name, value in counters.items() if name != 'state'}
+        changed = {name: value for name, value in changed.items() if value}
+        if changed:
+            delta[dependency] = {**changed, 'state': counters.get('state', CircuitBreaker.CLOSED)}
+    if delta:
+        print('RESILIENCE', json.dumps(delta))
+
+
+# -- circuit breakers -----------------------------------------------------------
+
+def error_code(exc: Exception):
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def is_unhealthy(exc: Exception) -> bool:
+    """True for failures that say the dependency is down or too slow."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if error_code(exc) in UNHEALTHY_CODES:
+        return True
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    else:
+        # requests.HTTPError carries the Response itself
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    # botocore and requests timeouts/connection errors without importing either
+    name = type(exc).__name__
+    return name.endswith(('Timeout', 'TimeoutError')) or 'ConnectionError' in name or 'ConnectTimeout' in name
+
+
+class CircuitBreaker:
+    """Fail fast once a dependency keeps failing.
+
+    CLOSED counts consecutive unhealthy failures; at ``failure_threshold``
+    the breaker OPENs and rejects calls for ``reset_seconds``. Then one
+    HALF_OPEN trial call is let through: success closes the breaker, failure
+    opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_seconds: float = None,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _admit(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def _record(self, healthy: bool) -> None:
+        with self._lock:
+            self._trial_running = False
+            if healthy:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    count(self.name, 'opened')
+                self._opened_at = self._clock()
+
+    def call(self, fn, *args, **kwargs):
+        check_deadline(self.name)
+        if not self._admit():
+            count(self.name, 'rejected')
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+        count(self.name, 'calls')
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            unhealthy = is_unhealthy(e)
+            if unhealthy:
+                count(self.name, 'failures')
+            # Request errors (validation, conditional checks) say nothing about health
+            self._record(healthy=not unhealthy)
+            raise
+        self._record(healthy=True)
+        return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(dependency: str) -> CircuitBreaker:
+    """The container-wide breaker for ``dependency`` (dynamodb, s3, nvd, bedrock:<modelId>)."""
+    found = _breakers.get(dependency)
+    if found is None:
+        with _breakers_lock:
+            found = _breakers.setdefault(dependency, CircuitBreaker(dependency))
+    return found
+
+
+# -- hedged requests ------------------------------------------------------------
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='hedge')
+    return _hedge_pool
+
+
+def hedged(dependency: str, fn, *args, delay_ms: float = None, **kwargs):
+    """Call an idempotent ``fn``; if it hasn't answered after ``delay_ms``, race a second call.
+
+    The first successful answer wins. The slower call is left to finish in
+    the background; its result is discarded.
+    """
+    delay_ms = HEDGE_DELAY_MS if delay_ms is None else delay_ms
+    if delay_ms <= 0:
+        return bounded(dependency, fn, *args, **kwargs)
+    pool = _pool()
+    # Each attempt runs in a copy of the caller's context so it sees the deadline
+    first = pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    left = remaining()
+    done, _ = wait([first], timeout=delay_ms / 1000 if left is None else max(0.0, min(delay_ms / 1000, left)))
+    if done:
+        return first.result()
+    count(dependency, 'hedged')
+    second = pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    pending = {first, second}
+    error = None
+    while pending:
+        left = remaining()
+        done, pending = wait(pending, timeout=None if left is None else max(0.0, left),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            count(dependency, 'deadlineExceeded')
+            raise DeadlineExceeded(f"{dependency} did not answer before the request deadline")
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    count(dependency, 'hedgeWins')
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def bounded(dependency: str, fn, *args, **kwargs):
+    """Call ``fn``, giving up with DeadlineExceeded when the request deadline passes.
+
+    botocore's socket timeouts apply per read and per attempt, so a call
+    started close to the deadline could otherwise outlive the invocation.
+    When the time left is shorter than the dependency's read timeout the
+    call runs on a pool thread and is abandoned at the deadline; the
+    abandoned call still records its outcome with the breaker.
+    """
+    left = remaining()
+    if left is None or left >= READ_TIMEOUT_SECONDS.get(dependency, 10):
+        return fn(*args, **kwargs)
+    check_deadline(dependency)
+    future = _pool().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    done, _ = wait([future], timeout=max(0.0, remaining() or 0.0))
+    if not done:
+        count(dependency, 'deadlineExceeded')
+        raise DeadlineExceeded(f"{dependency} did not answer before the request deadline")
+    return future.result()
+
+
+# -- guarded clients --------------------------------------------------------------
+
+# Factories whose objects make their own calls; returned as they are
+PASSTHROUGH = {'batch_writer', 'get_paginator', 'can_paginate'}
+# Idempotent reads that may be hedged, per dependency
+HEDGEABLE = {
+    'dynamodb': {'get_item', 'query', 'scan', 'batch_get_item'},
+    's3': {'get_object', 'head_object', 'list_objects_v2'},
+}
+
+
+class Guarded:
+    """Proxy routing a boto3 client's or Table's calls through a breaker.
+
+    Every call checks the request deadline and the dependency's breaker, is
+    abandoned if still running at the deadline, and idempotent reads are
+    hedged when HEDGE_DELAY_MS is set. Anything that is not a method
+    (table_name, exceptions, meta) is passed straight through. With
+    ``breaker_key``, each call's breaker is chosen by that call argument
+    (e.g. Bedrock's modelId), so one failing resource doesn't cut off the rest.
+    """
+
+    def __init__(self, target, dependency: str, breaker_key: str = None):
+        self._target = target
+        self._dependency = dependency
+        self._breaker_key = breaker_key
+
+    @property
+    def unwrapped(self):
+        return self._target
+
+    def _breaker_name(self, kwargs) -> str:
+        if self._breaker_key and kwargs.get(self._breaker_key):
+            return f"{self._dependency}:{kwargs[self._breaker_key]}"
+        return self._dependency
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith('_') or not callable(attr) or name in PASSTHROUGH:
+            return attr
+        dependency = self._dependency
+        if name in HEDGEABLE.get(dependency, ()):
+            return lambda *args, **kwargs: hedged(
+                dependency, breaker(self._breaker_name(kwargs)).call, attr, *args, **kwargs)
+        return lambda *args, **kwargs: bounded(
+            dependency, breaker(self._breaker_name(kwargs)).call, attr, *args, **kwargs)
+
+
+def guard(target, dependency: str, breaker_key: str = None):
+    """Wrap ``target`` (a boto3 client or Table) in a Guarded proxy; None stays None."""
+    if target is None or isinstance(target, Guarded):
+        return target
+    return Guarded(target, dependency, breaker_key)
+
+
+def reset() -> None:
+    """Forget breaker states and counters (tests, or after a deploy of a dependency)."""
+    with _breakers_lock:
+        _breakers.clear()
+    with _counters_lock:
+        _counters.clear()
@@ -0,0 +1,148 @@
+# super_hacks/responses.py
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+# orjson is several times faster than the stdlib encoder; fall back when it is
+# not bundled with the function.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bodies smaller than this are sent uncompressed; gzip costs more than it saves
+GZIP_MIN_BYTES = int(os.getenv('RESPONSE_GZIP_MIN_BYTES', '8192'))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '5'))
+# Matches the API Gateway cache TTL on GET routes so browsers reuse reads too
+READ_CACHE_SECONDS = int(os.getenv('READ_CACHE_SECONDS', '30'))
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match",
+    # Lets polling clients read the ETag to send back as If-None-Match
+    "Access-Control-Expose-Headers": "ETag",
+}
+
+
+def _convert_decimal(o: Decimal):
+    # Prefer int when there's no fractional part
+    as_int = int(o)
+    if as_int == o:
+        return as_int
+    return float(o)
+
+
+def to_jsonable(obj):
+    """Convert DynamoDB and other non-JSON types in one pass over the tree.
+
+    Decimal becomes int/float, sets become lists, bytes become str and
+    datetimes become ISO strings. Plain str/int/float/bool/None values are
+    returned as-is, so large lists of already-clean items cost little.
+    """
+    t = type(obj)
+    if t is dict:
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if t is list or t is tuple:
+        return [to_jsonable(v) for v in obj]
+    if t is str or t is int or t is float or t is bool or obj is None:
+        return obj
+    if t is Decimal:
+        return _convert_decimal(obj)
+    if isinstance(obj, (set, frozenset)):
+        return [to_jsonable(v) for v in obj]
+    if isinstance(obj, (bytes, bytearray)):
+        try:
+            return bytes(obj).decode('utf-8')
+        except Exception:
+            return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(v) for v in obj]
+    return obj
+
+
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return _convert_decimal(o)
+    raise TypeError(f"Type {type(o)} not JSON serializable")
+
+
+def dumps(body_obj) -> bytes:
+    """Serialize a response body to UTF-8 JSON bytes."""
+    clean = to_jsonable(body_obj)
+    if orjson is not None:
+        return orjson.dumps(clean, default=_json_default)
+    return json.dumps(clean, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+
+def accepts_gzip(event) -> bool:
+    """Return True when the request's Accept-Encoding allows gzip."""
+    headers = (event or {}).get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'accept-encoding' and value:
+            return 'gzip' in value.lower()
+    return False
+
+
+def etag_for(payload: bytes) -> str:
+    """Strong ETag of a serialized (uncompressed) response body."""
+    return '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(event, etag: str) -> bool:
+    """True when the request's If-None-Match names ``etag`` (or is '*')."""
+    headers = (event or {}).get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'if-none-match' and value:
+            return value.strip() == '*' or etag in (t.strip() for t in value.split(','))
+    return False
+
+
+def not_modified(etag: str) -> dict:
+    """A bodiless 304 for a client that already holds the response tagged ``etag``."""
+    return {
+        "statusCode": 304,
+        "headers": {"ETag": etag, "Cache-Control": f"max-age={READ_CACHE_SECONDS}", **CORS_HEADERS},
+        "body": "",
+    }
+
+
+def make_response(status_code: int, body_obj, event=None) -> dict:
+    """Build an API Gateway proxy response with CORS headers.
+
+    Successful GET reads carry a Cache-Control max-age of READ_CACHE_SECONDS
+    and an ETag; a request whose If-None-Match already names it gets a 304.
+
+    Bodies of at least GZIP_MIN_BYTES are gzip-compressed (and base64 encoded,
+    as API Gateway requires for binary payloads) when the caller accepts it.
+    """
+    payload = dumps(body_obj)
+    headers = {"Content-Type": "application/json", **CORS_HEADERS}
+    if status_code == 200 and (event or {}).get('httpMethod') == 'GET':
+        headers["Cache-Control"] = f"max-age={READ_CACHE_SECONDS}"
+        headers["ETag"] = etag = etag_for(payload)
+        if etag_matches(event, etag):
+            return not_modified(etag)
+    if len(payload) >= GZIP_MIN_BYTES and accepts_gzip(event):
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        return {
+            "statusCode": status_code,
+            "headers": headers,
+            "body": base64.b64encode(gzip.compress(payload, compresslevel=GZIP_LEVEL)).decode('ascii'),
+            "isBase64Encoded": True,
+        }
+    return {
+        "statusCode": status_code,
+        "headers": headers,
+        "body": payload.decode('utf-8'),
+    }
@@ -0,0 +1,271 @@
+# super_hacks/scheduler.py
+
+import heapq
+import os
+import time
+from datetime import datetime, timezone
+
+import resilience
+
+# Patches that can be sandboxed at the same time (the global limit)
+SANDBOX_SLOTS = int(os.getenv('ROLLOUT_SANDBOX_SLOTS', '10'))
+SANDBOX_HOURS = int(os.getenv('ROLLOUT_SANDBOX_HOURS', '2'))
+# Patches that may touch one asset in the same wave and the same maintenance window
+ASSET_CONCURRENCY = int(os.getenv('ROLLOUT_ASSET_CONCURRENCY', '1'))
+# Busy assets a wave may reach past to backfill its free slots
+LOOKAHEAD = int(os.getenv('ROLLOUT_LOOKAHEAD', '512'))
+# Waves included in the action response; the summary always covers the full plan
+MAX_WAVES = int(os.getenv('ROLLOUT_MAX_WAVES', '50'))
+PLAN_STATUSES = ('ANALYZED',)
+# BatchGetItem reads at most 100 keys per call; unprocessed keys are resent
+BATCH_GET_KEYS = 100
+BATCH_GET_ATTEMPTS = 3
+
+DAYS = ('SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT')
+HOURS_PER_WEEK = 168
+# Epoch hour 0 (1970-01-01) was a Thursday; shifts epoch hours onto a Sunday-based week
+_WEEK_OFFSET = 4 * 24
+
+
+def _window(asset):
+    """Return (hour of the week, length in hours) of an asset's maintenance window, or None."""
+    window = (asset or {}).get('maintenanceWindow')
+    if not isinstance(window, dict):
+        return None
+    try:
+        day = DAYS.index(str(window.get('day', '')).upper()[:3])
+        return day * 24 + int(window.get('startHour', 0)), int(window.get('hours', 1))
+    except (ValueError, TypeError):
+        return None
+
+
+def _iso(epoch_hour: int) -> str:
+    return datetime.fromtimestamp(epoch_hour * 3600, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _epoch_hour(value=None) -> int:
+    """Round an ISO timestamp (or now) up to the next whole hour."""
+    if value:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        # Plans are in UTC; a timestamp without an offset must not pick up the host's zone
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds = parsed.timestamp()
+    else:
+        seconds = time.time()
+    return -(-int(seconds) // 3600)
+
+
+def plan(patches, assets: dict, start: int, sandbox_slots: int = None,
+         sandbox_hours: int = None, asset_concurrency: int = None,
+         lookahead: int = None) -> list:
+    """Assign patches to rollout waves, highest impactScore first.
+
+    Wave k sandboxes up to ``sandbox_slots`` patches starting at epoch hour
+    ``start + k * sandbox_hours``. No asset is touched by more than
+    ``asset_concurrency`` patches of one wave; a patch that would break that
+    is held back and the wave backfills from the next best patches in the
+    queue. Held patches are parked per busy asset and skipped together, so
+    a wave reaches past at most ``lookahead`` busy assets. After its sandbox
+    run each patch is installed on every affected asset in the asset's next
+    maintenance window, again with at most ``asset_concurrency`` installs
+    per window.
+
+    ``assets`` maps assetId to the asset item. Returns a list of waves, each a
+    list of (patch, rollout_start, rollout_end) in epoch hours.
+    """
+    slots = max(1, sandbox_slots or SANDBOX_SLOTS)
+    hours = max(1, sandbox_hours or SANDBOX_HOURS)
+    limit = max(1, asset_concurrency or ASSET_CONCURRENCY)
+    reach = slots + max(0, LOOKAHEAD if lookahead is None else lookahead)
+
+    # Order: highest score, then oldest, then id, so plans are stable between runs
+    queue = [(-float(p.get('impactScore') or 0), str(p.get('createdAt') or ''), str(p.get('patchId')), i)
+             for i, p in enumerate(patches)]
+    heapq.heapify(queue)
+    windows = {asset_id: _window(asset) for asset_id, asset in assets.items()}
+    # Per asset, the latest window booked and its installs. Waves only move
+    # forward, so every earlier window an asset could still use is full.
+    last_booked = {}
+    # Patches held back behind a busy asset, best first; the queue holds each
+    # parked asset's best patch as its representative
+    parked = {}
+    representing = {}
+    waves = []
+
+    def promote(asset_id):
+        bucket = parked.get(asset_id)
+        if bucket:
+            entry = heapq.heappop(bucket)
+            representing[entry[3]] = asset_id
+            heapq.heappush(queue, entry)
+
+    while queue:
+        wave_start = start + len(waves) * hours
+        ready = wave_start + hours
+        in_wave = {}
+        wave = []
+        held = set()
+        while queue and len(wave) < slots and len(wave) + len(held) < reach:
+            entry = heapq.heappop(queue)
+            owner = representing.pop(entry[3], None)
+            if owner is not None:
+                if in_wave.get(owner, 0) >= limit:
+                    # Still busy: the whole bucket waits for the next wave
+                    heapq.heappush(parked[owner], entry)
+                    held.add(owner)
+                    continue
+                promote(owner)
+            patch = patches[entry[3]]
+            affected = patch.get('affectedAssets') or ()
+            busy = next((a for a in affected if in_wave.get(a, 0) >= limit), None)
+            if busy is not None:
+                heapq.heappush(parked.setdefault(busy, []), entry)
+                held.add(busy)
+                continue
+            first, last = None, ready
+            for asset_id in affected:
+                in_wave[asset_id] = in_wave.get(asset_id, 0) + 1
+                window = windows.get(asset_id)
+                if window is None:
+                    # No window recorded: the asset can be patched as soon as the sandbox passes
+                    begin, length = ready, 1
+                else:
+                    week_hour, length = window
+                    begin = ready + (week_hour - (ready + _WEEK_OFFSET)) % HOURS_PER_WEEK
+                booked = last_booked.get(asset_id)
+                if booked is None or booked[0] < begin:
+                    booked = last_booked[asset_id] = [begin, 0]
+                elif booked[1] >= limit:
+                    booked[0] += HOURS_PER_WEEK
+                    booked[1] = 0
+                booked[1] += 1
+                begin = booked[0]
+                first = begin if first is None else min(first, begin)
+                last = max(last, begin + length)
+            wave.append((patch, ready if first is None else first, last))
+        for asset_id in held:
+            promote(asset_id)
+        waves.append(wave)
+    return waves
+
+
+def _scan_all(table, **kwargs):
+    """Yield every item of a scan, following pagination."""
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get('Items', [])
+        if 'LastEvaluatedKey' not in resp:
+            return
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+
+def _batch_get(resource, table_name: str, keys: list, projection: str):
+    """Yield the items stored under ``keys``, BATCH_GET_KEYS per call."""
+    for start in range(0, len(keys), BATCH_GET_KEYS):
+        request = {table_name: {'Keys': keys[start:start + BATCH_GET_KEYS], 'ProjectionExpression': projection}}
+        for attempt in range(BATCH_GET_ATTEMPTS):
+            if attempt:
+                time.sleep(0.1 * 2 ** attempt)
+            resp = resource.batch_get_item(RequestItems=request)
+            yield from resp.get('Responses', {}).get(table_name, [])
+            request = resp.get('UnprocessedKeys') or {}
+            if not request:
+                break
+        if request:
+            raise RuntimeError(f"{len(request[table_name]['Keys'])} keys still unprocessed "
+                               f"after {BATCH_GET_ATTEMPTS} attempts")
+
+
+def load_inputs(patches_table, assets_table, statuses=PLAN_STATUSES, resource=None):
+    """Read the schedulable patches and the maintenance windows of the assets they touch.
+
+    Only the assets the patches reference are read, by key, through
+    ``resource`` (the DynamoDB resource that owns ``assets_table``).
+    """
+    values = {f':s{i}': status for i, status in enumerate(statuses)}
+    patches = list(_scan_all(
+        patches_table,
+        FilterExpression=f"#st IN ({', '.join(values)})",
+        ProjectionExpression='patchId, cve, impactScore, createdAt, affectedAssets',
+        ExpressionAttributeNames={'#st': 'status'},
+        ExpressionAttributeValues=values,
+    ))
+    assets = {}
+    # dict.fromkeys keeps order while dropping duplicates
+    asset_ids = list(dict.fromkeys(a for p in patches for a in p.get('affectedAssets') or []))
+    if assets_table is not None and asset_ids:
+        keys = [{'assetId': asset_id} for asset_id in asset_ids]
+        for asset in _batch_get(resource, assets_table.table_name, keys, 'assetId, maintenanceWindow'):
+            assets[asset['assetId']] = asset
+    return patches, assets
+
+
+def _int_param(params: dict, name: str, default: int) -> int:
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    value = int(value)
+    if value < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+
+def plan_rollout(params: dict) -> dict:
+    """Action entry point: plan rollout waves for every analyzed patch."""
+    import tools
+
+    patches_table = tools.get_table('PATCHES_TABLE_NAME')
+    if patches_table is None:
+        return {"status": "error", "message": "PATCHES_TABLE_NAME not configured in environment."}
+    try:
+        slots = _int_param(params, 'sandbox_slots', SANDBOX_SLOTS)
+        hours = _int_param(params, 'sandbox_hours', SANDBOX_HOURS)
+        concurrency = _int_param(params, 'asset_concurrency', ASSET_CONCURRENCY)
+        max_waves = _int_param(params, 'max_waves', MAX_WAVES)
+        start = _epoch_hour(params.get('start'))
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid rollout parameters: {e}"}
+
+    try:
+        patches, assets = load_inputs(patches_table, tools.get_table('ASSETS_TABLE_NAME'),
+                                      resource=resilience.guard(tools.get_dynamodb_resource(), 'dynamodb'))
+    except Exception as e:
+        return {"status": "error", "message": f"DynamoDB read failed: {e}"}
+
+    started = time.perf_counter()
+    waves = plan(patches, assets, start, sandbox_slots=slots, sandbox_hours=hours,
+                 asset_concurrency=concurrency)
+    planning_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    ends = [end for wave in waves for _, _, end in wave]
+    return {
+        "plan": {
+            "start": _iso(start),
+            "patches": len(patches),
+            "assets": len(assets),
+            "waves": len(waves),
+            "sandboxSlots": slots,
+            "sandboxHours": hours,
+            "assetConcurrency": concurrency,
+            # Share of sandbox slots used across all waves
+            "utilization": round(len(patches) / (len(waves) * slots), 3) if waves else None,
+            "completeBy": _iso(max(ends)) if ends else None,
+            "planningMs": planning_ms,
+        },
+        "waves": [
+            {
+                "wave": k,
+                "sandboxAt": _iso(start + k * hours),
+                "patches": [{
+                    "patchId": patch.get('patchId'),
+                    "cve": patch.get('cve'),
+                    "impactScore": patch.get('impactScore'),
+                    "assets": len(patch.get('affectedAssets') or ()),
+                    "rolloutStart": _iso(first),
+                    "rolloutEnd": _iso(last),
+                } for patch, first, last in wave],
+            }
+            for k, wave in enumerate(waves[:max_waves])
+        ],
+    }
@@ -0,0 +1,171 @@
+# super_hacks/summary.py
+
+from datetime import datetime
+from typing import Any, Optional
+
+# All dashboard aggregates live in a single item of the summary table
+SUMMARY_ID = 'dashboard'
+# Counters are updated by a separate UpdateItem after each patch write, not in
+# a transaction with it, so a writer failing between the two (or a lost
+# summary update) leaves them off by that change; recompute() repairs them.
+
+# Impact score bands as (lower bound, label), highest first
+SCORE_BANDS = ((90, '90-100'), (75, '75-89'), (50, '50-74'), (0, '0-49'))
+
+# Counter attributes are flat ("status#PENDING") because DynamoDB's ADD cannot
+# create a nested map entry when the parent map doesn't exist yet.
+_PREFIXES = {'status': 'byStatus', 'severity': 'bySeverity', 'band': 'byScoreBand'}
+
+
+def score_band(score) -> Optional[str]:
+    if score is None:
+        return None
+    score = float(score)
+    for lower, label in SCORE_BANDS:
+        if score >= lower:
+            return label
+    return SCORE_BANDS[-1][1]
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def record_patch_change(table: Any, *, created: bool = False, deleted: bool = False, severity: str = None,
+                        old_status: str = None, new_status: str = None,
+                        old_score=None, new_score=None) -> None:
+    """Apply one patch change to the summary item with a single atomic UpdateItem.
+
+    ``created`` counts a new patch (total and severity) and ``deleted``
+    uncounts one; status and score moves decrement the old bucket and
+    increment the new one.
+    """
+    deltas = {}
+
+    def bump(name, amount):
+        deltas[name] = deltas.get(name, 0) + amount
+
+    if created:
+        bump('total', 1)
+        bump(f"severity#{severity or 'UNKNOWN'}", 1)
+    if deleted:
+        bump('total', -1)
+        bump(f"severity#{severity or 'UNKNOWN'}", -1)
+    if old_status != new_status:
+        if old_status:
+            bump(f"status#{old_status}", -1)
+        if new_status:
+            bump(f"status#{new_status}", 1)
+    old_band, new_band = score_band(old_score), score_band(new_score)
+    if old_band != new_band:
+        if old_band:
+            bump(f"band#{old_band}", -1)
+        if new_band:
+            bump(f"band#{new_band}", 1)
+
+    deltas = {name: amount for name, amount in deltas.items() if amount}
+    if not deltas:
+        return
+
+    names = {'#updatedAt': 'updatedAt'}
+    values = {':updatedAt': _now()}
+    adds = []
+    for i, (name, amount) in enumerate(deltas.items()):
+        names[f'#c{i}'] = name
+        values[f':c{i}'] = amount
+        adds.append(f'#c{i} :c{i}')
+
+    table.update_item(
+        Key={'summaryId': SUMMARY_ID},
+        UpdateExpression='ADD ' + ', '.join(adds) + ' SET #updatedAt = :updatedAt',
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def record_ingest(table: Any, ingested_at: str = None) -> None:
+    """Stamp the time patches were last written by an ingest run.
+
+    Workers finish in any order, so the stamp only ever moves forward.
+    """
+    try:
+        table.update_item(
+            Key={'summaryId': SUMMARY_ID},
+            UpdateExpression='SET lastIngestAt = :t',
+            ConditionExpression='attribute_not_exists(lastIngestAt) OR lastIngestAt < :t',
+            ExpressionAttributeValues={':t': ingested_at or _now()},
+        )
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+
+def recompute(patches_table: Any, table: Any) -> dict:
+    """Rebuild every counter from a scan of the patches table and return them.
+
+    Counters are overwritten with absolute values, so run it while few
+    patches change: an increment made during the scan may be counted twice
+    or lost until the next recompute.
+    """
+    counters = {'total': 0}
+
+    def bump(name):
+        counters[name] = counters.get(name, 0) + 1
+
+    kwargs = {'ProjectionExpression': '#st, severity, impactScore, deleted',
+              'ExpressionAttributeNames': {'#st': 'status'}}
+    while True:
+        resp = patches_table.scan(**kwargs)
+        for item in resp.get('Items', []):
+            if item.get('deleted'):
+                continue
+            bump('total')
+            bump(f"severity#{item.get('severity') or 'UNKNOWN'}")
+            # Items written before statuses existed count as PENDING
+            bump(f"status#{item.get('status') or 'PENDING'}")
+            band = score_band(item.get('impactScore'))
+            if band:
+                bump(f"band#{band}")
+        if 'LastEvaluatedKey' not in resp:
+            break
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    # Buckets that emptied since the last count go to zero rather than keep a stale value
+    existing = (table.get_item(Key={'summaryId': SUMMARY_ID}).get('Item') or {})
+    for name in existing:
+        if name.partition('#')[0] in _PREFIXES:
+            counters.setdefault(name, 0)
+
+    names = {'#updatedAt': 'updatedAt'}
+    values = {':updatedAt': _now()}
+    sets = ['#updatedAt = :updatedAt']
+    for i, (name, amount) in enumerate(counters.items()):
+        names[f'#c{i}'] = name
+        values[f':c{i}'] = amount
+        sets.append(f'#c{i} = :c{i}')
+    table.update_item(
+        Key={'summaryId': SUMMARY_ID},
+        UpdateExpression='SET ' + ', '.join(sets),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+    return counters
+
+
+def read_summary(table: Any) -> dict:
+    """Fetch the summary item with one GetItem and reshape it for the API."""
+    resp = table.get_item(Key={'summaryId': SUMMARY_ID})
+    item = resp.get('Item') or {}
+    summary = {
+        'total': item.get('total', 0),
+        'byStatus': {},
+        'bySeverity': {},
+        'byScoreBand': {},
+        'lastIngestAt': item.get('lastIngestAt'),
+        'updatedAt': item.get('updatedAt'),
+    }
+    for name, value in item.items():
+        prefix, sep, key = name.partition('#')
+        if sep and prefix in _PREFIXES:
+            summary[_PREFIXES[prefix]][key] = value
+    return summary
@@ -6,15 +6,74 @@ from aws_cdk import (
     Duration,
     aws_lambda as _lambda,
     aws_apigateway as apigateway,
+    aws_apigatewayv2 as apigwv2,
+    aws_apigatewayv2_integrations as apigwv2_integrations,
     aws_dynamodb as dynamodb,
     aws_s3 as s3,
+    aws_s3_notifications as s3n,
     aws_iam as iam,  # <-- Import the IAM module
     aws_events as events,
     aws_events_targets as targets,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_event_sources,
 )
 from constructs import Construct
 from typing import cast
 
+# Interactive /invoke traffic: enough memory for fast JSON work, capped concurrency
+API_MEMORY_MB = 1024
+API_RESERVED_CONCURRENCY = 20
+
+# GET read routes answered from the API Gateway stage cache
+# Route path -> query string parameters that make up its cache key
+READ_ROUTES = {
+    "patches": ("limit", "since", "fields"),
+    "assets": ("limit", "fields"),
+    "events": ("limit", "since", "fields"),
+    "events/history": ("start", "end", "source", "patch_id", "limit"),
+    "compliance": ("limit",),
+    "summary": (),
+    "dashboard": (),
+    "patches/query": ("status", "severity", "vendor", "cve_year", "min_score", "max_score",
+                      "older_than_days", "newer_than_days", "group_by", "limit"),
+    "rollout": ("start", "sandbox_slots", "sandbox_hours", "asset_concurrency", "max_waves"),
+}
+READ_CACHE_TTL = Duration.seconds(30)
+READ_CACHE_CLUSTER_SIZE = "0.5"
+
+# Events live in DynamoDB for EVENTS_TTL_DAYS and are archived to S3 after
+# EVENTS_ARCHIVE_AFTER_DAYS, leaving a margin for failed compaction runs
+EVENTS_TTL_DAYS = 30
+EVENTS_ARCHIVE_AFTER_DAYS = 7
+
+# Scheduled ingest parses the whole feed and fans out chunks to the work queue
+INGEST_TIMEOUT = Duration.minutes(15)
+INGEST_MEMORY_MB = 2048
+INGEST_MAX_ITEMS = 5000
+INGEST_CHUNK_SIZE = 25
+
+# WebSocket connection handling is tiny: register, drop or update filters
+WS_HANDLER_TIMEOUT = Duration.seconds(10)
+WS_HANDLER_MEMORY_MB = 256
+WS_STAGE_NAME = "prod"
+
+# Snapshot copies uploaded to the exploit intelligence bucket
+KEV_OBJECT_KEY = "exploit-intel/known_exploited_vulnerabilities.json"
+EPSS_OBJECT_KEY = "exploit-intel/epss_scores-current.csv.gz"
+# Rebuilt from the two snapshots above whenever either is uploaded
+EXPLOIT_INDEX_OBJECT_KEY = "exploit-intel/exploit_intel.idx"
+
+# Table exports stream through one long-running function, never the API one
+EXPORT_TIMEOUT = Duration.minutes(15)
+EXPORT_MEMORY_MB = 1024
+EXPORT_SEGMENTS = 8
+
+# Queue workers write one chunk per record
+WORKER_TIMEOUT = Duration.minutes(2)
+WORKER_MEMORY_MB = 512
+WORKER_BATCH_SIZE = 10
+WORKER_MAX_CONCURRENCY = 5
+
 
 class SuperHacksStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -28,6 +87,8 @@ class SuperHacksStack(Stack):
             code=_lambda.Code.from_asset("super_hacks"),
             # environment will be set after resource creation so create function first
             timeout=Duration.seconds(30),
+            memory_size=API_MEMORY_MB,
+            reserved_concurrent_executions=API_RESERVED_CONCURRENCY,
         )
 
         # 2. Add permission to call the Bedrock AI model
@@ -36,51 +97,69 @@ class SuperHacksStack(Stack):
             resources=["*"]  # For the hackathon, "*" is fine.
         ))
 
-        # 3. Define the API Gateway (No changes here)
+        # 3. Define the API Gateway
+        # Every route is a Lambda proxy integration, so the handler sees one
+        # event shape and sets its own CORS headers. GET read routes are
+        # served from the stage cache, keyed on their query string, so
+        # repeat dashboard reads within the TTL never reach Lambda.
+        # (HTTP APIs would be leaner still but have no response cache.)
+        cached_read_method = apigateway.MethodDeploymentOptions(
+            caching_enabled=True,
+            cache_ttl=READ_CACHE_TTL,
+            cache_data_encrypted=True,
+        )
         api = apigateway.RestApi(
             self, "IPO-Api",
             rest_api_name="IPO-Api",
             default_cors_preflight_options={
                 "allow_origins": ["*"],
                 "allow_methods": ["GET", "POST", "OPTIONS"],
-                "allow_headers": ["Content-Type", "Authorization"],
+                "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
             },
-
+            # Lets gzip-encoded Lambda responses pass through as binary
+            binary_media_types=["*/*"],
+            deploy_options=apigateway.StageOptions(
+                cache_cluster_enabled=True,
+                cache_cluster_size=READ_CACHE_CLUSTER_SIZE,
+                method_options={
+                    f"/{route}/GET": cached_read_method for route in READ_ROUTES
+                },
+            ),
         )
 
-        # ... (The rest of the file is the same)
         invoke_resource = api.root.add_resource("invoke")
-        # Use a non-proxy integration so API Gateway can inject CORS headers on responses
-        post_integration = apigateway.LambdaIntegration(
-            handler=cast(_lambda.IFunction, ipo_agent_lambda),
-            proxy=False,
-            integration_responses=[{
-                "statusCode": "200",
-                "responseParameters": {
-                    "method.response.header.Access-Control-Allow-Origin": "'*'",
-                    "method.response.header.Access-Control-Allow-Headers": "'Content-Type,Authorization'",
-                    "method.response.header.Access-Control-Allow-Methods": "'GET,POST,OPTIONS'",
-                }
-            }]
-        )
-
         invoke_resource.add_method(
             "POST",
-            post_integration,
-            method_responses=[{
-                "statusCode": "200",
-                "responseParameters": {
-                    "method.response.header.Access-Control-Allow-Origin": True,
-                    "method.response.header.Access-Control-Allow-Headers": True,
-                    "method.response.header.Access-Control-Allow-Methods": True,
-                }
-            }]
+            apigateway.LambdaIntegration(
+                handler=cast(_lambda.IFunction, ipo_agent_lambda),
+                proxy=True,
+            ),
         )
 
+        # Gzip and plain responses must be cached separately, and a 304 must
+        # only be replayed to clients that sent the same If-None-Match
+        cache_headers = ["method.request.header.Accept-Encoding",
+                         "method.request.header.If-None-Match"]
+        for route, query_names in READ_ROUTES.items():
+            query_params = [f"method.request.querystring.{name}"
+                            for name in query_names]
+            api.root.resource_for_path(route).add_method(
+                "GET",
+                apigateway.LambdaIntegration(
+                    handler=cast(_lambda.IFunction, ipo_agent_lambda),
+                    proxy=True,
+                    cache_key_parameters=query_params + cache_headers,
+                ),
+                request_parameters={
+                    name: False for name in query_params + cache_headers},
+            )
+
         patches_table = dynamodb.Table(
             self, "IPO-Patches",
             partition_key=dynamodb.Attribute(
                 name="patchId", type=dynamodb.AttributeType.STRING),
+            # Removes the tombstones deleted patches leave for delta polls
+            time_to_live_attribute="expiresAt",
             removal_policy=RemovalPolicy.DESTROY
         )
 
@@ -113,6 +192,9 @@ class SuperHacksStack(Stack):
             "COMPLIANCE_BUCKET_NAME", compliance_bucket.bucket_name)
         ipo_agent_lambda.add_environment(
             "BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
+        # Short lookups and classification prompts are routed to the faster model
+        ipo_agent_lambda.add_environment(
+            "BEDROCK_FAST_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
 
         # --- Events table to store ingestion and pipeline events ---
         events_table = dynamodb.Table(
@@ -121,6 +203,8 @@ class SuperHacksStack(Stack):
                 name="eventId", type=dynamodb.AttributeType.STRING),
             sort_key=dynamodb.Attribute(
                 name="timestamp", type=dynamodb.AttributeType.STRING),
+            # Events expire from the hot table; older history lives in S3
+            time_to_live_attribute="expiresAt",
             removal_policy=RemovalPolicy.DESTROY
         )
 
@@ -130,11 +214,266 @@ class SuperHacksStack(Stack):
         # Make events table name available to the main lambda (used by ingestion & queries)
         ipo_agent_lambda.add_environment(
             "EVENTS_TABLE_NAME", events_table.table_name)
-        # Schedule the main agent lambda to run the CVE ingestion path daily.
-        # The lambda's handler can inspect the event to perform ingestion when scheduled.
+
+        # --- Summary table holding incrementally maintained dashboard aggregates ---
+        summary_table = dynamodb.Table(
+            self, "IPO-Summary",
+            partition_key=dynamodb.Attribute(
+                name="summaryId", type=dynamodb.AttributeType.STRING),
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        summary_table.grant_read_write_data(ipo_agent_lambda)
+        ipo_agent_lambda.add_environment(
+            "SUMMARY_TABLE_NAME", summary_table.table_name)
+        # --- Dedicated ingest function and queue-fed workers ---
+        # Ingest runs on its own function so a long feed download never competes
+        # with interactive /invoke traffic or hits the API function's 30s timeout.
+        ingest_dlq = sqs.Queue(
+            self, "IPO-IngestDLQ",
+            retention_period=Duration.days(14),
+        )
+        ingest_queue = sqs.Queue(
+            self, "IPO-IngestQueue",
+            # AWS recommends at least six times the consumer's timeout
+            visibility_timeout=Duration.seconds(WORKER_TIMEOUT.to_seconds() * 6),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=3, queue=ingest_dlq),
+        )
+
+        ingest_environment = {
+            "PATCHES_TABLE_NAME": patches_table.table_name,
+            "EVENTS_TABLE_NAME": events_table.table_name,
+            "SUMMARY_TABLE_NAME": summary_table.table_name,
+        }
+
+        ingest_lambda = _lambda.Function(
+            self, "IpoIngestFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="cve_ingest.lambda_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=INGEST_TIMEOUT,
+            memory_size=INGEST_MEMORY_MB,
+            environment={
+                **ingest_environment,
+                "INGEST_QUEUE_URL": ingest_queue.queue_url,
+                "INGEST_MAX_ITEMS": str(INGEST_MAX_ITEMS),
+                "INGEST_CHUNK_SIZE": str(INGEST_CHUNK_SIZE),
+            },
+        )
+
+        ingest_worker_lambda = _lambda.Function(
+            self, "IpoIngestWorkerFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="cve_ingest.worker_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=WORKER_TIMEOUT,
+            memory_size=WORKER_MEMORY_MB,
+            environment=ingest_environment,
+        )
+        ingest_worker_lambda.add_event_source(lambda_event_sources.SqsEventSource(
+            ingest_queue,
+            batch_size=WORKER_BATCH_SIZE,
+            max_batching_window=Duration.seconds(5),
+            max_concurrency=WORKER_MAX_CONCURRENCY,
+            report_batch_item_failures=True,
+        ))
+
+        ingest_queue.grant_send_messages(ingest_lambda)
+        for fn in (ingest_lambda, ingest_worker_lambda):
+            patches_table.grant_read_write_data(fn)
+            events_table.grant_read_write_data(fn)
+            summary_table.grant_read_write_data(fn)
+
+        # --- Exploit intelligence: KEV and EPSS snapshots used to score and enrich patches ---
+        exploit_intel_bucket = s3.Bucket(
+            self, "IPO-ExploitIntel",
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+        )
+        exploit_index_lambda = _lambda.Function(
+            self, "IpoExploitIndexFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="exploit_intel.lambda_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=Duration.minutes(5),
+            memory_size=1024,
+        )
+        exploit_intel_bucket.grant_put(exploit_index_lambda)
+        # The raw snapshots stay configured: functions parse them while the index is missing
+        for fn in (ipo_agent_lambda, ingest_lambda, ingest_worker_lambda, exploit_index_lambda):
+            exploit_intel_bucket.grant_read(fn)
+            fn.add_environment("KEV_SOURCE", exploit_intel_bucket.s3_url_for_object(KEV_OBJECT_KEY))
+            fn.add_environment("EPSS_SOURCE", exploit_intel_bucket.s3_url_for_object(EPSS_OBJECT_KEY))
+            fn.add_environment("EXPLOIT_INTEL_INDEX",
+                               exploit_intel_bucket.s3_url_for_object(EXPLOIT_INDEX_OBJECT_KEY))
+        for key in (KEV_OBJECT_KEY, EPSS_OBJECT_KEY):
+            exploit_intel_bucket.add_event_notification(
+                s3.EventType.OBJECT_CREATED,
+                s3n.LambdaDestination(cast(_lambda.IFunction, exploit_index_lambda)),
+                s3.NotificationKeyFilter(prefix=key))
+
+        # --- Event archive: daily compaction of older events into S3 ---
+        event_archive_bucket = s3.Bucket(
+            self, "IPO-EventArchive",
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[s3.LifecycleRule(
+                transitions=[s3.Transition(
+                    storage_class=s3.StorageClass.INFREQUENT_ACCESS,
+                    transition_after=Duration.days(90))],
+            )],
+        )
+        event_archive_lambda = _lambda.Function(
+            self, "IpoEventArchiveFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="event_archive.lambda_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=Duration.minutes(5),
+            memory_size=512,
+            environment={
+                "EVENTS_TABLE_NAME": events_table.table_name,
+                "EVENT_ARCHIVE_BUCKET_NAME": event_archive_bucket.bucket_name,
+                "EVENTS_TTL_DAYS": str(EVENTS_TTL_DAYS),
+                "EVENTS_ARCHIVE_AFTER_DAYS": str(EVENTS_ARCHIVE_AFTER_DAYS),
+            },
+        )
+        events_table.grant_read_data(event_archive_lambda)
+        event_archive_bucket.grant_put(event_archive_lambda)
+        event_archive_bucket.grant_read(ipo_agent_lambda)
+        ipo_agent_lambda.add_environment(
+            "EVENT_ARCHIVE_BUCKET_NAME", event_archive_bucket.bucket_name)
+        events.Rule(
+            self, "EventArchiveSchedule",
+            schedule=events.Schedule.rate(Duration.hours(24)),
+            targets=[targets.LambdaFunction(
+                handler=cast(_lambda.IFunction, event_archive_lambda))]
+        )
+
+        # --- Bulk exports: the API or a daily schedule starts them, a long-timeout function streams them to S3 ---
+        export_bucket = s3.Bucket(
+            self, "IPO-Exports",
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            # Clean up parts of exports that were aborted or timed out
+            lifecycle_rules=[s3.LifecycleRule(
+                abort_incomplete_multipart_upload_after=Duration.days(1))],
+        )
+        export_lambda = _lambda.Function(
+            self, "IpoExportFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="export.lambda_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=EXPORT_TIMEOUT,
+            memory_size=EXPORT_MEMORY_MB,
+            environment={
+                "PATCHES_TABLE_NAME": patches_table.table_name,
+                "ASSETS_TABLE_NAME": assets_table.table_name,
+                "EXPORT_BUCKET_NAME": export_bucket.bucket_name,
+                "EXPORT_SEGMENTS": str(EXPORT_SEGMENTS),
+            },
+        )
+        patches_table.grant_read_data(export_lambda)
+        assets_table.grant_read_data(export_lambda)
+        export_bucket.grant_read_write(export_lambda)
+        export_bucket.grant_read_write(ipo_agent_lambda)
+        export_lambda.grant_invoke(ipo_agent_lambda)
+        ipo_agent_lambda.add_environment("EXPORT_BUCKET_NAME", export_bucket.bucket_name)
+        ipo_agent_lambda.add_environment("EXPORT_FUNCTION_NAME", export_lambda.function_name)
+        # Daily snapshot of both tables, so downstream consumers don't depend on the API
+        events.Rule(
+            self, "ExportSchedule",
+            schedule=events.Schedule.rate(Duration.hours(24)),
+            targets=[targets.LambdaFunction(
+                handler=cast(_lambda.IFunction, export_lambda),
+                event=events.RuleTargetInput.from_object({"table": table}))
+                for table in ("patches", "assets")]
+        )
+
+        # --- WebSocket API: push new events to dashboards instead of polling ---
+        # Connections (and their source/patch filters) are tracked in a table;
+        # every function that writes events fans them out after each flush.
+        connections_table = dynamodb.Table(
+            self, "IPO-WsConnections",
+            partition_key=dynamodb.Attribute(
+                name="connectionId", type=dynamodb.AttributeType.STRING),
+            # Rows of connections that vanished without a $disconnect expire
+            time_to_live_attribute="expiresAt",
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        ws_lambda = _lambda.Function(
+            self, "IpoWsFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="ws_handler.lambda_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=WS_HANDLER_TIMEOUT,
+            memory_size=WS_HANDLER_MEMORY_MB,
+            environment={"WS_CONNECTIONS_TABLE_NAME": connections_table.table_name},
+        )
+        connections_table.grant_read_write_data(ws_lambda)
+        ws_integration = apigwv2_integrations.WebSocketLambdaIntegration(
+            "IpoWsIntegration", cast(_lambda.IFunction, ws_lambda))
+        ws_api = apigwv2.WebSocketApi(
+            self, "IPO-WsApi",
+            api_name="IPO-WsApi",
+            connect_route_options=apigwv2.WebSocketRouteOptions(integration=ws_integration),
+            disconnect_route_options=apigwv2.WebSocketRouteOptions(integration=ws_integration),
+            default_route_options=apigwv2.WebSocketRouteOptions(integration=ws_integration),
+        )
+        ws_api.add_route("subscribe", integration=ws_integration)
+        ws_stage = apigwv2.WebSocketStage(
+            self, "IPO-WsStage",
+            web_socket_api=ws_api,
+            stage_name=WS_STAGE_NAME,
+            auto_deploy=True,
+        )
+        for fn in (ipo_agent_lambda, ingest_lambda, ingest_worker_lambda):
+            connections_table.grant_read_write_data(fn)
+            ws_api.grant_manage_connections(fn)
+            fn.add_environment("WS_CONNECTIONS_TABLE_NAME", connections_table.table_name)
+            fn.add_environment("WS_CALLBACK_URL", ws_stage.callback_url)
+
+        # --- Event fallback: events the table refuses are queued and replayed ---
+        events_fallback_dlq = sqs.Queue(
+            self, "IPO-EventsFallbackDLQ",
+            retention_period=Duration.days(14),
+        )
+        events_fallback_queue = sqs.Queue(
+            self, "IPO-EventsFallbackQueue",
+            retention_period=Duration.days(4),
+            visibility_timeout=Duration.seconds(WORKER_TIMEOUT.to_seconds() * 6),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=5, queue=events_fallback_dlq),
+        )
+        event_replay_lambda = _lambda.Function(
+            self, "IpoEventReplayFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="event_buffer.replay_handler",
+            code=_lambda.Code.from_asset("super_hacks"),
+            timeout=WORKER_TIMEOUT,
+            memory_size=WORKER_MEMORY_MB,
+            environment={
+                "EVENTS_TABLE_NAME": events_table.table_name,
+                "WS_CONNECTIONS_TABLE_NAME": connections_table.table_name,
+                "WS_CALLBACK_URL": ws_stage.callback_url,
+            },
+        )
+        event_replay_lambda.add_event_source(lambda_event_sources.SqsEventSource(
+            events_fallback_queue,
+            batch_size=10,
+            report_batch_item_failures=True,
+        ))
+        events_table.grant_write_data(event_replay_lambda)
+        connections_table.grant_read_write_data(event_replay_lambda)
+        ws_api.grant_manage_connections(event_replay_lambda)
+        for fn in (ipo_agent_lambda, ingest_lambda, ingest_worker_lambda):
+            events_fallback_queue.grant_send_messages(fn)
+            fn.add_environment("EVENTS_FALLBACK_QUEUE_URL", events_fallback_queue.queue_url)
+
+        # Schedule the dedicated ingest function to run the CVE ingestion daily.
         rule = events.Rule(
             self, "CVEIngestSchedule",
             schedule=events.Schedule.rate(Duration.hours(24)),
             targets=[targets.LambdaFunction(
-                handler=cast(_lambda.IFunction, ipo_agent_lambda))]
+                handler=cast(_lambda.IFunction, ingest_lambda))]
         )
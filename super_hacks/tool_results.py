@@ -0,0 +1,149 @@
+# super_hacks/tool_results.py
+
+import json
+import os
+from collections import Counter
+
+from responses import to_jsonable
+
+# Upper bound on what a single tool result may add to the model's context.
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv('TOOL_RESULT_TOKEN_BUDGET', '1500'))
+# Longest list passed through before the rest is summarized
+TOOL_RESULT_TOP_K = int(os.getenv('TOOL_RESULT_TOP_K', '20'))
+# Longest string value kept once a result is still over budget after trimming lists
+MAX_STRING_CHARS = 200
+
+# Fields the model actually needs from each kind of item
+PROJECTIONS = {
+    'patches': ('patchId', 'cve', 'severity', 'status', 'impactScore'),
+    'assets': ('assetId', 'hostname', 'businessCriticality'),
+    'events': ('timestamp', 'source', 'patchId', 'message'),
+    'frameworks': ('key', 'name', 'score', 'status'),
+}
+
+# Fields counted across the full list so trimming never hides the overall picture
+SUMMARY_FIELDS = {
+    'patches': ('status', 'severity'),
+    'assets': ('businessCriticality',),
+    'events': ('source',),
+}
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# Which items survive top-k: riskiest patches, most critical assets, newest
+# events. Each entry is (sort key, descending).
+RANKINGS = {
+    'patches': (lambda item: _number(item.get('impactScore')), True),
+    'assets': (lambda item: item.get('businessCriticality') == 'high', True),
+    'events': (lambda item: str(item.get('timestamp', '')), True),
+}
+
+
+def estimate_tokens(obj) -> int:
+    """Rough token count for a JSON value (about four characters per token)."""
+    return len(json.dumps(obj, separators=(',', ':'))) // 4 + 1
+
+
+def _project(key: str, items: list) -> list:
+    fields = PROJECTIONS.get(key)
+    if not fields:
+        return items
+    return [{f: item[f] for f in fields if f in item} if isinstance(item, dict) else item
+            for item in items]
+
+
+def _summarize(key: str, items: list) -> dict:
+    summary = {"total": len(items)}
+    for field in SUMMARY_FIELDS.get(key, ()):
+        counts = Counter(str(item.get(field)) for item in items
+                         if isinstance(item, dict) and field in item)
+        if counts:
+            summary[f"by_{field}"] = dict(counts.most_common())
+    return summary
+
+
+def _truncate_strings(obj, limit: int):
+    if isinstance(obj, str):
+        return obj if len(obj) <= limit else obj[:limit] + '...'
+    if isinstance(obj, dict):
+        return {k: _truncate_strings(v, limit) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_truncate_strings(v, limit) for v in obj]
+    return obj
+
+
+def shape_tool_result(result, token_budget: int = None, top_k: int = None) -> dict:
+    """Reduce a tool result to what the model needs before it is sent back.
+
+    List values are projected to their relevant fields, ranked and cut to the
+    top ``top_k`` entries, and accompanied by a ``<key>_summary`` with totals
+    and counts over the whole list. If the result is still larger than
+    ``token_budget`` the lists are halved and long strings clipped; if even
+    that is not enough, list items, summaries and finally the largest fields
+    are dropped until it fits. ``truncated`` is set whenever anything was cut.
+    The returned dict is always JSON-safe.
+    """
+    token_budget = token_budget or TOOL_RESULT_TOKEN_BUDGET
+    top_k = top_k if top_k is not None else TOOL_RESULT_TOP_K
+
+    clean = to_jsonable(result)
+    if not isinstance(clean, dict):
+        clean = {"result": clean}
+
+    shaped = {}
+    list_keys = []
+    for key, value in clean.items():
+        if not isinstance(value, list):
+            shaped[key] = value
+            continue
+        items = _project(key, value)
+        ranking = RANKINGS.get(key)
+        if ranking is not None and len(items) > top_k:
+            rank, descending = ranking
+            items = sorted((i for i in items if isinstance(i, dict)),
+                           key=rank, reverse=descending)
+        shaped[key] = items[:top_k]
+        if len(value) > top_k or key in SUMMARY_FIELDS:
+            shaped[f"{key}_summary"] = _summarize(key, value)
+        list_keys.append(key)
+
+    while estimate_tokens(shaped) > token_budget:
+        longest = max(list_keys, key=lambda k: len(shaped[k]), default=None)
+        if longest is None or not shaped[longest]:
+            break
+        shaped[longest] = shaped[longest][:len(shaped[longest]) // 2]
+    truncated = any(len(shaped[k]) < len(clean[k]) for k in list_keys)
+
+    if estimate_tokens(shaped) > token_budget:
+        clipped = _truncate_strings(shaped, MAX_STRING_CHARS)
+        truncated = truncated or clipped != shaped
+        shaped = clipped
+
+    if truncated or estimate_tokens(shaped) > token_budget:
+        shaped["truncated"] = True
+    return _enforce_budget(shaped, list_keys, token_budget)
+
+
+def _enforce_budget(shaped: dict, list_keys: list, token_budget: int) -> dict:
+    """Hard cap: drop list items, then summaries, then the largest fields until it fits."""
+    def over():
+        return estimate_tokens(shaped) > token_budget
+
+    for key in list_keys:
+        while over() and shaped[key]:
+            shaped[key].pop()
+    for key in list_keys:
+        if over():
+            shaped.pop(f"{key}_summary", None)
+    while over():
+        rest = [k for k in shaped if k != "truncated"]
+        if not rest:
+            break
+        del shaped[max(rest, key=lambda k: estimate_tokens(shaped[k]))]
+    return shaped
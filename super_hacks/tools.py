@@ -3,8 +3,18 @@ import json
 import time
 import random
 import os
+import threading
+from datetime import datetime
 from typing import Optional, Any
 
+import delta_sync
+import event_buffer
+import exploit_intel
+import patch_state
+import projection
+import resilience
+import summary
+
 # Load local .env for developer convenience if python-dotenv is available.
 try:
     from dotenv import load_dotenv
@@ -14,11 +24,19 @@ except Exception:
 
 
 _dynamodb: Any = None
+_s3: Any = None
+# Batched actions call into this module from several threads at once; client
+# construction on the default boto3 session is not thread-safe.
+_client_lock = threading.Lock()
 
 
 def get_dynamodb_resource() -> Any:
     global _dynamodb
-    if _dynamodb is None:
+    if _dynamodb is not None:
+        return _dynamodb
+    with _client_lock:
+        if _dynamodb is not None:
+            return _dynamodb
         # Allow AWS_REGION and other boto3 configuration via environment
         region = os.getenv('AWS_REGION', os.getenv('AWS_DEFAULT_REGION', None))
         # Support DynamoDB Local for local development/testing
@@ -26,11 +44,13 @@ def get_dynamodb_resource() -> Any:
         try:
             if endpoint:
                 _dynamodb = boto3.resource(
-                    'dynamodb', region_name=region or None, endpoint_url=endpoint)
+                    'dynamodb', region_name=region or None, endpoint_url=endpoint,
+                    config=resilience.client_config('dynamodb'))
             elif region:
-                _dynamodb = boto3.resource('dynamodb', region_name=region)
+                _dynamodb = boto3.resource('dynamodb', region_name=region,
+                                           config=resilience.client_config('dynamodb'))
             else:
-                _dynamodb = boto3.resource('dynamodb')
+                _dynamodb = boto3.resource('dynamodb', config=resilience.client_config('dynamodb'))
         except Exception:
             # Propagate the exception so callers see the error, but avoid leaving _dynamodb set
             _dynamodb = None
@@ -38,6 +58,16 @@ def get_dynamodb_resource() -> Any:
     return _dynamodb
 
 
+def get_s3_client() -> Any:
+    global _s3
+    if _s3 is None:
+        with _client_lock:
+            if _s3 is None:
+                _s3 = boto3.client('s3', config=resilience.client_config('s3'))
+    # Calls check the request deadline and the S3 circuit breaker
+    return resilience.guard(_s3, 's3')
+
+
 def get_table(table_env: str) -> Optional[Any]:
     """Return a DynamoDB Table object.
 
@@ -59,11 +89,39 @@ def get_table(table_env: str) -> Optional[Any]:
         return None
 
     try:
-        return get_dynamodb_resource().Table(table_name)
+        # Calls check the request deadline and the DynamoDB circuit breaker
+        return resilience.guard(get_dynamodb_resource().Table(table_name), 'dynamodb')
     except Exception:
         return None
 
 
+def _timestamp() -> str:
+    """UTC ISO timestamp stamped as updatedAt on every patch write."""
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def get_summary_table() -> Optional[Any]:
+    """Return the dashboard summary table, or None when it isn't configured."""
+    if not os.getenv('SUMMARY_TABLE_NAME'):
+        return None
+    return get_table('SUMMARY_TABLE_NAME')
+
+
+def _record_summary(**change) -> None:
+    """Best-effort update of the dashboard aggregates for one patch change."""
+    summary_table = get_summary_table()
+    if summary_table is None:
+        return
+    try:
+        summary.record_patch_change(summary_table, **change)
+    except Exception as e:
+        print('Failed to update summary', e)
+
+
+# Patch attributes prioritize_patch reads to score and claim a candidate
+SCORING_FIELDS = ('patchId', 'cve', 'severity', 'status', patch_state.REVISION)
+
+
 def prioritize_patch(cve_info: str) -> dict:
     """
     Analyzes a patch description, calculates an Impact Score, and updates its status in DynamoDB.
@@ -78,10 +136,13 @@ def prioritize_patch(cve_info: str) -> dict:
     if patches_table is None:
         return {"status": "error", "message": "PATCHES_TABLE_NAME not configured in environment."}
 
-    # In a real app, you'd find the patchId from the cve_info. Here we'll get the first pending one.
+    # In a real app, you'd find the patchId from the cve_info. Here we take the
+    # first unscored patch that no other worker claims first.
     try:
         response = patches_table.scan(
-            FilterExpression="attribute_not_exists(impactScore)"
+            FilterExpression="attribute_not_exists(impactScore)",
+            # Scoring needs none of the descriptions
+            **projection.add({}, SCORING_FIELDS)
         )
     except Exception as e:
         return {"status": "error", "message": f"DynamoDB scan failed: {e}"}
@@ -89,64 +150,82 @@ def prioritize_patch(cve_info: str) -> dict:
     if not response.get('Items'):
         return {"status": "error", "message": "No pending patches found to prioritize."}
 
-    patch = response['Items'][0]
-    patch_id = patch.get('patchId') or patch.get('id')
-
     # Simulate business impact analysis by checking for critical assets
     num_critical_assets = 0
     if assets_table is not None:
         try:
             critical_assets_response = assets_table.scan(
                 FilterExpression="businessCriticality = :val",
-                ExpressionAttributeValues={":val": "high"}
+                ExpressionAttributeValues={":val": "high"},
+                Select='COUNT'
             )
             num_critical_assets = critical_assets_response.get('Count', 0)
         except Exception:
             num_critical_assets = 0
 
-    # Calculate Impact Score
-    impact_score = 50  # Base score
-    if patch.get('severity') == 'CRITICAL':
-        impact_score += 30
-    if num_critical_assets > 0:
-        impact_score += 15
-
-    is_high_risk = impact_score > 75
-
-    # Update the item in DynamoDB if possible
-    if patches_table is not None and patch_id:
+    for patch in response['Items']:
+        patch_id = patch.get('patchId') or patch.get('id')
+        if not patch_id:
+            continue
+
+        # Calculate Impact Score
+        impact_score = 50  # Base score
+        if patch.get('severity') == 'CRITICAL':
+            impact_score += 30
+        if num_critical_assets > 0:
+            impact_score += 15
+        # Known exploitation (CISA KEV) and likely exploitation (EPSS) raise the score
+        intel = exploit_intel.lookup(patch.get('cve'))
+        impact_score = min(100, impact_score + exploit_intel.score_bonus(intel))
+
+        is_high_risk = impact_score > 75
+
+        # Scoring is the claim: the conditional write succeeds for exactly one
+        # worker, and only if the patch is unchanged since this scan read it
         try:
-            patches_table.update_item(
-                Key={'patchId': patch_id},
-                UpdateExpression="SET impactScore = :s, #st = :stat",
-                ExpressionAttributeNames={'#st': 'status'},
-                ExpressionAttributeValues={
-                    ':s': impact_score,
-                    ':stat': 'ANALYZED'
-                }
-            )
-        except Exception:
-            pass
-
-    print(f"Calculated Impact Score: {impact_score} for Patch ID: {patch_id}")
-    return {"patchId": patch_id, "impactScore": impact_score, "is_high_risk": is_high_risk}
+            old = patch_state.transition(
+                patches_table, patch_id, 'ANALYZED', _timestamp(),
+                revision=patch.get(patch_state.REVISION, 0),
+                attributes={'impactScore': impact_score, **exploit_intel.attributes(intel)},
+                condition='attribute_not_exists(impactScore)')
+        except patch_state.Conflict:
+            print(f"Patch {patch_id} was claimed by another worker; trying the next one")
+            continue
+        except Exception as e:
+            # An unstored score is not a result: nothing claimed the patch
+            return {"status": "error", "message": f"Failed to store impact score for {patch_id}: {e}"}
+        _record_summary(old_status=old.get('status'), new_status='ANALYZED',
+                        new_score=impact_score)
+        event_buffer.emit('prioritize', f"Scored patch {patch_id}: {impact_score}",
+                          patch_id=patch_id)
+
+        print(f"Calculated Impact Score: {impact_score} for Patch ID: {patch_id}")
+        result = {"patchId": patch_id, "impactScore": impact_score, "is_high_risk": is_high_risk}
+        if intel:
+            result["exploitIntel"] = intel
+        return result
+
+    return {"status": "error", "message": "No pending patches found to prioritize."}
 
 
 def run_sandbox_test(patch_id: str) -> dict:
     """Simulates a sandbox test for a given patchId and updates its status."""
     print(f"TOOL: Starting sandbox test for Patch ID: '{patch_id}'...")
     patches_table = get_table('PATCHES_TABLE_NAME')
+    revision = None
     if patches_table is not None:
         try:
-            # 1. Set status to SANDBOX_TESTING
-            patches_table.update_item(
-                Key={'patchId': patch_id},
-                UpdateExpression="SET #st = :stat",
-                ExpressionAttributeNames={'#st': 'status'},
-                ExpressionAttributeValues={':stat': 'SANDBOX_TESTING'}
-            )
-        except Exception:
-            pass
+            # 1. Set status to SANDBOX_TESTING, only from a status that allows it
+            old = patch_state.transition(patches_table, patch_id, 'SANDBOX_TESTING', _timestamp())
+            revision = old.get(patch_state.REVISION, 0) + 1
+            _record_summary(old_status=old.get('status'), new_status='SANDBOX_TESTING')
+            event_buffer.emit('sandbox', f"Sandbox test started for {patch_id}",
+                              patch_id=patch_id)
+        except patch_state.Conflict:
+            return {"status": "error",
+                    "message": f"Patch {patch_id} not found, not analyzed yet, or already in a sandbox test."}
+        except Exception as e:
+            return {"status": "error", "message": f"Failed to start sandbox test for {patch_id}: {e}"}
 
     # 2. Simulate a delay (can be short)
     time.sleep(1)
@@ -157,60 +236,147 @@ def run_sandbox_test(patch_id: str) -> dict:
 
     if patches_table is not None:
         try:
-            patches_table.update_item(
-                Key={'patchId': patch_id},
-                UpdateExpression="SET #st = :stat",
-                ExpressionAttributeNames={'#st': 'status'},
-                ExpressionAttributeValues={':stat': final_status}
-            )
-        except Exception:
-            pass
+            # Only this test's own SANDBOX_TESTING write may be followed by its result
+            patch_state.transition(patches_table, patch_id, final_status, _timestamp(), revision=revision)
+            _record_summary(old_status='SANDBOX_TESTING', new_status=final_status)
+            event_buffer.emit('sandbox', f"Sandbox test {test_result} for {patch_id}",
+                              patch_id=patch_id)
+        except patch_state.Conflict:
+            print(f"Patch {patch_id} changed during its sandbox test; result not stored")
+        except Exception as e:
+            return {"status": "error", "message": f"Sandbox test {test_result} for {patch_id} not stored: {e}"}
 
     print(f"Sandbox test result: {test_result}")
     # Confidence can be static for now
     return {"testResult": test_result, "confidence": 94}
 
 
-def list_patches(limit: int = 50) -> dict:
-    """Return a list of patches from the patches table."""
+def list_patches(limit: int = 50, since: str = None, fields=None) -> dict:
+    """Return a list of patches from the patches table.
+
+    With ``since`` (a version token or ISO timestamp) only patches written
+    after it are returned, plus the version to send on the next poll.
+    ``fields`` picks the attributes returned (see projection.DEFAULT_FIELDS;
+    "*" for whole items).
+    """
     patches_table = get_table('PATCHES_TABLE_NAME')
     if patches_table is None:
         return {"status": "error", "message": "PATCHES_TABLE_NAME not configured in environment."}
     try:
-        resp = patches_table.scan(Limit=limit)
+        read, returned = projection.resolve(fields, 'patches')
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    if since:
+        # Deltas include tombstones, {patchId, deleted, updatedAt}, so clients drop deleted patches
+        returned = returned and returned + [patch_state.DELETED]
+        return _list_changes(patches_table, 'patches', 'updatedAt', since, limit, read, returned)
+    try:
+        resp = patches_table.scan(Limit=limit, **projection.add({}, read))
         items = resp.get('Items', [])
-        return {"patches": items}
+        live = [item for item in items if not item.get(patch_state.DELETED)]
+        return {"patches": projection.trim(live, returned),
+                "version": delta_sync.high_water(items, 'updatedAt')}
+    except Exception as e:
+        return {"status": "error", "message": f"DynamoDB scan failed: {e}"}
+
+
+def delete_patch(patch_id: str) -> dict:
+    """Delete a patch, leaving a tombstone that list_patches deltas report."""
+    patches_table = get_table('PATCHES_TABLE_NAME')
+    if patches_table is None:
+        return {"status": "error", "message": "PATCHES_TABLE_NAME not configured in environment."}
+    try:
+        old = patch_state.delete(patches_table, patch_id, _timestamp(), delta_sync.tombstone_expiry())
+    except patch_state.Conflict:
+        return {"status": "error", "message": f"Patch {patch_id} not found."}
+    except Exception as e:
+        return {"status": "error", "message": f"DynamoDB put_item failed: {e}"}
+    _record_summary(deleted=True, severity=old.get('severity'), old_status=old.get('status') or 'PENDING',
+                    old_score=old.get('impactScore'))
+    event_buffer.emit('patch', f"Patch {patch_id} deleted", patch_id=patch_id)
+    return {"patchId": patch_id, "deleted": True}
+
+
+def _list_changes(table, key: str, attribute: str, since: str, limit: int,
+                  read=None, returned=None) -> dict:
+    try:
+        since = delta_sync.parse_since(since)
+    except ValueError:
+        return {"status": "error", "message": f"Invalid since '{since}': expected a version or ISO timestamp."}
+    try:
+        items, version, more = delta_sync.changed_since(table, attribute, since, limit, fields=read)
     except Exception as e:
         return {"status": "error", "message": f"DynamoDB scan failed: {e}"}
+    return {key: projection.trim(items, returned), "since": since, "version": version, "more": more}
+
+
+def get_summary() -> dict:
+    """Return the incrementally maintained dashboard aggregates."""
+    summary_table = get_summary_table()
+    if summary_table is None:
+        return {"status": "error", "message": "SUMMARY_TABLE_NAME not configured in environment."}
+    try:
+        return {"summary": summary.read_summary(summary_table)}
+    except Exception as e:
+        return {"status": "error", "message": f"DynamoDB get_item failed: {e}"}
+
+
+def recompute_summary() -> dict:
+    """Rebuild the dashboard aggregates from the patches table (see summary.recompute)."""
+    summary_table = get_summary_table()
+    patches_table = get_table('PATCHES_TABLE_NAME')
+    if summary_table is None or patches_table is None:
+        return {"status": "error", "message": "PATCHES_TABLE_NAME and SUMMARY_TABLE_NAME must be configured."}
+    try:
+        summary.recompute(patches_table, summary_table)
+        return {"summary": summary.read_summary(summary_table)}
+    except Exception as e:
+        return {"status": "error", "message": f"Summary recompute failed: {e}"}
 
 
-def list_assets(limit: int = 100) -> dict:
-    """Return a list of assets from the assets table."""
+def list_assets(limit: int = 100, fields=None) -> dict:
+    """Return a list of assets from the assets table; ``fields`` as for list_patches."""
     assets_table = get_table('ASSETS_TABLE_NAME')
     if assets_table is None:
         return {"status": "error", "message": "ASSETS_TABLE_NAME not configured in environment."}
     try:
-        resp = assets_table.scan(Limit=limit)
+        read, returned = projection.resolve(fields, 'assets')
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    try:
+        resp = assets_table.scan(Limit=limit, **projection.add({}, read))
         items = resp.get('Items', [])
-        return {"assets": items}
+        return {"assets": projection.trim(items, returned)}
     except Exception as e:
         return {"status": "error", "message": f"DynamoDB scan failed: {e}"}
 
 
-def list_events(limit: int = 100) -> dict:
-    """Return a list of events from the EVENTS DynamoDB table."""
+def list_events(limit: int = 100, since: str = None, fields=None) -> dict:
+    """Return a list of events from the EVENTS DynamoDB table.
+
+    With ``since`` only events recorded after it are returned, oldest first.
+    Events are never modified; they only expire after EVENTS_TTL_DAYS.
+    ``fields`` as for list_patches.
+    """
     events_table = get_table('EVENTS_TABLE_NAME')
     if events_table is None:
         return {"status": "error", "message": "EVENTS_TABLE_NAME not configured in environment."}
     try:
-        resp = events_table.scan(Limit=limit)
+        read, returned = projection.resolve(fields, 'events')
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    if since:
+        return _list_changes(events_table, 'events', 'timestamp', since, limit, read, returned)
+    try:
+        resp = events_table.scan(Limit=limit, **projection.add({}, read))
         items = resp.get('Items', [])
         # Sort by timestamp if present (descending)
         try:
             items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
         except Exception:
             pass
-        return {"events": items}
+        return {"events": projection.trim(items, returned),
+                "version": delta_sync.high_water(items, 'timestamp')}
     except Exception as e:
         return {"status": "error", "message": f"DynamoDB scan failed: {e}"}
 
@@ -225,7 +391,7 @@ def list_compliance(max_items: int = 50) -> dict:
     if not bucket:
         return {"status": "error", "message": "COMPLIANCE_BUCKET_NAME not configured in environment."}
 
-    s3 = boto3.client('s3')
+    s3 = get_s3_client()
     try:
         resp = s3.list_objects_v2(Bucket=bucket, MaxKeys=max_items)
         contents = resp.get('Contents', [])
@@ -0,0 +1,51 @@
+# super_hacks/ws_handler.py
+
+import json
+
+import ws_publisher
+
+
+def _response(status_code: int, body: dict = None) -> dict:
+    resp = {"statusCode": status_code}
+    if body is not None:
+        resp["body"] = json.dumps(body)
+    return resp
+
+
+def lambda_handler(event, context):
+    """WebSocket API routes: $connect, $disconnect and subscribe.
+
+    Clients may pass filters when connecting (?sources=cve_ingest,sandbox&patchIds=p-1)
+    or at any time afterwards with {"action": "subscribe", "sources": [...],
+    "patchIds": [...]}; empty filters receive every event.
+    """
+    ctx = event.get('requestContext') or {}
+    route = ctx.get('routeKey')
+    connection_id = ctx.get('connectionId')
+    if not connection_id:
+        return _response(400, {"error": "connectionId missing"})
+    registry = ws_publisher.get_registry()
+
+    try:
+        if route == '$connect':
+            params = event.get('queryStringParameters') or {}
+            registry.add(connection_id, params.get('sources'), params.get('patchIds') or params.get('patchId'))
+            return _response(200)
+
+        if route == '$disconnect':
+            registry.remove(connection_id)
+            return _response(200)
+
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except ValueError:
+            body = None
+        if route == 'subscribe' and isinstance(body, dict):
+            registry.subscribe(connection_id, body.get('sources'), body.get('patchIds'))
+            return _response(200, {"subscribed": {"sources": sorted(ws_publisher.filter_set(body.get('sources'))),
+                                                  "patchIds": sorted(ws_publisher.filter_set(body.get('patchIds')))}})
+    except Exception as e:
+        print(f'WebSocket {route} failed for {connection_id}:', e)
+        return _response(500, {"error": str(e)})
+
+    return _response(400, {"error": "send {\"action\": \"subscribe\", \"sources\": [...], \"patchIds\": [...]}"})
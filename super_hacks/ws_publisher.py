@@ -0,0 +1,237 @@
+# super_hacks/ws_publisher.py
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from responses import dumps
+
+# API Gateway closes WebSocket connections after two hours; rows outlive them briefly
+CONNECTION_TTL_SECONDS = 2 * 3600 + 600
+# Events per pushed message, well inside API Gateway's 128 KB message limit
+WS_MAX_MESSAGE_EVENTS = int(os.getenv('WS_MAX_MESSAGE_EVENTS', '50'))
+WS_PUBLISH_WORKERS = int(os.getenv('WS_PUBLISH_WORKERS', '8'))
+# Every flush in this window reuses one scan of the connections table; a
+# dashboard that connects through another container gets events after this
+WS_CONNECTIONS_CACHE_SECONDS = float(os.getenv('WS_CONNECTIONS_CACHE_SECONDS', '5'))
+
+
+def filter_set(values) -> set:
+    """Normalise a filter given as a list or a comma-separated string."""
+    if not values:
+        return set()
+    if isinstance(values, str):
+        values = values.split(',')
+    return {str(v).strip() for v in values if str(v).strip()}
+
+
+def matches(subscription: dict, event: dict) -> bool:
+    """True when the event passes the connection's source and patch filters (empty = all)."""
+    sources = subscription.get('sources')
+    patch_ids = subscription.get('patchIds')
+    if sources and event.get('source') not in sources:
+        return False
+    if patch_ids and event.get('patchId') not in patch_ids:
+        return False
+    return True
+
+
+class MemoryRegistry:
+    """Connection registry held in process; used locally and in tests."""
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def add(self, connection_id: str, sources=None, patch_ids=None) -> None:
+        with self._lock:
+            self._connections[connection_id] = {'sources': filter_set(sources), 'patchIds': filter_set(patch_ids)}
+
+    def subscribe(self, connection_id: str, sources=None, patch_ids=None) -> None:
+        self.add(connection_id, sources, patch_ids)
+
+    def remove(self, connection_id: str) -> None:
+        with self._lock:
+            self._connections.pop(connection_id, None)
+
+    def connections(self) -> dict:
+        with self._lock:
+            return dict(self._connections)
+
+
+class DynamoRegistry:
+    """Connection registry in the WS_CONNECTIONS_TABLE_NAME table, keyed on connectionId.
+
+    ``connections`` scans the table at most once per ``cache_seconds``;
+    changes made through this registry update the cached copy directly.
+    """
+
+    def __init__(self, table, cache_seconds: float = WS_CONNECTIONS_CACHE_SECONDS, clock=time.monotonic):
+        self.table = table
+        self.cache_seconds = cache_seconds
+        self._clock = clock
+        self._cached = None
+        self._cached_at = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, connection_id: str, sources=None, patch_ids=None) -> None:
+        item = {'connectionId': connection_id, 'connectedAt': int(time.time()),
+                'expiresAt': int(time.time()) + CONNECTION_TTL_SECONDS}
+        # DynamoDB rejects empty sets, so unfiltered connections simply omit them
+        if filter_set(sources):
+            item['sources'] = filter_set(sources)
+        if filter_set(patch_ids):
+            item['patchIds'] = filter_set(patch_ids)
+        self.table.put_item(Item=item)
+        with self._lock:
+            if self._cached is not None:
+                self._cached[connection_id] = {'sources': filter_set(sources), 'patchIds': filter_set(patch_ids)}
+
+    def subscribe(self, connection_id: str, sources=None, patch_ids=None) -> None:
+        # Replacing the row also revives one whose TTL removed it early
+        self.add(connection_id, sources, patch_ids)
+
+    def remove(self, connection_id: str) -> None:
+        self.table.delete_item(Key={'connectionId': connection_id})
+        with self._lock:
+            if self._cached is not None:
+                self._cached.pop(connection_id, None)
+
+    def connections(self) -> dict:
+        with self._lock:
+            if self._cached is not None and self._clock() - self._cached_at < self.cache_seconds:
+                return dict(self._cached)
+        started = self._clock()
+        kwargs = {'ProjectionExpression': 'connectionId, sources, patchIds'}
+        found = {}
+        while True:
+            resp = self.table.scan(**kwargs)
+            for item in resp.get('Items', []):
+                found[item['connectionId']] = {'sources': set(item.get('sources') or ()),
+                                               'patchIds': set(item.get('patchIds') or ())}
+            if 'LastEvaluatedKey' not in resp:
+                break
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+        with self._lock:
+            self._cached, self._cached_at = found, started
+        return dict(found)
+
+
+class Gone(Exception):
+    """The client behind a connection id has disconnected."""
+
+
+class MemorySender:
+    """Collects pushed messages per connection instead of sending them."""
+
+    def __init__(self, gone=()):
+        self.sent = {}
+        self.gone = set(gone)
+        self._lock = threading.Lock()
+
+    def send(self, connection_id: str, data: bytes) -> None:
+        if connection_id in self.gone:
+            raise Gone(connection_id)
+        with self._lock:
+            self.sent.setdefault(connection_id, []).append(data)
+
+
+class ApiGatewaySender:
+    """Posts messages through the API Gateway management API of the WebSocket stage."""
+
+    def __init__(self, endpoint_url: str):
+        self.client = boto3.client('apigatewaymanagementapi', endpoint_url=endpoint_url)
+
+    def send(self, connection_id: str, data: bytes) -> None:
+        try:
+            self.client.post_to_connection(ConnectionId=connection_id, Data=data)
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') == 'GoneException':
+                raise Gone(connection_id)
+            raise
+
+
+_registry = None
+_sender = None
+_lock = threading.Lock()
+
+
+def configure(registry=None, sender=None) -> None:
+    """Override the registry and sender, e.g. with MemoryRegistry/MemorySender locally."""
+    global _registry, _sender
+    _registry, _sender = registry, sender
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                if os.getenv('WS_CONNECTIONS_TABLE_NAME'):
+                    import tools
+                    _registry = DynamoRegistry(tools.get_table('WS_CONNECTIONS_TABLE_NAME'))
+                else:
+                    _registry = MemoryRegistry()
+    return _registry
+
+
+def get_sender():
+    """The configured sender, or None when this function has no WebSocket stage to push to."""
+    global _sender
+    if _sender is None and os.getenv('WS_CALLBACK_URL'):
+        with _lock:
+            if _sender is None:
+                _sender = ApiGatewaySender(os.environ['WS_CALLBACK_URL'])
+    return _sender
+
+
+def _send(sender, registry, connection_id, events) -> tuple:
+    messages = 0
+    for start in range(0, len(events), WS_MAX_MESSAGE_EVENTS):
+        data = dumps({'type': 'events', 'events': events[start:start + WS_MAX_MESSAGE_EVENTS]})
+        try:
+            sender.send(connection_id, data)
+        except Gone:
+            registry.remove(connection_id)
+            return messages, True
+        except Exception as e:
+            # One failing connection must not hold back everyone else's events
+            print(f'Failed to push events to {connection_id}:', e)
+            return messages, False
+        messages += 1
+    return messages, False
+
+
+def publish(events: list) -> dict:
+    """Push a batch of written events to every subscribed connection.
+
+    Each connection gets only the events that pass its filters, sent as one
+    message per WS_MAX_MESSAGE_EVENTS events. Connections that have gone away
+    are dropped from the registry. Returns counts for logging.
+    """
+    sender = get_sender()
+    if sender is None or not events:
+        return {'connections': 0, 'messages': 0, 'gone': 0}
+    registry = get_registry()
+    deliveries = []
+    for connection_id, subscription in registry.connections().items():
+        selected = [event for event in events if matches(subscription, event)]
+        if selected:
+            deliveries.append((connection_id, selected))
+    if not deliveries:
+        return {'connections': 0, 'messages': 0, 'gone': 0}
+
+    workers = max(1, min(WS_PUBLISH_WORKERS, len(deliveries)))
+    if workers == 1:
+        results = [_send(sender, registry, cid, selected) for cid, selected in deliveries]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda d: _send(sender, registry, *d), deliveries))
+    return {
+        'connections': len(deliveries),
+        'messages': sum(messages for messages, _ in results),
+        'gone': sum(1 for _, gone in results if gone),
+    }
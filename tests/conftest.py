@@ -0,0 +1,21 @@
+import pathlib
+import sys
+
+import pytest
+
+# The Lambda asset is the super_hacks/ directory itself, so its modules import
+# each other by bare name (``from tools import ...``). Mirror that layout here.
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "super_hacks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def fake_backend():
+    """In-memory AWS services wired into the app modules for one test."""
+    from tests.fakes import FakeBackend
+
+    backend = FakeBackend(sleep=None)
+    with backend.install():
+        yield backend
@@ -0,0 +1,22 @@
+"""In-memory stand-ins for the AWS services the backend talks to.
+
+The fakes implement the DynamoDB table, query, scan and batch APIs (with
+expressions, real pagination and 1 MB pages), S3 object and multipart calls,
+SQS batches and a scripted Bedrock ``converse``. All of them share a
+FaultInjector, so latency and throttling can be injected per service and
+call counts compared between runs without touching AWS.
+"""
+from .backend import APP_BUCKETS, APP_TABLES, FakeBackend
+from .bedrock import FakeBedrockRuntime, text_response, tool_use_response
+from .dynamodb import FakeDynamoDB, FakeTable, item_size, to_dynamo
+from .faults import ClientError, FaultConfig, FaultInjector, client_error
+from .s3 import FakeS3
+from .sqs import FakeSQS
+
+__all__ = [
+    'APP_BUCKETS', 'APP_TABLES', 'FakeBackend',
+    'FakeBedrockRuntime', 'text_response', 'tool_use_response',
+    'FakeDynamoDB', 'FakeTable', 'item_size', 'to_dynamo',
+    'ClientError', 'FaultConfig', 'FaultInjector', 'client_error',
+    'FakeS3', 'FakeSQS',
+]
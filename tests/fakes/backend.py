@@ -0,0 +1,132 @@
+"""One object bundling the fake services, plus wiring into the app modules."""
+import contextlib
+import importlib
+import os
+import sys
+import time
+import types
+
+from .bedrock import FakeBedrockRuntime
+from .dynamodb import FakeDynamoDB
+from .faults import FaultInjector
+from .s3 import FakeS3
+from .sqs import FakeSQS
+
+# Environment variable -> (table name, partition key, sort key), as in the stack
+APP_TABLES = {
+    'PATCHES_TABLE_NAME': ('IPO-Patches', 'patchId', None),
+    'ASSETS_TABLE_NAME': ('IPO-Assets', 'assetId', None),
+    'EVENTS_TABLE_NAME': ('IPO-Events', 'eventId', 'timestamp'),
+    'SUMMARY_TABLE_NAME': ('IPO-Summary', 'summaryId', None),
+}
+APP_BUCKETS = {
+    'COMPLIANCE_BUCKET_NAME': 'ipo-compliance',
+    'EVENT_ARCHIVE_BUCKET_NAME': 'ipo-event-archive',
+    'EXPORT_BUCKET_NAME': 'ipo-exports',
+}
+# Modules that create boto3 clients, imported flat (as Lambda does) or as a package
+APP_MODULES = ('tools', 'agent', 'cve_ingest', 'event_buffer')
+# Lazily created client globals that must be reset so they resolve to the fakes
+CLIENT_GLOBALS = ('_dynamodb', '_s3', '_bedrock')
+
+
+class FakeBackend:
+    """DynamoDB, S3, SQS and Bedrock fakes sharing one FaultInjector.
+
+    ``install()`` points the application modules at the fakes and sets the
+    table and bucket environment variables the stack would set::
+
+        backend = FakeBackend()
+        backend.faults.configure('dynamodb', latency_ms=5, throttle_rate=0.01)
+        with backend.install():
+            agent.lambda_handler(event, None)
+        print(backend.faults.stats())
+    """
+
+    def __init__(self, seed: int = 0, sleep=time.sleep, app_tables: bool = True):
+        self.faults = FaultInjector(seed=seed, sleep=sleep)
+        self.dynamodb = FakeDynamoDB(self.faults)
+        self.s3 = FakeS3(self.faults)
+        self.sqs = FakeSQS(self.faults)
+        self.bedrock = FakeBedrockRuntime(faults=self.faults)
+        self.environ = {}
+        if app_tables:
+            for env_name, (name, partition_key, sort_key) in APP_TABLES.items():
+                self.dynamodb.create_table(name, partition_key, sort_key)
+                self.environ[env_name] = name
+            for env_name, bucket in APP_BUCKETS.items():
+                self.s3.create_bucket(Bucket=bucket)
+                self.environ[env_name] = bucket
+            self.faults.reset_counters()
+
+    def table(self, env_name: str):
+        """The fake table behind one of the app's *_TABLE_NAME variables."""
+        return self.dynamodb.Table(self.environ.get(env_name, env_name))
+
+    def load(self, env_name: str, items):
+        """Seed a table directly, bypassing fault injection and counters."""
+        table = self.table(env_name)
+        from .dynamodb import to_dynamo
+        with table._lock:
+            for item in items:
+                item = to_dynamo(item)
+                table._store(table._key_from(item, 'PutItem'), item)
+        return table
+
+    # -- boto3 entry points -----------------------------------------------------
+
+    def resource(self, service_name, *args, **kwargs):
+        if service_name == 'dynamodb':
+            return self.dynamodb
+        raise ValueError(f"No fake resource for {service_name}")
+
+    def client(self, service_name, *args, **kwargs):
+        fakes = {'s3': self.s3, 'sqs': self.sqs, 'bedrock-runtime': self.bedrock}
+        if service_name not in fakes:
+            raise ValueError(f"No fake client for {service_name}")
+        return fakes[service_name]
+
+    @property
+    def boto3(self):
+        """A module-like object exposing ``resource`` and ``client``."""
+        return types.SimpleNamespace(resource=self.resource, client=self.client)
+
+    @contextlib.contextmanager
+    def install(self, modules=None, environ: bool = True):
+        """Route the app modules' boto3 calls to the fakes for the duration.
+
+        ``modules`` defaults to the flat Lambda modules plus any ``super_hacks.*``
+        copies already imported. Cached clients are cleared on entry and exit so
+        nothing created against the fakes leaks into later code.
+        """
+        if modules is None:
+            modules = [importlib.import_module(name) for name in APP_MODULES]
+            modules += [sys.modules[f'super_hacks.{name}'] for name in APP_MODULES
+                        if f'super_hacks.{name}' in sys.modules]
+        saved = []
+        for module in modules:
+            for attr in ('boto3',) + CLIENT_GLOBALS:
+                if hasattr(module, attr):
+                    saved.append((module, attr, getattr(module, attr)))
+                    setattr(module, attr, self.boto3 if attr == 'boto3' else None)
+        # Breakers tripped by one test's injected faults must not leak into the next
+        resilience = importlib.import_module('resilience')
+        resilience.reset()
+        saved_env = {}
+        if environ:
+            for name, value in self.environ.items():
+                saved_env[name] = os.environ.get(name)
+                os.environ[name] = value
+        try:
+            yield self
+        finally:
+            # Events one test left buffered must not be flushed into the next one's tables
+            importlib.import_module('event_buffer')._buffer.discard()
+            for module, attr, value in saved:
+                setattr(module, attr, value if attr == 'boto3' else None)
+            resilience.reset()
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
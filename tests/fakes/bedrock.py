@@ -0,0 +1,65 @@
+"""Scripted Bedrock runtime client for the Converse API."""
+import threading
+
+from .faults import FaultInjector
+
+
+def text_response(text: str, input_tokens: int = 100, output_tokens: int = 20) -> dict:
+    """A Converse response whose message is plain text."""
+    return {
+        'output': {'message': {'role': 'assistant', 'content': [{'text': text}]}},
+        'stopReason': 'end_turn',
+        'usage': {'inputTokens': input_tokens, 'outputTokens': output_tokens,
+                  'totalTokens': input_tokens + output_tokens},
+        'metrics': {'latencyMs': 0},
+    }
+
+
+def tool_use_response(name: str, tool_input: dict = None, tool_use_id: str = 'tool-1') -> dict:
+    """A Converse response asking the caller to run one tool."""
+    resp = text_response('')
+    resp['output']['message']['content'] = [
+        {'toolUse': {'toolUseId': tool_use_id, 'name': name, 'input': tool_input or {}}}
+    ]
+    resp['stopReason'] = 'tool_use'
+    return resp
+
+
+class FakeBedrockRuntime:
+    """Stand-in for ``boto3.client('bedrock-runtime')``.
+
+    Each ``converse`` call takes the next entry from ``script``: a response
+    dict, an exception to raise, or a callable that receives the request and
+    returns a response. With an empty script ``default`` is used, which is a
+    text response by default. Every request is kept in ``requests``.
+    """
+
+    def __init__(self, script=None, default=None, faults: FaultInjector = None):
+        self.faults = faults or FaultInjector()
+        self._script = list(script or [])
+        self.default = default or text_response('Direct answer from model.')
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def queue(self, *responses):
+        """Append responses to the script."""
+        with self._lock:
+            self._script.extend(responses)
+
+    def converse(self, **request):
+        self.faults.before('bedrock', 'Converse')
+        with self._lock:
+            self.requests.append(request)
+            step = self._script.pop(0) if self._script else self.default
+        if isinstance(step, BaseException):
+            raise step
+        response = step(request) if callable(step) else step
+        usage = response.get('usage', {})
+        self.faults.after('bedrock', 'Converse',
+                          4 * (usage.get('inputTokens', 0) + usage.get('outputTokens', 0)))
+        return response
+
+    @property
+    def models(self) -> list:
+        """Model IDs in call order."""
+        return [r.get('modelId') for r in self.requests]
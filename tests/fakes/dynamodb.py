@@ -0,0 +1,579 @@
+"""In-memory DynamoDB resource with the Table API the application uses.
+
+Items are stored the way boto3 returns them (numbers as Decimal, sets as
+Python sets) and copied on every read and write, so callers cannot mutate
+stored state by accident. Scans and queries paginate like the service:
+a page stops after ``Limit`` evaluated items or once 1 MB of item data has
+been read, and ``LastEvaluatedKey`` marks where the next page starts.
+"""
+import bisect
+import threading
+import zlib
+from decimal import Decimal
+
+from .expressions import (ExpressionError, Context, apply_update, evaluate,
+                          parse_condition, parse_projection, parse_update, project)
+from .faults import FaultInjector, client_error
+
+MAX_PAGE_BYTES = 1024 * 1024
+MAX_ITEM_BYTES = 400 * 1024
+MAX_BATCH_WRITE = 25
+MAX_BATCH_GET = 100
+
+
+def _validation(message: str, operation: str):
+    return client_error('ValidationException', message, operation)
+
+
+def to_dynamo(value):
+    """Normalise a Python value the way the boto3 serializer would accept it."""
+    t = type(value)
+    if t is str or t is bool or value is None or t is Decimal:
+        return value
+    if t is int:
+        return Decimal(value)
+    if t is float:
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if t is dict:
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if t is list or t is tuple:
+        return [to_dynamo(v) for v in value]
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, (set, frozenset)):
+        if not value:
+            raise ValueError("An empty set is not a valid DynamoDB value")
+        return {to_dynamo(v) for v in value}
+    raise TypeError(f"Unsupported type {t} for value {value!r}")
+
+
+def _clone(value):
+    t = type(value)
+    if t is dict:
+        return {k: _clone(v) for k, v in value.items()}
+    if t is list:
+        return [_clone(v) for v in value]
+    if t is set:
+        return set(value)
+    return value
+
+
+def item_size(value) -> int:
+    """Approximate DynamoDB item size in bytes (names plus values)."""
+    t = type(value)
+    if t is str:
+        return len(value.encode('utf-8'))
+    if t is Decimal:
+        return len(value.as_tuple().digits) // 2 + 2
+    if t is dict:
+        return 3 + sum(len(k) + item_size(v) for k, v in value.items())
+    if t is list:
+        return 3 + sum(1 + item_size(v) for v in value)
+    if t is set:
+        return sum(item_size(v) for v in value)
+    if t is bytes:
+        return len(value)
+    return 1
+
+
+def _expression(kwargs, key, operation, is_key_condition=False):
+    """Return the parsed expression under ``key`` plus its placeholder context.
+
+    Accepts both strings and boto3.dynamodb.conditions objects.
+    """
+    names = dict(kwargs.get('ExpressionAttributeNames') or {})
+    values = {k: to_dynamo(v) for k, v in (kwargs.get('ExpressionAttributeValues') or {}).items()}
+    expr = kwargs.get(key)
+    if expr is not None and not isinstance(expr, str):
+        from boto3.dynamodb.conditions import ConditionExpressionBuilder
+        built = ConditionExpressionBuilder().build_expression(expr, is_key_condition=is_key_condition)
+        expr = built.condition_expression
+        names.update(built.attribute_name_placeholders)
+        values.update({k: to_dynamo(v) for k, v in built.attribute_value_placeholders.items()})
+    ctx = Context(names, values)
+    if expr is None:
+        return None, ctx
+    try:
+        return parse_condition(expr), ctx
+    except ExpressionError as e:
+        raise _validation(f"Invalid {key}: {e}", operation)
+
+
+def _projection(kwargs, ctx, operation):
+    expr = kwargs.get('ProjectionExpression')
+    if not expr:
+        return None
+    try:
+        return parse_projection(expr)
+    except ExpressionError as e:
+        raise _validation(f"Invalid ProjectionExpression: {e}", operation)
+
+
+def _order_key(key):
+    # Scans return items in hash order of the partition key, like the service
+    return (zlib.crc32(repr(key[0]).encode('utf-8')), repr(key))
+
+
+def _segment_of(key, total):
+    return zlib.crc32(repr(key[0]).encode('utf-8')) % total
+
+
+class FakeTable:
+    """One table: a dict of items keyed by (partition, sort) plus partition indexes."""
+
+    def __init__(self, resource, name, partition_key, sort_key=None, indexes=None):
+        self._resource = resource
+        self.name = self.table_name = name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.key_schema = [{'AttributeName': partition_key, 'KeyType': 'HASH'}]
+        if sort_key:
+            self.key_schema.append({'AttributeName': sort_key, 'KeyType': 'RANGE'})
+        # index name -> (partition attribute, sort attribute or None)
+        self.indexes = dict(indexes or {})
+        self._items = {}
+        self._sizes = {}
+        self._partitions = {None: {}}
+        for index in self.indexes:
+            self._partitions[index] = {}
+        self._order = None
+        self._lock = threading.RLock()
+
+    # -- helpers --------------------------------------------------------------
+
+    @property
+    def _faults(self) -> FaultInjector:
+        return self._resource.faults
+
+    @property
+    def item_count(self) -> int:
+        return len(self._items)
+
+    def all_items(self) -> list:
+        """Copies of every stored item, for assertions in tests."""
+        return [_clone(item) for item in list(self._items.values())]
+
+    def _schema(self, index=None):
+        if index is None:
+            return self.partition_key, self.sort_key
+        if index not in self.indexes:
+            raise _validation(f"The table does not have the specified index: {index}", 'Query')
+        return self.indexes[index]
+
+    def _key_from(self, item, operation, exact=False):
+        pk, sk = self.partition_key, self.sort_key
+        expected = {pk} | ({sk} if sk else set())
+        if pk not in item or (sk and sk not in item) or (exact and set(item) != expected):
+            raise _validation("The provided key element does not match the schema", operation)
+        for attr in expected:
+            if type(item[attr]) not in (str, Decimal, bytes):
+                raise _validation("The provided key element does not match the schema", operation)
+        return (item[pk], item[sk] if sk else None)
+
+    def _key_attrs(self, key, item=None, index=None):
+        attrs = {self.partition_key: key[0]}
+        if self.sort_key:
+            attrs[self.sort_key] = key[1]
+        if index is not None and item is not None:
+            for attr in self.indexes[index]:
+                if attr:
+                    attrs[attr] = item[attr]
+        return attrs
+
+    def _index_values(self, index, item):
+        pk, sk = self.indexes[index]
+        if pk not in item or (sk and sk not in item):
+            return None
+        return item[pk]
+
+    def _store(self, key, item, operation='PutItem'):
+        # Caller holds the lock
+        size = item_size(item) if item is not None else 0
+        if size > MAX_ITEM_BYTES:
+            raise _validation("Item size has exceeded the maximum allowed size", operation)
+        old = self._items.get(key)
+        if old is None:
+            self._order = None
+        for index in self._partitions:
+            if old is not None:
+                old_part = old[self.partition_key] if index is None else self._index_values(index, old)
+                if old_part is not None:
+                    self._partitions[index].get(old_part, {}).pop(key, None)
+            if item is not None:
+                part = item[self.partition_key] if index is None else self._index_values(index, item)
+                if part is not None:
+                    self._partitions[index].setdefault(part, {})[key] = True
+        if item is None:
+            self._items.pop(key, None)
+            self._sizes.pop(key, None)
+            self._order = None
+        else:
+            self._items[key] = item
+            self._sizes[key] = size
+
+    def _check(self, kwargs, current, operation):
+        node, ctx = _expression(kwargs, 'ConditionExpression', operation)
+        if node is None:
+            return
+        try:
+            ok = evaluate(node, current or {}, ctx)
+        except ExpressionError as e:
+            raise _validation(str(e), operation)
+        if not ok:
+            raise client_error('ConditionalCheckFailedException',
+                               'The conditional request failed', operation)
+
+    # -- single-item operations -------------------------------------------------
+
+    def put_item(self, Item, ReturnValues='NONE', **kwargs):
+        self._faults.before('dynamodb', 'PutItem')
+        item = to_dynamo(Item)
+        key = self._key_from(item, 'PutItem')
+        with self._lock:
+            old = self._items.get(key)
+            self._check(kwargs, old, 'PutItem')
+            self._store(key, item)
+        self._faults.after('dynamodb', 'PutItem', self._sizes.get(key, 0))
+        resp = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            resp['Attributes'] = _clone(old)
+        return resp
+
+    def get_item(self, Key, **kwargs):
+        self._faults.before('dynamodb', 'GetItem')
+        key = self._key_from(to_dynamo(Key), 'GetItem', exact=True)
+        item = self._items.get(key)
+        resp = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        nbytes = 0
+        if item is not None:
+            _, ctx = _expression(kwargs, None, 'GetItem')
+            paths = _projection(kwargs, ctx, 'GetItem')
+            out = project(item, paths, ctx) if paths else _clone(item)
+            resp['Item'] = out
+            nbytes = item_size(out)
+        self._faults.after('dynamodb', 'GetItem', nbytes)
+        return resp
+
+    def update_item(self, Key, UpdateExpression=None, ReturnValues='NONE', **kwargs):
+        self._faults.before('dynamodb', 'UpdateItem')
+        key_attrs = to_dynamo(Key)
+        key = self._key_from(key_attrs, 'UpdateItem', exact=True)
+        _, ctx = _expression(kwargs, None, 'UpdateItem')
+        try:
+            actions = parse_update(UpdateExpression) if UpdateExpression else ()
+        except ExpressionError as e:
+            raise _validation(f"Invalid UpdateExpression: {e}", 'UpdateItem')
+        with self._lock:
+            old = self._items.get(key)
+            self._check(kwargs, old, 'UpdateItem')
+            new = _clone(old) if old is not None else dict(key_attrs)
+            try:
+                touched = apply_update(actions, new, ctx)
+            except ExpressionError as e:
+                raise _validation(str(e), 'UpdateItem')
+            if any(name in touched for name in (self.partition_key, self.sort_key) if name):
+                raise _validation("Cannot update attribute that is part of the key", 'UpdateItem')
+            self._store(key, new, 'UpdateItem')
+        self._faults.after('dynamodb', 'UpdateItem', self._sizes.get(key, 0))
+
+        resp = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            resp['Attributes'] = _clone(old)
+        elif ReturnValues == 'ALL_NEW':
+            resp['Attributes'] = _clone(new)
+        elif ReturnValues == 'UPDATED_OLD' and old is not None:
+            attrs = {k: _clone(old[k]) for k in touched if k in old}
+            if attrs:
+                resp['Attributes'] = attrs
+        elif ReturnValues == 'UPDATED_NEW':
+            attrs = {k: _clone(new[k]) for k in touched if k in new}
+            if attrs:
+                resp['Attributes'] = attrs
+        return resp
+
+    def delete_item(self, Key, ReturnValues='NONE', **kwargs):
+        self._faults.before('dynamodb', 'DeleteItem')
+        key = self._key_from(to_dynamo(Key), 'DeleteItem', exact=True)
+        with self._lock:
+            old = self._items.get(key)
+            self._check(kwargs, old, 'DeleteItem')
+            if old is not None:
+                self._store(key, None)
+        self._faults.after('dynamodb', 'DeleteItem')
+        resp = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            resp['Attributes'] = _clone(old)
+        return resp
+
+    # -- scan and query -------------------------------------------------------
+
+    def _scan_order(self):
+        order = self._order
+        if order is None:
+            with self._lock:
+                keys = sorted(self._items, key=_order_key)
+                order = self._order = ([_order_key(k) for k in keys], keys)
+        return order
+
+    def _page(self, operation, keys, kwargs, index=None):
+        """Evaluate candidate keys in order into one page of results."""
+        limit = kwargs.get('Limit')
+        if limit is not None and limit < 1:
+            raise _validation("Limit must be greater than or equal to 1", operation)
+        select = kwargs.get('Select', 'ALL_ATTRIBUTES')
+        node, ctx = _expression(kwargs, 'FilterExpression', operation)
+        paths = _projection(kwargs, ctx, operation)
+
+        items, scanned, count, read_bytes, returned_bytes = [], 0, 0, 0, 0
+        last = None
+        more = False
+        for key in keys:
+            item = self._items.get(key)
+            if item is None:
+                continue
+            if (limit is not None and scanned >= limit) or read_bytes >= MAX_PAGE_BYTES:
+                more = True
+                break
+            scanned += 1
+            read_bytes += self._sizes.get(key, 0)
+            last = (key, item)
+            try:
+                if node is not None and not evaluate(node, item, ctx):
+                    continue
+            except ExpressionError as e:
+                raise _validation(str(e), operation)
+            count += 1
+            if select != 'COUNT':
+                out = project(item, paths, ctx) if paths else _clone(item)
+                returned_bytes += item_size(out) if paths else self._sizes.get(key, 0)
+                items.append(out)
+
+        resp = {'Count': count, 'ScannedCount': scanned,
+                'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if select != 'COUNT':
+            resp['Items'] = items
+        if more and last is not None:
+            resp['LastEvaluatedKey'] = self._key_attrs(last[0], last[1], index)
+        self._faults.after('dynamodb', operation, returned_bytes)
+        return resp
+
+    def scan(self, **kwargs):
+        self._faults.before('dynamodb', 'Scan')
+        if kwargs.get('IndexName'):
+            raise _validation("Scanning a secondary index is not supported by the fake", 'Scan')
+        segment, total = kwargs.get('Segment'), kwargs.get('TotalSegments')
+        if (segment is None) != (total is None) or (total is not None and not 0 <= segment < total):
+            raise _validation("Segment and TotalSegments must be provided together", 'Scan')
+        order_keys, keys = self._scan_order()
+        start = 0
+        if kwargs.get('ExclusiveStartKey'):
+            start_key = self._key_from(to_dynamo(kwargs['ExclusiveStartKey']), 'Scan')
+            start = bisect.bisect_right(order_keys, _order_key(start_key))
+        candidates = keys[start:] if start else keys
+        if total is not None:
+            candidates = (k for k in candidates if _segment_of(k, total) == segment)
+        return self._page('Scan', candidates, kwargs)
+
+    def query(self, **kwargs):
+        self._faults.before('dynamodb', 'Query')
+        index = kwargs.get('IndexName')
+        part_attr, sort_attr = self._schema(index)
+        node, ctx = _expression(kwargs, 'KeyConditionExpression', 'Query', is_key_condition=True)
+        if node is None:
+            raise _validation("KeyConditionExpression is required", 'Query')
+        part_value = self._partition_value(node, ctx, part_attr)
+
+        with self._lock:
+            keys = list(self._partitions[index].get(part_value, ()))
+        if sort_attr:
+            keys.sort(key=lambda k: (self._items[k][sort_attr], repr(k)) if k in self._items else (0, ''))
+        forward = kwargs.get('ScanIndexForward', True)
+        if not forward:
+            keys.reverse()
+
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            start = to_dynamo(start)
+            start_key = self._key_from(start, 'Query')
+            if sort_attr:
+                marker = (start[sort_attr], repr(start_key))
+                position = lambda k: (self._items[k][sort_attr], repr(k))  # noqa: E731
+                keys = [k for k in keys if k in self._items
+                        and (position(k) > marker if forward else position(k) < marker)]
+            else:
+                keys = [k for k in keys if k != start_key]
+
+        key_filter = (k for k in keys if k in self._items and evaluate(node, self._items[k], ctx))
+        return self._page('Query', key_filter, kwargs, index)
+
+    @staticmethod
+    def _partition_value(node, ctx, part_attr):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current[0] == 'and':
+                stack.extend((current[1], current[2]))
+            elif current[0] == 'cmp' and current[1] == '=':
+                left, right = current[2], current[3]
+                if left[0] == 'value':
+                    left, right = right, left
+                if left[0] == 'path' and right[0] == 'value' and ctx.segments(left) == [part_attr]:
+                    return ctx.value(right[1])
+        raise _validation("Query condition missed key schema element: " + part_attr, 'Query')
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return BatchWriter(self._resource, self.name, overwrite_by_pkeys=overwrite_by_pkeys)
+
+    # Resource-style no-ops so code that calls them keeps working
+    def load(self):
+        return None
+
+    reload = load
+
+    def wait_until_exists(self):
+        return None
+
+
+class _UnknownTable:
+    """Handle for a table that was never created; every call fails like the service."""
+
+    def __init__(self, resource, name):
+        self._resource = resource
+        self.name = self.table_name = name
+
+    def __getattr__(self, attr):
+        def missing(*args, **kwargs):
+            self._resource.faults.before('dynamodb', attr)
+            raise client_error('ResourceNotFoundException',
+                               f'Requested resource not found: Table: {self.name} not found', attr)
+        return missing
+
+
+class BatchWriter:
+    """Buffers puts and deletes into BatchWriteItem calls like boto3's batch_writer.
+
+    Unprocessed items returned by a batch are put back on the buffer and sent
+    again with the next batch.
+    """
+
+    def __init__(self, resource, table_name, flush_amount=MAX_BATCH_WRITE, overwrite_by_pkeys=None):
+        self._resource = resource
+        self._table_name = table_name
+        self._flush_amount = flush_amount
+        self._overwrite_by_pkeys = overwrite_by_pkeys
+        self._buffer = []
+
+    def _add(self, request):
+        if self._overwrite_by_pkeys:
+            body = request.get('PutRequest', {}).get('Item') or request['DeleteRequest']['Key']
+            ident = tuple(body.get(k) for k in self._overwrite_by_pkeys)
+            self._buffer = [r for r in self._buffer if tuple(
+                (r.get('PutRequest', {}).get('Item') or r['DeleteRequest']['Key']).get(k)
+                for k in self._overwrite_by_pkeys) != ident]
+        self._buffer.append(request)
+        if len(self._buffer) >= self._flush_amount:
+            self._flush()
+
+    def put_item(self, Item):
+        self._add({'PutRequest': {'Item': Item}})
+
+    def delete_item(self, Key):
+        self._add({'DeleteRequest': {'Key': Key}})
+
+    def _flush(self):
+        batch, self._buffer = self._buffer[:self._flush_amount], self._buffer[self._flush_amount:]
+        resp = self._resource.batch_write_item(RequestItems={self._table_name: batch})
+        self._buffer.extend(resp.get('UnprocessedItems', {}).get(self._table_name, []))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        while self._buffer:
+            self._flush()
+
+
+class FakeDynamoDB:
+    """Stand-in for ``boto3.resource('dynamodb')``.
+
+    Tables must be created first with ``create_table``; ``Table`` on an unknown
+    name returns a handle whose calls raise ResourceNotFoundException.
+    """
+
+    def __init__(self, faults: FaultInjector = None):
+        self.faults = faults or FaultInjector()
+        self.tables = {}
+
+    def create_table(self, name: str, partition_key: str, sort_key: str = None,
+                     indexes: dict = None) -> FakeTable:
+        """Create a table; ``indexes`` maps index names to (partition, sort) attributes."""
+        table = FakeTable(self, name, partition_key, sort_key, indexes)
+        self.tables[name] = table
+        return table
+
+    def Table(self, name):  # noqa: N802 - mirrors the boto3 resource API
+        return self.tables.get(name) or _UnknownTable(self, name)
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.faults.before('dynamodb', 'BatchWriteItem', throttle=False)
+        total = sum(len(reqs) for reqs in RequestItems.values())
+        if total == 0 or total > MAX_BATCH_WRITE:
+            raise _validation("Too many items requested for the BatchWriteItem call", 'BatchWriteItem')
+        unprocessed = {}
+        written = 0
+        applied = 0
+        for name, requests in RequestItems.items():
+            table = self.tables.get(name)
+            if table is None:
+                raise client_error('ResourceNotFoundException',
+                                   f'Requested resource not found: Table: {name} not found', 'BatchWriteItem')
+            for request in requests:
+                if self.faults.should_throttle('dynamodb', 'BatchWriteItem'):
+                    unprocessed.setdefault(name, []).append(request)
+                    continue
+                with table._lock:
+                    if 'PutRequest' in request:
+                        item = to_dynamo(request['PutRequest']['Item'])
+                        key = table._key_from(item, 'BatchWriteItem')
+                        table._store(key, item)
+                        written += table._sizes[key]
+                    else:
+                        key = table._key_from(to_dynamo(request['DeleteRequest']['Key']),
+                                              'BatchWriteItem', exact=True)
+                        if key in table._items:
+                            table._store(key, None)
+                applied += 1
+        if applied == 0:
+            raise client_error('ProvisionedThroughputExceededException',
+                               'Rate exceeded (injected)', 'BatchWriteItem')
+        self.faults.after('dynamodb', 'BatchWriteItem', written)
+        return {'UnprocessedItems': unprocessed, 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.faults.before('dynamodb', 'BatchGetItem', throttle=False)
+        total = sum(len(spec.get('Keys', [])) for spec in RequestItems.values())
+        if total == 0 or total > MAX_BATCH_GET:
+            raise _validation("Too many items requested for the BatchGetItem call", 'BatchGetItem')
+        responses, unprocessed = {}, {}
+        read = 0
+        for name, spec in RequestItems.items():
+            table = self.tables.get(name)
+            if table is None:
+                raise client_error('ResourceNotFoundException',
+                                   f'Requested resource not found: Table: {name} not found', 'BatchGetItem')
+            _, ctx = _expression(spec, None, 'BatchGetItem')
+            paths = _projection(spec, ctx, 'BatchGetItem')
+            found = responses.setdefault(name, [])
+            for key_attrs in spec['Keys']:
+                if self.faults.should_throttle('dynamodb', 'BatchGetItem'):
+                    pending = unprocessed.setdefault(name, {k: v for k, v in spec.items() if k != 'Keys'})
+                    pending.setdefault('Keys', []).append(key_attrs)
+                    continue
+                item = table._items.get(table._key_from(to_dynamo(key_attrs), 'BatchGetItem', exact=True))
+                if item is not None:
+                    out = project(item, paths, ctx) if paths else _clone(item)
+                    read += item_size(out)
+                    found.append(out)
+        self.faults.after('dynamodb', 'BatchGetItem', read)
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed,
+                'ResponseMetadata': {'HTTPStatusCode': 200}}
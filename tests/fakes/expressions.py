@@ -0,0 +1,467 @@
+"""DynamoDB expression language: condition, key condition, projection and update.
+
+Expressions are parsed into small tuple ASTs and cached by their source text,
+since the application reuses the same handful of expression strings.
+"""
+import functools
+import re
+from decimal import Decimal
+
+MISSING = object()
+
+
+class ExpressionError(ValueError):
+    """Raised for malformed expressions; surfaced as a ValidationException."""
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<op><>|<=|>=|=|<|>|\(|\)|,|\.|\[|\]|\+|-)
+    | (?P<value>:[A-Za-z0-9_]+)
+    | (?P<name>\#[A-Za-z0-9_]+)
+    | (?P<number>\d+)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE'}
+_CONDITION_FUNCTIONS = {'attribute_exists', 'attribute_not_exists', 'attribute_type',
+                        'begins_with', 'contains'}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise ExpressionError(f"Invalid expression near: {text[pos:pos + 20]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'word' and value.upper() in _KEYWORDS:
+            tokens.append(('kw', value.upper()))
+        else:
+            tokens.append((kind, value))
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def take(self, kind=None, value=None):
+        tok = self.tokens[self.pos]
+        if (kind and tok[0] != kind) or (value and tok[1] != value):
+            raise ExpressionError(f"Expected {value or kind}, got {tok[1]!r}")
+        self.pos += 1
+        return tok
+
+    def accept(self, kind, value=None):
+        tok = self.tokens[self.pos]
+        if tok[0] == kind and (value is None or tok[1] == value):
+            self.pos += 1
+            return tok
+        return None
+
+    def done(self):
+        if self.peek()[0] != 'end':
+            raise ExpressionError(f"Unexpected token {self.peek()[1]!r}")
+
+    # -- paths and operands -------------------------------------------------
+
+    def path(self):
+        tok = self.take()
+        if tok[0] not in ('word', 'name'):
+            raise ExpressionError(f"Expected attribute name, got {tok[1]!r}")
+        segments = [tok[1]]
+        while True:
+            if self.accept('op', '.'):
+                tok = self.take()
+                if tok[0] not in ('word', 'name'):
+                    raise ExpressionError("Expected attribute name after '.'")
+                segments.append(tok[1])
+            elif self.accept('op', '['):
+                segments.append(int(self.take('number')[1]))
+                self.take('op', ']')
+            else:
+                return ('path', tuple(segments))
+
+    def operand(self):
+        tok = self.peek()
+        if tok[0] == 'value':
+            self.pos += 1
+            return ('value', tok[1])
+        if tok[0] == 'word' and tok[1] == 'size' and self.peek(1) == ('op', '('):
+            self.pos += 2
+            path = self.path()
+            self.take('op', ')')
+            return ('size', path)
+        return self.path()
+
+    # -- conditions ---------------------------------------------------------
+
+    def condition(self):
+        node = self.conjunction()
+        while self.accept('kw', 'OR'):
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept('kw', 'AND'):
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept('kw', 'NOT'):
+            return ('not', self.negation())
+        return self.primary()
+
+    def primary(self):
+        if self.accept('op', '('):
+            node = self.condition()
+            self.take('op', ')')
+            return node
+        tok = self.peek()
+        if tok[0] == 'word' and tok[1] in _CONDITION_FUNCTIONS and self.peek(1) == ('op', '('):
+            self.pos += 2
+            args = [self.operand()]
+            while self.accept('op', ','):
+                args.append(self.operand())
+            self.take('op', ')')
+            return ('func', tok[1], tuple(args))
+        left = self.operand()
+        if self.accept('kw', 'BETWEEN'):
+            low = self.operand()
+            self.take('kw', 'AND')
+            return ('between', left, low, self.operand())
+        if self.accept('kw', 'IN'):
+            self.take('op', '(')
+            options = [self.operand()]
+            while self.accept('op', ','):
+                options.append(self.operand())
+            self.take('op', ')')
+            return ('in', left, tuple(options))
+        tok = self.take('op')
+        if tok[1] not in ('=', '<>', '<', '<=', '>', '>='):
+            raise ExpressionError(f"Expected comparator, got {tok[1]!r}")
+        return ('cmp', tok[1], left, self.operand())
+
+    # -- updates ------------------------------------------------------------
+
+    def update_value(self):
+        tok = self.peek()
+        if tok[0] == 'word' and tok[1] in ('if_not_exists', 'list_append') and self.peek(1) == ('op', '('):
+            self.pos += 2
+            first = self.path() if tok[1] == 'if_not_exists' else self.update_value()
+            self.take('op', ',')
+            second = self.update_value()
+            self.take('op', ')')
+            return (tok[1], first, second)
+        return self.operand()
+
+    def update(self):
+        actions = []
+        while self.peek()[0] != 'end':
+            clause = self.take('kw')[1]
+            if clause not in ('SET', 'REMOVE', 'ADD', 'DELETE'):
+                raise ExpressionError(f"Unexpected keyword {clause}")
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.take('op', '=')
+                    value = self.update_value()
+                    op = self.accept('op', '+') or self.accept('op', '-')
+                    if op:
+                        value = ('arith', op[1], value, self.update_value())
+                    actions.append(('SET', path, value))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if not self.accept('op', ','):
+                    break
+        if not actions:
+            raise ExpressionError("Empty update expression")
+        return actions
+
+
+@functools.lru_cache(maxsize=512)
+def parse_condition(text):
+    parser = _Parser(text)
+    node = parser.condition()
+    parser.done()
+    return node
+
+
+@functools.lru_cache(maxsize=512)
+def parse_update(text):
+    parser = _Parser(text)
+    return tuple(parser.update())
+
+
+@functools.lru_cache(maxsize=512)
+def parse_projection(text):
+    parser = _Parser(text)
+    paths = [parser.path()]
+    while parser.accept('op', ','):
+        paths.append(parser.path())
+    parser.done()
+    return tuple(paths)
+
+
+class Context:
+    """Resolves #name and :value placeholders for one request."""
+
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = values or {}
+
+    def segments(self, path):
+        out = []
+        for seg in path[1]:
+            if isinstance(seg, str) and seg.startswith('#'):
+                if seg not in self.names:
+                    raise ExpressionError(f"Undefined attribute name placeholder {seg}")
+                seg = self.names[seg]
+            out.append(seg)
+        return out
+
+    def value(self, placeholder):
+        if placeholder not in self.values:
+            raise ExpressionError(f"Undefined attribute value placeholder {placeholder}")
+        return self.values[placeholder]
+
+
+def get_path(item, segments):
+    current = item
+    for seg in segments:
+        if isinstance(seg, int):
+            if not isinstance(current, list) or seg >= len(current):
+                return MISSING
+            current = current[seg]
+        else:
+            if not isinstance(current, dict) or seg not in current:
+                return MISSING
+            current = current[seg]
+    return current
+
+
+def _operand(node, item, ctx):
+    kind = node[0]
+    if kind == 'value':
+        return ctx.value(node[1])
+    if kind == 'path':
+        return get_path(item, ctx.segments(node))
+    if kind == 'size':
+        value = _operand(node[1], item, ctx)
+        if value is MISSING or isinstance(value, (Decimal, bool)) or value is None:
+            return MISSING
+        return Decimal(len(value))
+    raise ExpressionError(f"Unsupported operand {kind}")
+
+
+def _comparable(a, b):
+    if a is MISSING or b is MISSING:
+        return False
+    if isinstance(a, Decimal) and isinstance(b, Decimal):
+        return True
+    return type(a) is type(b) and isinstance(a, (str, bytes))
+
+
+def _type_name(value):
+    if isinstance(value, bool):
+        return 'BOOL'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, Decimal):
+        return 'N'
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, bytes):
+        return 'B'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, (set, frozenset)):
+        first = next(iter(value), '')
+        return {str: 'SS', bytes: 'BS'}.get(type(first), 'NS')
+    return '?'
+
+
+def evaluate(node, item, ctx):
+    """Evaluate a parsed condition against an item."""
+    kind = node[0]
+    if kind == 'and':
+        return evaluate(node[1], item, ctx) and evaluate(node[2], item, ctx)
+    if kind == 'or':
+        return evaluate(node[1], item, ctx) or evaluate(node[2], item, ctx)
+    if kind == 'not':
+        return not evaluate(node[1], item, ctx)
+    if kind == 'cmp':
+        op = node[1]
+        a, b = _operand(node[2], item, ctx), _operand(node[3], item, ctx)
+        if op == '=':
+            return a is not MISSING and a == b
+        if op == '<>':
+            return a != b
+        if not _comparable(a, b):
+            return False
+        return {'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b}[op]
+    if kind == 'between':
+        a = _operand(node[1], item, ctx)
+        low, high = _operand(node[2], item, ctx), _operand(node[3], item, ctx)
+        return _comparable(a, low) and _comparable(a, high) and low <= a <= high
+    if kind == 'in':
+        a = _operand(node[1], item, ctx)
+        return a is not MISSING and any(a == _operand(o, item, ctx) for o in node[2])
+    if kind == 'func':
+        name, args = node[1], node[2]
+        first = _operand(args[0], item, ctx)
+        if name == 'attribute_exists':
+            return first is not MISSING
+        if name == 'attribute_not_exists':
+            return first is MISSING
+        second = _operand(args[1], item, ctx)
+        if name == 'attribute_type':
+            return first is not MISSING and _type_name(first) == second
+        if name == 'begins_with':
+            return (isinstance(first, (str, bytes)) and type(first) is type(second)
+                    and first.startswith(second))
+        if name == 'contains':
+            if isinstance(first, str) and isinstance(second, str):
+                return second in first
+            if isinstance(first, (list, set, frozenset)):
+                return second in first
+            return False
+    raise ExpressionError(f"Unsupported condition {kind}")
+
+
+def _update_value(node, item, ctx):
+    kind = node[0]
+    if kind == 'if_not_exists':
+        existing = get_path(item, ctx.segments(node[1]))
+        return existing if existing is not MISSING else _update_value(node[2], item, ctx)
+    if kind == 'list_append':
+        a, b = _update_value(node[1], item, ctx), _update_value(node[2], item, ctx)
+        if not isinstance(a, list) or not isinstance(b, list):
+            raise ExpressionError("list_append operands must be lists")
+        return a + b
+    if kind == 'arith':
+        a, b = _update_value(node[2], item, ctx), _update_value(node[3], item, ctx)
+        if not isinstance(a, Decimal) or not isinstance(b, Decimal):
+            raise ExpressionError("An operand in the update expression has an incorrect data type")
+        return a + b if node[1] == '+' else a - b
+    value = _operand(node, item, ctx)
+    if value is MISSING:
+        raise ExpressionError("The provided expression refers to an attribute that does not exist in the item")
+    return value
+
+
+def _parent(item, segments, create=False):
+    current = item
+    for seg in segments[:-1]:
+        nxt = current[seg] if (isinstance(current, list) and isinstance(seg, int) and seg < len(current)) \
+            else (current.get(seg, MISSING) if isinstance(current, dict) else MISSING)
+        if nxt is MISSING:
+            raise ExpressionError("The document path provided in the update expression is invalid for update")
+        current = nxt
+    return current
+
+
+def _assign(item, segments, value):
+    parent = _parent(item, segments)
+    last = segments[-1]
+    if isinstance(last, int):
+        if not isinstance(parent, list):
+            raise ExpressionError("The document path provided in the update expression is invalid for update")
+        if last >= len(parent):
+            parent.append(value)
+        else:
+            parent[last] = value
+    else:
+        if not isinstance(parent, dict):
+            raise ExpressionError("The document path provided in the update expression is invalid for update")
+        parent[last] = value
+
+
+def _remove(item, segments):
+    try:
+        parent = _parent(item, segments)
+    except ExpressionError:
+        return
+    last = segments[-1]
+    if isinstance(parent, dict):
+        parent.pop(last, None)
+    elif isinstance(parent, list) and isinstance(last, int) and last < len(parent):
+        del parent[last]
+
+
+def apply_update(actions, item, ctx):
+    """Apply parsed update actions to ``item`` in place; returns touched top-level names."""
+    # All values are computed against the item as it was before the update
+    before = item
+    item_view = dict(item)
+    touched = set()
+    for clause, path, value_node in actions:
+        segments = ctx.segments(path)
+        touched.add(segments[0])
+        if clause == 'SET':
+            _assign(before, segments, _update_value(value_node, item_view, ctx))
+        elif clause == 'REMOVE':
+            _remove(before, segments)
+        elif clause == 'ADD':
+            delta = _operand(value_node, item_view, ctx)
+            current = get_path(before, segments)
+            if isinstance(delta, Decimal):
+                if current is MISSING:
+                    current = Decimal(0)
+                if not isinstance(current, Decimal):
+                    raise ExpressionError("An operand in the update expression has an incorrect data type")
+                _assign(before, segments, current + delta)
+            elif isinstance(delta, (set, frozenset)):
+                current = set() if current is MISSING else set(current)
+                _assign(before, segments, current | set(delta))
+            else:
+                raise ExpressionError("ADD supports only numbers and sets")
+        elif clause == 'DELETE':
+            delta = _operand(value_node, item_view, ctx)
+            current = get_path(before, segments)
+            if current is not MISSING:
+                remaining = set(current) - set(delta)
+                if remaining:
+                    _assign(before, segments, remaining)
+                else:
+                    _remove(before, segments)
+    return touched
+
+
+def project(item, paths, ctx):
+    """Return a copy of ``item`` containing only the projected paths."""
+    out = {}
+    for path in paths:
+        segments = ctx.segments(path)
+        value = get_path(item, segments)
+        if value is MISSING:
+            continue
+        target = out
+        source = item
+        for seg in segments[:-1]:
+            source = source[seg]
+            if isinstance(seg, int):
+                # Projected list elements are collapsed into a list in order
+                target = target.setdefault('__list__', [])
+                break
+            target = target.setdefault(seg, {} if isinstance(source, dict) else [])
+        if isinstance(target, dict):
+            target[segments[-1]] = value
+        else:
+            target.append(value)
+    return out
@@ -0,0 +1,151 @@
+"""Latency and throttling injection shared by the fake services."""
+import random
+import threading
+import time
+from collections import Counter
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - botocore ships with boto3
+    class ClientError(Exception):
+        """Minimal stand-in exposing the same ``response`` shape as botocore's."""
+
+        def __init__(self, error_response, operation_name):
+            self.response = error_response
+            self.operation_name = operation_name
+            error = error_response.get('Error', {})
+            super().__init__(f"An error occurred ({error.get('Code')}) when calling "
+                             f"the {operation_name} operation: {error.get('Message')}")
+
+# Error code each service returns when it throttles a request
+THROTTLE_CODES = {
+    'dynamodb': 'ProvisionedThroughputExceededException',
+    's3': 'SlowDown',
+    'bedrock': 'ThrottlingException',
+    'sqs': 'ThrottlingException',
+}
+
+
+def client_error(code: str, message: str, operation: str, status: int = 400) -> ClientError:
+    """Build a ClientError the way botocore would for a failed call."""
+    return ClientError({'Error': {'Code': code, 'Message': message},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+
+class FaultConfig:
+    """Latency and throttling settings for one service.
+
+    ``latency_ms`` is added to every call, plus up to ``jitter_ms`` of uniform
+    noise and ``per_kb_ms`` for each KB the call reads or writes.
+    ``throttle_rate`` is the probability a call is rejected with the service's
+    throttling error; ``throttle_first`` rejects that many calls outright
+    before any succeed, which makes retry paths deterministic to test.
+    ``operations`` limits the faults to the named operations.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, per_kb_ms: float = 0.0,
+                 throttle_rate: float = 0.0, throttle_first: int = 0, operations=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_kb_ms = per_kb_ms
+        self.throttle_rate = throttle_rate
+        self.throttle_first = throttle_first
+        self.operations = set(operations) if operations else None
+
+    def applies_to(self, operation: str) -> bool:
+        return self.operations is None or operation in self.operations
+
+
+class FaultInjector:
+    """Applies FaultConfig per service and keeps per-operation call statistics.
+
+    ``calls`` counts requests as ``"<service>.<Operation>"``; ``throttles``
+    counts rejected requests the same way; ``bytes`` accumulates payload sizes
+    per service and ``simulated_ms`` the latency that was injected.
+    Pass ``sleep=None`` to account for latency without actually waiting.
+    """
+
+    def __init__(self, seed: int = 0, sleep=time.sleep):
+        self._configs = {}
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.bytes = Counter()
+        self.simulated_ms = Counter()
+
+    def configure(self, service: str, config: FaultConfig = None, **settings) -> FaultConfig:
+        """Set the faults for ``service``; keyword settings build a FaultConfig."""
+        config = config or FaultConfig(**settings)
+        with self._lock:
+            self._configs[service] = config
+        return config
+
+    def clear(self, service: str = None):
+        with self._lock:
+            if service:
+                self._configs.pop(service, None)
+            else:
+                self._configs.clear()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.throttles.clear()
+            self.bytes.clear()
+            self.simulated_ms.clear()
+
+    def should_throttle(self, service: str, operation: str) -> bool:
+        """Decide (and record) whether this call is throttled, without raising."""
+        config = self._configs.get(service)
+        if config is None or not config.applies_to(operation):
+            return False
+        with self._lock:
+            if config.throttle_first > 0:
+                config.throttle_first -= 1
+                throttled = True
+            else:
+                throttled = config.throttle_rate > 0 and self._random.random() < config.throttle_rate
+            if throttled:
+                self.throttles[f"{service}.{operation}"] += 1
+        return throttled
+
+    def before(self, service: str, operation: str, throttle: bool = True):
+        """Count the call and raise the service's throttling error when configured.
+
+        Batch operations pass ``throttle=False`` and throttle per item instead.
+        """
+        with self._lock:
+            self.calls[f"{service}.{operation}"] += 1
+        if throttle and self.should_throttle(service, operation):
+            raise client_error(THROTTLE_CODES.get(service, 'ThrottlingException'),
+                               'Rate exceeded (injected)', operation)
+
+    def after(self, service: str, operation: str, nbytes: int = 0):
+        """Record payload size and apply the configured latency."""
+        config = self._configs.get(service)
+        with self._lock:
+            self.bytes[service] += nbytes
+        if config is None or not config.applies_to(operation):
+            return
+        delay = config.latency_ms + config.per_kb_ms * nbytes / 1024.0
+        if config.jitter_ms:
+            with self._lock:
+                delay += self._random.uniform(0, config.jitter_ms)
+        if delay <= 0:
+            return
+        with self._lock:
+            self.simulated_ms[f"{service}.{operation}"] += delay
+        if self._sleep is not None:
+            self._sleep(delay / 1000.0)
+
+    def stats(self) -> dict:
+        """Snapshot of the counters, suitable for JSON reports."""
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'throttles': dict(self.throttles),
+                'bytes': dict(self.bytes),
+                'simulatedMs': {k: round(v, 3) for k, v in self.simulated_ms.items()},
+            }
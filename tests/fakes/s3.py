@@ -0,0 +1,249 @@
+"""In-memory S3 client covering the object calls the application makes."""
+import hashlib
+import io
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from .faults import FaultInjector, client_error
+
+MAX_KEYS = 1000
+# Every part of a multipart upload except the last must be at least this big
+MIN_PART_BYTES = 5 * 1024 * 1024
+
+
+class StreamingBody:
+    """The subset of botocore's StreamingBody the code reads from."""
+
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        for line in io.BytesIO(self._stream.read()).readlines():
+            yield line if keepends else line.rstrip(b'\r\n')
+
+    def close(self):
+        self._stream.close()
+
+
+def _as_bytes(body) -> bytes:
+    if body is None:
+        return b''
+    if isinstance(body, str):
+        return body.encode('utf-8')
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body)
+    return body.read()
+
+
+class _Object:
+    __slots__ = ('data', 'etag', 'last_modified', 'content_type', 'content_encoding', 'metadata')
+
+    def __init__(self, data, etag, content_type=None, content_encoding=None, metadata=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = datetime.now(timezone.utc)
+        self.content_type = content_type or 'binary/octet-stream'
+        self.content_encoding = content_encoding
+        self.metadata = metadata or {}
+
+
+class FakeS3:
+    """Stand-in for ``boto3.client('s3')``.
+
+    Buckets are created on first write unless ``strict_buckets`` is set, in
+    which case they must be created with ``create_bucket`` first.
+    """
+
+    def __init__(self, faults: FaultInjector = None, strict_buckets: bool = False):
+        self.faults = faults or FaultInjector()
+        self.strict_buckets = strict_buckets
+        self.buckets = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name, operation, create=False):
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            if create and not self.strict_buckets:
+                with self._lock:
+                    bucket = self.buckets.setdefault(name, {})
+            else:
+                raise client_error('NoSuchBucket', 'The specified bucket does not exist', operation, 404)
+        return bucket
+
+    def create_bucket(self, Bucket, **kwargs):
+        self.faults.before('s3', 'CreateBucket')
+        with self._lock:
+            self.buckets.setdefault(Bucket, {})
+        return {'Location': f'/{Bucket}'}
+
+    def put_object(self, Bucket, Key, Body=None, ContentType=None, ContentEncoding=None,
+                   Metadata=None, **kwargs):
+        self.faults.before('s3', 'PutObject')
+        data = _as_bytes(Body)
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        bucket = self._bucket(Bucket, 'PutObject', create=True)
+        bucket[Key] = _Object(data, etag, ContentType, ContentEncoding, Metadata)
+        self.faults.after('s3', 'PutObject', len(data))
+        return {'ETag': etag, 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def _get(self, Bucket, Key, operation):
+        obj = self._bucket(Bucket, operation).get(Key)
+        if obj is None:
+            code = 'NoSuchKey' if operation == 'GetObject' else '404'
+            raise client_error(code, 'The specified key does not exist.', operation, 404)
+        return obj
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self.faults.before('s3', 'GetObject')
+        obj = self._get(Bucket, Key, 'GetObject')
+        data = obj.data
+        if Range:
+            # Only the "bytes=start-end" form is needed
+            start, _, end = Range.replace('bytes=', '').partition('-')
+            data = data[int(start):int(end) + 1 if end else None]
+        self.faults.after('s3', 'GetObject', len(data))
+        resp = {'Body': StreamingBody(data), 'ContentLength': len(data), 'ETag': obj.etag,
+                'LastModified': obj.last_modified, 'ContentType': obj.content_type,
+                'Metadata': dict(obj.metadata), 'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if obj.content_encoding:
+            resp['ContentEncoding'] = obj.content_encoding
+        return resp
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.faults.before('s3', 'HeadObject')
+        obj = self._get(Bucket, Key, 'HeadObject')
+        self.faults.after('s3', 'HeadObject')
+        return {'ContentLength': len(obj.data), 'ETag': obj.etag, 'LastModified': obj.last_modified,
+                'ContentType': obj.content_type, 'Metadata': dict(obj.metadata)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.faults.before('s3', 'DeleteObject')
+        self._bucket(Bucket, 'DeleteObject').pop(Key, None)
+        self.faults.after('s3', 'DeleteObject')
+        return {'ResponseMetadata': {'HTTPStatusCode': 204}}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=MAX_KEYS, ContinuationToken=None,
+                        StartAfter=None, Delimiter=None, **kwargs):
+        self.faults.before('s3', 'ListObjectsV2')
+        bucket = self._bucket(Bucket, 'ListObjectsV2')
+        max_keys = min(int(MaxKeys), MAX_KEYS)
+        after = ContinuationToken or StartAfter or ''
+        keys = sorted(k for k in list(bucket) if k.startswith(Prefix or '') and k > after)
+
+        contents, prefixes = [], []
+        last = None
+        truncated = False
+        for key in keys:
+            if Delimiter:
+                rest = key[len(Prefix or ''):]
+                if Delimiter in rest:
+                    common = (Prefix or '') + rest.split(Delimiter, 1)[0] + Delimiter
+                    if prefixes and prefixes[-1] == common:
+                        continue
+                    if len(contents) + len(prefixes) >= max_keys:
+                        truncated = True
+                        break
+                    prefixes.append(common)
+                    # Resume after every key under this prefix
+                    last = common + '\uffff'
+                    continue
+            if len(contents) + len(prefixes) >= max_keys:
+                truncated = True
+                break
+            obj = bucket.get(key)
+            if obj is None:
+                continue
+            contents.append({'Key': key, 'Size': len(obj.data), 'ETag': obj.etag,
+                             'LastModified': obj.last_modified, 'StorageClass': 'STANDARD'})
+            last = key
+
+        resp = {'IsTruncated': truncated, 'KeyCount': len(contents) + len(prefixes),
+                'MaxKeys': max_keys, 'Prefix': Prefix or '', 'Name': Bucket,
+                'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if contents:
+            resp['Contents'] = contents
+        if prefixes:
+            resp['CommonPrefixes'] = [{'Prefix': p} for p in prefixes]
+        if truncated:
+            resp['NextContinuationToken'] = last
+        self.faults.after('s3', 'ListObjectsV2', sum(len(c['Key']) for c in contents))
+        return resp
+
+    # -- multipart upload -----------------------------------------------------
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, ContentEncoding=None, **kwargs):
+        self.faults.before('s3', 'CreateMultipartUpload')
+        self._bucket(Bucket, 'CreateMultipartUpload', create=True)
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {'Bucket': Bucket, 'Key': Key, 'parts': {},
+                                        'ContentType': ContentType, 'ContentEncoding': ContentEncoding}
+        self.faults.after('s3', 'CreateMultipartUpload')
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def _upload(self, upload_id, operation):
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise client_error('NoSuchUpload', 'The specified upload does not exist.', operation, 404)
+        return upload
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body, **kwargs):
+        self.faults.before('s3', 'UploadPart')
+        upload = self._upload(UploadId, 'UploadPart')
+        data = _as_bytes(Body)
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        upload['parts'][int(PartNumber)] = (data, etag)
+        self.faults.after('s3', 'UploadPart', len(data))
+        return {'ETag': etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.faults.before('s3', 'CompleteMultipartUpload')
+        upload = self._upload(UploadId, 'CompleteMultipartUpload')
+        requested = MultipartUpload.get('Parts', [])
+        numbers = [p['PartNumber'] for p in requested]
+        if not requested or numbers != sorted(numbers):
+            raise client_error('InvalidPartOrder', 'The list of parts was not in ascending order.',
+                               'CompleteMultipartUpload')
+        chunks = []
+        for i, part in enumerate(requested):
+            stored = upload['parts'].get(part['PartNumber'])
+            if stored is None or stored[1] != part['ETag']:
+                raise client_error('InvalidPart', 'One or more of the specified parts could not be found.',
+                                   'CompleteMultipartUpload')
+            if i < len(requested) - 1 and len(stored[0]) < MIN_PART_BYTES:
+                raise client_error('EntityTooSmall',
+                                   'Your proposed upload is smaller than the minimum allowed object size.',
+                                   'CompleteMultipartUpload')
+            chunks.append(stored[0])
+        data = b''.join(chunks)
+        etag = '"%s-%d"' % (hashlib.md5(b''.join(
+            bytes.fromhex(upload['parts'][n][1].strip('"')) for n in numbers)).hexdigest(), len(numbers))
+        self._bucket(Bucket, 'CompleteMultipartUpload')[Key] = _Object(
+            data, etag, upload['ContentType'], upload['ContentEncoding'])
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        self.faults.after('s3', 'CompleteMultipartUpload')
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.faults.before('s3', 'AbortMultipartUpload')
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        self.faults.after('s3', 'AbortMultipartUpload')
+        return {'ResponseMetadata': {'HTTPStatusCode': 204}}
+
+    @property
+    def open_uploads(self) -> int:
+        return len(self._uploads)
@@ -0,0 +1,51 @@
+"""Minimal in-memory SQS client for the ingest fan-out path."""
+import threading
+import uuid
+from collections import defaultdict
+
+from .faults import FaultInjector, client_error
+
+MAX_BATCH = 10
+
+
+class FakeSQS:
+    """Stand-in for ``boto3.client('sqs')``; queues are keyed by URL."""
+
+    def __init__(self, faults: FaultInjector = None):
+        self.faults = faults or FaultInjector()
+        self.queues = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        self.faults.before('sqs', 'SendMessageBatch')
+        if not Entries or len(Entries) > MAX_BATCH:
+            raise client_error('AWS.SimpleQueueService.TooManyEntriesInBatchRequest',
+                               'Maximum number of entries per request are 10.', 'SendMessageBatch')
+        successful = []
+        with self._lock:
+            for entry in Entries:
+                message_id = str(uuid.uuid4())
+                self.queues[QueueUrl].append({'MessageId': message_id, 'Body': entry['MessageBody'],
+                                              'ReceiptHandle': message_id})
+                successful.append({'Id': entry['Id'], 'MessageId': message_id})
+        self.faults.after('sqs', 'SendMessageBatch', sum(len(e['MessageBody']) for e in Entries))
+        return {'Successful': successful, 'Failed': []}
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        resp = self.send_message_batch(QueueUrl, [{'Id': '0', 'MessageBody': MessageBody}])
+        return {'MessageId': resp['Successful'][0]['MessageId']}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, **kwargs):
+        self.faults.before('sqs', 'ReceiveMessage')
+        with self._lock:
+            queue = self.queues[QueueUrl]
+            messages, queue[:] = queue[:MaxNumberOfMessages], queue[MaxNumberOfMessages:]
+        self.faults.after('sqs', 'ReceiveMessage')
+        return {'Messages': messages} if messages else {}
+
+    def as_lambda_event(self, queue_url: str, max_messages: int = MAX_BATCH) -> dict:
+        """Drain up to ``max_messages`` into the event shape an SQS trigger delivers."""
+        messages = self.receive_message(queue_url, MaxNumberOfMessages=max_messages).get('Messages', [])
+        return {'Records': [{'messageId': m['MessageId'], 'body': m['Body'],
+                             'receiptHandle': m['ReceiptHandle'], 'eventSource': 'aws:sqs'}
+                            for m in messages]}
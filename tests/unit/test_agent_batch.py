@@ -0,0 +1,52 @@
+import json
+import threading
+
+import agent
+import tools
+
+
+def _invoke(body):
+    resp = agent.lambda_handler({"httpMethod": "POST", "body": json.dumps(body)}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+
+def test_batch_runs_reads_concurrently(monkeypatch):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def _slow(key):
+        def _fn():
+            # Every read must be in flight at the same time to pass the barrier
+            barrier.wait()
+            return {key: []}
+        return _fn
+
+    monkeypatch.setattr(agent, "list_patches", _slow("patches"))
+    monkeypatch.setattr(tools, "list_assets", _slow("assets"))
+    monkeypatch.setattr(tools, "list_events", _slow("events"))
+
+    status, body = _invoke({"actions": ["list_patches", "list_assets", "list_events"]})
+
+    assert status == 200
+    assert list(body["results"]) == ["list_patches", "list_assets", "list_events"]
+    for key, result in body["results"].items():
+        assert result["status"] == 200
+        assert result["elapsedMs"] >= 0
+    assert body["results"]["list_assets"]["body"] == {"assets": []}
+
+
+def test_batch_reports_per_action_errors(monkeypatch):
+    monkeypatch.setattr(agent, "list_patches", lambda: {"patches": [{"patchId": "p-1"}]})
+
+    status, body = _invoke({"actions": [
+        {"action": "list_patches", "id": "patches"},
+        {"action": "run_sandbox"},
+        {"action": "nope"},
+        {"id": "missing-action"},
+    ]})
+
+    assert status == 200
+    results = body["results"]
+    assert results["patches"]["body"]["patches"][0]["patchId"] == "p-1"
+    assert results["run_sandbox"]["status"] == 400
+    assert results["nope"]["status"] == 400
+    assert results["#3"]["status"] == 400
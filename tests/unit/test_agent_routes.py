@@ -0,0 +1,35 @@
+import base64
+import json
+
+import agent
+
+
+def test_get_route_maps_to_action_with_query_limit(monkeypatch):
+    seen = {}
+
+    def _list_patches(limit=50):
+        seen["limit"] = limit
+        return {"patches": []}
+
+    monkeypatch.setattr(agent, "list_patches", _list_patches)
+    resp = agent.lambda_handler({"httpMethod": "GET", "resource": "/patches",
+                                 "queryStringParameters": {"limit": "5"}}, None)
+
+    assert resp["statusCode"] == 200
+    assert resp["headers"]["Cache-Control"] == "max-age=30"
+    assert seen["limit"] == 5
+
+
+def test_unknown_get_route_is_404():
+    resp = agent.lambda_handler({"httpMethod": "GET", "resource": "/nope"}, None)
+    assert resp["statusCode"] == 404
+
+
+def test_base64_post_body_is_decoded(monkeypatch):
+    monkeypatch.setattr(agent, "run_sandbox_test", lambda patch_id: {"patchId": patch_id})
+    raw = json.dumps({"action": "run_sandbox", "patch_id": "p-9"}).encode()
+    resp = agent.lambda_handler({"httpMethod": "POST", "isBase64Encoded": True,
+                                 "body": base64.b64encode(raw).decode()}, None)
+
+    assert json.loads(resp["body"]) == {"patchId": "p-9"}
+    assert "Cache-Control" not in resp["headers"]
@@ -0,0 +1,21 @@
+import json
+
+from scripts import benchmark_actions
+
+
+def test_benchmark_writes_percentiles_and_call_counts(tmp_path):
+    output = tmp_path / "bench.json"
+    benchmark_actions.main(["--sizes", "200", "--iterations", "3", "--warmup", "1",
+                            "--memory-iterations", "1", "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    [result] = report["results"]
+    assert result["size"] == 200
+    assert set(result["actions"]) == set(benchmark_actions.ACTIONS)
+    prompt = result["actions"]["prompt"]
+    assert prompt["errors"] == 0
+    assert prompt["p50Ms"] <= prompt["p99Ms"]
+    assert prompt["callsPerInvocation"]["bedrock.Converse"] == 2
+    # Sandbox runs pick patches run_sandbox accepts, so none are rejected
+    assert result["actions"]["run_sandbox"]["errors"] == 0
+    assert result["actions"]["list_compliance"]["callsPerInvocation"]["s3.GetObject"] == 20
@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from scripts import bulk_load
+from tests.fakes import FakeDynamoDB, FaultInjector
+
+
+def test_generation_is_deterministic_and_consistent():
+    patches = list(bulk_load.generate_patches(200, asset_count=50, seed=3))
+    assert patches == list(bulk_load.generate_patches(200, asset_count=50, seed=3))
+    assert patches != list(bulk_load.generate_patches(200, asset_count=50, seed=4))
+
+    for patch in patches:
+        assert patch["severity"] == bulk_load.severity_for(float(patch["cvss"]))
+        assert all("a-00000000" <= a <= "a-00000049" for a in patch["affectedAssets"])
+        assert ("impactScore" in patch) == (patch["status"] != "PENDING")
+
+    # Keys follow ingest's deterministic IDs, and events point at generated patches
+    assert all(p["patchId"] == bulk_load.patch_state.patch_id_for(p["cve"], p["product"]) for p in patches)
+    ids = {p["patchId"] for p in patches}
+    assert all(e["patchId"] in ids for e in bulk_load.generate_events(100, patch_count=200, seed=3))
+
+    asset = next(bulk_load.generate_assets(1, seed=3))
+    assert asset["software"][0]["cpe"].startswith("cpe:2.3:a:")
+    assert asset["maintenanceWindow"]["day"] in bulk_load.DAYS
+
+
+def test_load_items_retries_throttled_batches():
+    faults = FaultInjector(seed=5)
+    db = FakeDynamoDB(faults)
+    table = db.create_table("IPO-Events", "eventId", "timestamp")
+    faults.configure("dynamodb", throttle_rate=0.4)
+
+    result = bulk_load.load_items(lambda: db, "IPO-Events", bulk_load.generate_events(1000, 10),
+                                  workers=4, sleep=lambda s: None, max_attempts=40)
+
+    # Workers share the injector, so which calls are throttled varies; with 40
+    # attempts giving up on an item (0.4 ** 40) cannot happen in practice
+    assert result["written"] == table.item_count == 1000
+    assert result["failed"] == 0
+    assert result["retries"] > 0
+    assert result["itemsPerSecond"] > 0
+
+
+def test_dump_round_trip_keeps_numbers(tmp_path):
+    path = str(tmp_path / "patches.ndjson.gz")
+    patches = list(bulk_load.generate_patches(20, asset_count=5))
+    assert bulk_load.dump_ndjson(path, patches) == 20
+
+    loaded = list(bulk_load.read_ndjson(path))
+    assert loaded[0]["cvss"] == patches[0]["cvss"]
+    assert isinstance(loaded[0]["cvss"], Decimal)
+    assert [p["patchId"] for p in loaded] == [p["patchId"] for p in patches]
+
+
+def test_summary_item_matches_patches():
+    patches = list(bulk_load.generate_patches(300))
+    item = bulk_load.summary_item(patches)
+
+    assert item["total"] == 300
+    assert sum(v for k, v in item.items() if k.startswith("status#")) == 300
+    assert item["status#PENDING"] == sum(p["status"] == "PENDING" for p in patches)
+
+
+def test_load_items_survives_writers_that_fail_to_start():
+    db = FakeDynamoDB(FaultInjector(seed=1))
+    table = db.create_table("IPO-Events", "eventId", "timestamp")
+    starts = []
+
+    def factory():
+        starts.append(1)
+        if len(starts) % 2:
+            raise RuntimeError("no credentials")
+        return db
+
+    # Far more batches than the bounded queue holds, so a lost worker would block the producer
+    result = bulk_load.load_items(factory, "IPO-Events", bulk_load.generate_events(2000, 10),
+                                  workers=2, progress_every=0)
+    assert result["written"] + result["failed"] == 2000
+    assert result["written"] == table.item_count
+
+
+def test_load_items_fails_instead_of_hanging_when_no_writer_starts():
+    def factory():
+        raise RuntimeError("no credentials")
+
+    result = bulk_load.load_items(factory, "IPO-Events", bulk_load.generate_events(500, 10),
+                                  workers=2, progress_every=0)
+    assert result["written"] == 0 and result["failed"] == 500
@@ -0,0 +1,110 @@
+import json
+
+import contextlib
+
+import pytest
+
+import cve_ingest
+import event_buffer
+import summary
+
+
+class ListTable:
+    def __init__(self):
+        self.items = []
+
+    def put_item(self, Item, **kwargs):
+        self.items.append(Item)
+
+    @contextlib.contextmanager
+    def batch_writer(self):
+        yield self
+
+
+def test_worker_writes_chunks_and_reports_bad_records(monkeypatch):
+    patches, events = ListTable(), ListTable()
+    monkeypatch.setenv("PATCHES_TABLE_NAME", "patches")
+    monkeypatch.setattr(cve_ingest, "_get_tables", lambda: (patches, None))
+    monkeypatch.setattr(event_buffer, "_buffer", event_buffer.EventBuffer(lambda: events))
+
+    result = cve_ingest.worker_handler({"Records": [
+        {"messageId": "m-1", "body": json.dumps({"entries": [
+            {"cve": "CVE-2025-1", "description": "a", "severity": "HIGH"},
+            {"cve": "CVE-2025-2", "description": "b", "severity": "LOW"},
+        ]})},
+        {"messageId": "m-2", "body": "not json"},
+    ]}, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m-2"}]}
+    assert [p["cve"] for p in patches.items] == ["CVE-2025-1", "CVE-2025-2"]
+    assert len(events.items) == 2
+
+
+class ThrottledTable(ListTable):
+    def put_item(self, Item, **kwargs):
+        if Item["cve"] == "CVE-2025-2":
+            raise cve_ingest.resilience.CircuitOpen("dynamodb is unavailable (circuit open)")
+        super().put_item(Item, **kwargs)
+
+
+def test_worker_reports_records_with_failed_writes(monkeypatch):
+    patches, events = ThrottledTable(), ListTable()
+    monkeypatch.setenv("PATCHES_TABLE_NAME", "patches")
+    monkeypatch.setattr(cve_ingest, "_get_tables", lambda: (patches, None))
+    monkeypatch.setattr(event_buffer, "_buffer", event_buffer.EventBuffer(lambda: events))
+
+    result = cve_ingest.worker_handler({"Records": [
+        {"messageId": "m-1", "body": json.dumps({"entries": [
+            {"cve": "CVE-2025-1", "severity": "HIGH"},
+            {"cve": "CVE-2025-2", "severity": "LOW"},
+        ]})},
+        {"messageId": "m-2", "body": json.dumps({"entries": [{"cve": "CVE-2025-3"}]})},
+    ]}, None)
+
+    # The good entries are stored; the record is still redelivered for the failed one
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m-1"}]}
+    assert [p["cve"] for p in patches.items] == ["CVE-2025-1", "CVE-2025-3"]
+
+
+class FlakySqs:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append([e["Id"] for e in Entries])
+        failing = Entries[:1] if self.failures else []
+        self.failures = max(0, self.failures - 1)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries[len(failing):]],
+                "Failed": [{"Id": e["Id"], "Code": "InternalError"} for e in failing]}
+
+
+def test_enqueue_resends_failed_chunks_then_raises(monkeypatch):
+    monkeypatch.setattr(cve_ingest.time, "sleep", lambda s: None)
+    entries = [{"cve": f"CVE-2025-{i}"} for i in range(3)]
+
+    sqs = FlakySqs(failures=1)
+    monkeypatch.setattr(cve_ingest.boto3, "client", lambda name: sqs)
+    assert cve_ingest.enqueue_entries(entries, "queue", chunk_size=1) == 3
+    assert sqs.calls == [["0", "1", "2"], ["0"]]
+
+    sqs = FlakySqs(failures=cve_ingest.ENQUEUE_ATTEMPTS)
+    monkeypatch.setattr(cve_ingest.boto3, "client", lambda name: sqs)
+    with pytest.raises(cve_ingest.IngestError) as raised:
+        cve_ingest.enqueue_entries(entries, "queue", chunk_size=1)
+    assert raised.value.written == 2
+    assert [m["Id"] for m in raised.value.failed] == ["0"]
+
+
+def test_last_ingest_is_stamped_by_the_worker_not_at_enqueue(fake_backend, monkeypatch):
+    queue_url = "https://sqs.local/ingest"
+    monkeypatch.setenv("INGEST_QUEUE_URL", queue_url)
+    monkeypatch.setattr(cve_ingest, "fetch_feed", lambda: None)
+    monkeypatch.setattr(cve_ingest, "parse_feed", lambda feed: [{"cve": "CVE-2025-1", "severity": "HIGH"}])
+    summary_table = fake_backend.table("SUMMARY_TABLE_NAME")
+
+    assert cve_ingest.lambda_handler({}, None)["queued"] == 1
+    assert summary.read_summary(summary_table)["lastIngestAt"] is None
+
+    cve_ingest.worker_handler(fake_backend.sqs.as_lambda_event(queue_url), None)
+    assert summary.read_summary(summary_table)["lastIngestAt"] is not None
@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+import agent
+import delta_sync
+import event_buffer
+import tools
+
+
+def patch(pid, updated, status="PENDING"):
+    return {"patchId": pid, "cve": f"CVE-2024-{pid}", "status": status, "updatedAt": updated}
+
+
+PATCHES = [
+    patch("p-1", "2024-05-01T10:00:00.000000Z"),
+    patch("p-2", "2024-05-02T10:00:00.000000Z"),
+    patch("p-3", "2024-05-03T10:00:00.000000Z"),
+    patch("p-4", "2024-05-03T10:00:00.000000Z"),
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(delta_sync, "_etags", {})
+
+
+def test_full_list_returns_its_version_and_delta_returns_later_changes(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    full = tools.list_patches()
+    assert full["version"] == "2024-05-03T10:00:00.000000Z"
+
+    delta = tools.list_patches(since="2024-05-01T12:00:00Z")
+    assert [p["patchId"] for p in delta["patches"]] == ["p-2", "p-3", "p-4"]
+    assert delta["version"] == "2024-05-03T10:00:00.000000Z"
+    assert delta["more"] is False
+
+    # Nothing changed: the same version comes back, so the body is identical
+    assert tools.list_patches(since=delta["version"]) == {
+        "patches": [], "since": delta["version"], "version": delta["version"], "more": False}
+
+
+def test_delta_pages_never_split_a_timestamp(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    first = tools.list_patches(since="2024-01-01T00:00:00Z", limit=3)
+    # p-3 and p-4 share a timestamp, so the page stops before them
+    assert [p["patchId"] for p in first["patches"]] == ["p-1", "p-2"]
+    assert first["more"] is True
+    second = tools.list_patches(since=first["version"], limit=3)
+    assert [p["patchId"] for p in second["patches"]] == ["p-3", "p-4"]
+
+
+def test_delta_returns_a_whole_timestamp_larger_than_the_limit(fake_backend):
+    stamp = "2024-05-03T10:00:00.000000Z"
+    fake_backend.load("PATCHES_TABLE_NAME", [patch(f"p-{i}", stamp) for i in range(5)]
+                      + [patch("p-late", "2024-05-04T10:00:00.000000Z")])
+    first = tools.list_patches(since="2024-01-01T00:00:00Z", limit=2)
+    # All five share the cut, so they come back together rather than some being skipped
+    assert sorted(p["patchId"] for p in first["patches"]) == [f"p-{i}" for i in range(5)]
+    assert first["version"] == stamp and first["more"] is True
+    second = tools.list_patches(since=first["version"], limit=2)
+    assert [p["patchId"] for p in second["patches"]] == ["p-late"]
+    assert second["more"] is False
+
+def test_written_patches_show_up_in_the_next_delta(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    version = tools.list_patches()["version"]
+    tools.prioritize_patch("CVE-2024-p-1")
+    changed = tools.list_patches(since=version)["patches"]
+    assert len(changed) == 1 and changed[0]["status"] == "ANALYZED"
+
+
+def test_events_delta_and_invalid_since(fake_backend):
+    fake_backend.load("EVENTS_TABLE_NAME", [
+        {"eventId": f"e-{i}", "timestamp": f"2024-05-0{i}T00:00:00.000000Z", "source": "test"} for i in range(1, 4)])
+    delta = tools.list_events(since="2024-05-01T00:00:00.000000Z")
+    assert [e["eventId"] for e in delta["events"]] == ["e-2", "e-3"]
+    assert tools.list_events(since="yesterday")["status"] == "error"
+
+
+def _get(path, params=None, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return agent.lambda_handler({"httpMethod": "GET", "resource": path, "headers": headers,
+                                 "queryStringParameters": params}, None)
+
+
+def test_unchanged_poll_is_answered_without_reading_the_table(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    first = _get("/patches", {"since": "2024-05-02T00:00:00Z"})
+    etag = first["headers"]["ETag"]
+    assert first["statusCode"] == 200 and first["headers"]["Access-Control-Expose-Headers"] == "ETag"
+
+    fake_backend.faults.reset_counters()
+    again = _get("/patches", {"since": "2024-05-02T00:00:00Z"}, etag=etag)
+    assert again["statusCode"] == 304 and again["body"] == ""
+    assert fake_backend.faults.stats()["calls"] == {}
+
+    # A stale ETag gets the full response
+    assert _get("/patches", {"since": "2024-05-02T00:00:00Z"}, etag='"old"')["statusCode"] == 200
+
+
+def test_local_writes_invalidate_the_remembered_etag(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    etag = _get("/patches")["headers"]["ETag"]
+    event_buffer.emit("test", "something changed")
+    event_buffer._buffer._items.clear()
+
+    fake_backend.faults.reset_counters()
+    resp = _get("/patches", etag=etag)
+    # The table is read again; the content is unchanged, so it is still a 304
+    assert resp["statusCode"] == 304
+    assert fake_backend.faults.stats()["calls"]["dynamodb.Scan"] == 1
+
+
+def test_post_actions_accept_since(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    resp = agent.lambda_handler({"httpMethod": "POST", "body": json.dumps(
+        {"action": "list_patches", "since": "2024-05-02T12:00:00Z"})}, None)
+    body = json.loads(resp["body"])
+    assert [p["patchId"] for p in body["patches"]] == ["p-3", "p-4"]
+    assert "ETag" not in resp["headers"]
+
+
+def test_deleted_patches_come_back_as_tombstones(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    version = tools.list_patches()["version"]
+
+    assert tools.delete_patch("p-2") == {"patchId": "p-2", "deleted": True}
+    assert tools.delete_patch("p-2")["status"] == "error"
+
+    delta = tools.list_patches(since=version)
+    assert [(p["patchId"], p.get("deleted")) for p in delta["patches"]] == [("p-2", True)]
+    assert "cve" not in delta["patches"][0]
+    assert "p-2" not in [p["patchId"] for p in tools.list_patches()["patches"]]
+    tombstone = fake_backend.table("PATCHES_TABLE_NAME").get_item(Key={"patchId": "p-2"})["Item"]
+    assert tombstone["expiresAt"] > 0
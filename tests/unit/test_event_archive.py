@@ -0,0 +1,76 @@
+import io
+from datetime import date
+
+import event_archive
+
+
+class DayTable:
+    def __init__(self, items, page_size=2):
+        self.items = items
+        self.page_size = page_size
+
+    def scan(self, FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+             ExclusiveStartKey=None):
+        day = ExpressionAttributeValues[':day']
+        matches = [i for i in self.items if i['timestamp'].startswith(day)]
+        start = ExclusiveStartKey['offset'] if ExclusiveStartKey else 0
+        page = matches[start:start + self.page_size]
+        resp = {"Items": page}
+        if start + self.page_size < len(matches):
+            resp["LastEvaluatedKey"] = {"offset": start + self.page_size}
+        return resp
+
+
+class MissingKey(Exception):
+    response = {"Error": {"Code": "NoSuchKey"}}
+
+
+class Bucket:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise MissingKey()
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def test_compact_then_query_history():
+    table = DayTable([
+        {"eventId": "e1", "timestamp": "2025-03-01T01:00:00Z", "source": "cve_ingest", "patchId": "p-1"},
+        {"eventId": "e2", "timestamp": "2025-03-01T02:00:00Z", "source": "sandbox", "patchId": "p-1"},
+        {"eventId": "e3", "timestamp": "2025-03-01T03:00:00Z", "source": "cve_ingest", "patchId": "p-2"},
+        {"eventId": "e4", "timestamp": "2025-03-02T01:00:00Z", "source": "cve_ingest", "patchId": "p-3"},
+    ])
+    s3 = Bucket()
+
+    result = event_archive.compact_day(table, s3, "bucket", date(2025, 3, 1))
+    assert result["events"] == 3
+    assert result["key"] == "events/dt=2025-03-01/events.ndjson.gz"
+    # Re-running the same day overwrites rather than duplicating
+    event_archive.compact_day(table, s3, "bucket", date(2025, 3, 1))
+    assert len(s3.objects) == 1
+
+    history = event_archive.read_history(s3, "bucket", date(2025, 2, 27), date(2025, 3, 2),
+                                         source="cve_ingest")
+    assert [e["eventId"] for e in history] == ["e3", "e1"]
+
+
+def test_history_limit_is_validated_and_clamped(monkeypatch):
+    import tools
+
+    monkeypatch.setenv("EVENT_ARCHIVE_BUCKET_NAME", "bucket")
+    table = DayTable([{"eventId": f"e{i:04d}", "timestamp": "2025-03-01T01:00:00Z", "source": "sandbox"}
+                      for i in range(event_archive.HISTORY_MAX_LIMIT + 50)], page_size=5000)
+    s3 = Bucket()
+    event_archive.compact_day(table, s3, "bucket", date(2025, 3, 1))
+    monkeypatch.setattr(tools, "get_s3_client", lambda: s3)
+    params = {"start": "2025-03-01", "end": "2025-03-01"}
+
+    for bad in ("0", 0, "-5"):
+        assert event_archive.list_event_history(dict(params, limit=bad))["status"] == "error"
+    result = event_archive.list_event_history(dict(params, limit="1000000"))
+    assert len(result["events"]) == event_archive.HISTORY_MAX_LIMIT
@@ -0,0 +1,121 @@
+import contextlib
+import time
+from decimal import Decimal
+
+import pytest
+
+import event_buffer
+
+
+class BatchTable:
+    def __init__(self, fail_times=0):
+        self.items = []
+        self.batches = 0
+        self.fail_times = fail_times
+
+    @contextlib.contextmanager
+    def batch_writer(self):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("throttled")
+        self.batches += 1
+        yield self
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+
+def test_flushes_when_full():
+    table = BatchTable()
+    buf = event_buffer.EventBuffer(lambda: table, max_items=3, max_age=60)
+    for i in range(7):
+        buf.emit("test", f"event {i}", patch_id="p-1")
+
+    assert len(table.items) == 6
+    assert table.batches == 2
+    assert len(buf) == 1
+    assert table.items[0]["patchId"] == "p-1"
+    assert "expiresAt" in table.items[0]
+
+
+def test_flushes_when_oldest_event_is_too_old():
+    now = [0.0]
+    table = BatchTable()
+    buf = event_buffer.EventBuffer(lambda: table, max_items=100, max_age=2, clock=lambda: now[0])
+    buf.emit("test", "first")
+    now[0] = 2.5
+    buf.emit("test", "second")
+    assert len(table.items) == 2
+
+
+def test_failed_flush_keeps_events_and_raises_without_a_fallback(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(event_buffer.time, "sleep", sleeps.append)
+    table = BatchTable(fail_times=event_buffer.FLUSH_ATTEMPTS)
+    buf = event_buffer.EventBuffer(lambda: table, max_items=100, max_age=60, timer=False)
+    buf.emit("test", "kept")
+
+    with pytest.raises(event_buffer.EventFlushError):
+        buf.flush()
+    # Backoff only between attempts, not after the last one
+    assert len(sleeps) == event_buffer.FLUSH_ATTEMPTS - 1
+    assert len(buf) == 1
+    assert buf.flush() == 1
+    assert table.items[0]["message"] == "kept"
+
+
+def test_unwritable_events_go_to_the_fallback_queue_and_are_replayed(fake_backend, monkeypatch):
+    monkeypatch.setattr(event_buffer.time, "sleep", lambda s: None)
+    queue_url = "https://sqs.local/events-fallback"
+    table = BatchTable(fail_times=event_buffer.FLUSH_ATTEMPTS)
+    buf = event_buffer.EventBuffer(lambda: table, max_items=100, max_age=60, timer=False,
+                                   fallback=lambda items: event_buffer.send_to_fallback(items, queue_url))
+    buf.emit("test", "queued", score=Decimal("9.5"))
+
+    assert buf.flush() == 0
+    assert len(buf) == 0 and table.items == []
+
+    result = event_buffer.replay_handler(fake_backend.sqs.as_lambda_event(queue_url), None)
+    assert result == {"batchItemFailures": []}
+    [event] = fake_backend.table("EVENTS_TABLE_NAME").all_items()
+    assert event["message"] == "queued" and event["score"] == Decimal("9.5")
+
+
+def test_timer_flushes_a_quiet_buffer():
+    table = BatchTable()
+    buf = event_buffer.EventBuffer(lambda: table, max_items=100, max_age=0.05)
+    buf.emit("test", "alone")
+    deadline = time.monotonic() + 2
+    while not table.items and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [i["message"] for i in table.items] == ["alone"]
+
+
+def test_failed_flush_fails_an_otherwise_successful_handler(monkeypatch):
+    monkeypatch.setattr(event_buffer.time, "sleep", lambda s: None)
+    table = BatchTable(fail_times=event_buffer.FLUSH_ATTEMPTS)
+    monkeypatch.setattr(event_buffer, "_buffer",
+                        event_buffer.EventBuffer(lambda: table, max_items=100, max_age=60, timer=False))
+
+    @event_buffer.flushing
+    def handler(event, context):
+        event_buffer.emit("test", "unwritten")
+        return {"statusCode": 200}
+
+    with pytest.raises(event_buffer.EventFlushError):
+        handler({}, None)
+
+
+def test_handler_error_still_flushes(monkeypatch):
+    table = BatchTable()
+    monkeypatch.setattr(event_buffer, "_buffer",
+                        event_buffer.EventBuffer(lambda: table, max_items=100, max_age=60))
+
+    @event_buffer.flushing
+    def handler(event, context):
+        event_buffer.emit("test", "before failure")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        handler({}, None)
+    assert [i["message"] for i in table.items] == ["before failure"]
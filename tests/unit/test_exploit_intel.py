@@ -0,0 +1,138 @@
+import gzip
+import json
+
+import pytest
+
+import exploit_intel
+import tools
+from exploit_intel import ExploitIndex
+
+KEV = {
+    "catalogVersion": "2024.05.01",
+    "vulnerabilities": [
+        {"cveID": "CVE-2021-44228", "knownRansomwareCampaignUse": "Known"},
+        {"cveID": "CVE-2023-4966", "knownRansomwareCampaignUse": "Unknown"},
+        {"cveID": "CVE-2018-1000861", "knownRansomwareCampaignUse": "Unknown"},
+    ],
+}
+EPSS = ("#model_version:v2023.03.01,score_date:2024-05-01T00:00:00+0000\n"
+        "cve,epss,percentile\n"
+        "CVE-2021-44228,0.97565,0.99996\n"
+        "CVE-2023-4966,0.96201,0.99470\n"
+        "CVE-2024-1234,0.00043,0.05823\n"
+        "CVE-2018-1000861,0.97397,0.99920\n")
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    exploit_intel.configure(None)
+    yield
+    exploit_intel.configure(None)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    kev = tmp_path / "kev.json"
+    kev.write_text(json.dumps(KEV))
+    epss = tmp_path / "epss.csv.gz"
+    epss.write_bytes(gzip.compress(EPSS.encode()))
+    return str(kev), str(epss)
+
+
+def test_lookup_combines_kev_and_epss(sources, tmp_path):
+    index = exploit_intel.load(*sources, cache_dir=str(tmp_path / "cache"))
+
+    assert index.lookup("CVE-2021-44228") == {"kev": True, "ransomware": True, "epss": 0.97565,
+                                              "epssPercentile": 0.99996}
+    assert index.lookup("cve-2024-1234")["kev"] is False
+    # Sequence numbers past the dense range are still found
+    assert index.lookup("CVE-2018-1000861")["kev"] is True
+    assert index.lookup("CVE-2024-1235") is None
+    assert index.lookup("CVE-1999-0001") is None
+    assert index.lookup("not a cve") is None
+    assert len(index) == 4
+    assert index.header["scoreDate"] == "2024-05-01T00:00:00+0000"
+
+
+def test_saved_index_is_mapped_and_reused_until_a_source_changes(sources, tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    exploit_intel.load(*sources, cache_dir=cache)
+    monkeypatch.setattr(exploit_intel, "build_from_sources", lambda *a: pytest.fail("rebuilt"))
+    index = exploit_intel.load(*sources, cache_dir=cache)
+    assert index._mapped is not None
+    assert index.lookup("CVE-2023-4966")["epss"] == 0.96201
+
+    monkeypatch.undo()
+    with open(sources[1], "wb") as f:
+        f.write(gzip.compress((EPSS + "CVE-2024-9999,0.5,0.9\n").encode()))
+    assert exploit_intel.load(*sources, cache_dir=cache).lookup("CVE-2024-9999")["epss"] == 0.5
+
+
+def test_prebuilt_index_is_downloaded_from_s3(fake_backend, sources, tmp_path, monkeypatch):
+    path = str(tmp_path / "prebuilt.idx")
+    exploit_intel.build_from_sources(*sources).save(path)
+    with open(path, "rb") as f:
+        fake_backend.s3.put_object(Bucket="ipo-compliance", Key="intel/exploit.idx", Body=f.read())
+    monkeypatch.setenv("EXPLOIT_INTEL_INDEX", "s3://ipo-compliance/intel/exploit.idx")
+    monkeypatch.setattr(exploit_intel, "EXPLOIT_INTEL_CACHE_DIR", str(tmp_path / "cache"))
+
+    assert exploit_intel.lookup("CVE-2023-4966")["kev"] is True
+
+
+def test_missing_sources_leave_scoring_unenriched(monkeypatch, tmp_path):
+    monkeypatch.setenv("KEV_SOURCE", str(tmp_path / "missing.json"))
+    assert exploit_intel.lookup("CVE-2021-44228") is None
+    assert exploit_intel.score_bonus(None) == 0 and exploit_intel.attributes(None) == {}
+
+
+def test_prioritize_scores_and_records_exploitation(fake_backend, sources):
+    exploit_intel.configure(exploit_intel.build_from_sources(*sources))
+    fake_backend.load("PATCHES_TABLE_NAME", [
+        {"patchId": "p-1", "cve": "CVE-2021-44228", "severity": "HIGH", "status": "PENDING"}])
+
+    result = tools.prioritize_patch("log4shell")
+
+    # 50 base + 20 KEV + 5 ransomware + 10 for the top EPSS percentile
+    assert result["impactScore"] == 85 and result["is_high_risk"]
+    patch = fake_backend.table("PATCHES_TABLE_NAME").get_item(Key={"patchId": "p-1"})["Item"]
+    assert patch["kev"] is True and patch["knownRansomware"] is True
+    assert str(patch["epss"]) == "0.97565"
+
+
+def test_ingest_attaches_exploitability(fake_backend, sources):
+    import cve_ingest
+
+    exploit_intel.configure(exploit_intel.build_from_sources(*sources))
+    table = fake_backend.table("PATCHES_TABLE_NAME")
+    cve_ingest.write_entries([{"cve": "CVE-2023-4966", "severity": "CRITICAL"},
+                              {"cve": "CVE-2025-0001", "severity": "LOW"}], table)
+
+    items = {item["cve"]: item for item in table.all_items()}
+    assert items["CVE-2023-4966"]["kev"] is True
+    assert "kev" not in items["CVE-2025-0001"]
+
+
+def test_build_handles_a_full_size_epss_file_quickly():
+    import time
+
+    epss = {f"CVE-{2000 + i % 25}-{i // 25}": ("0.01", "0.5") for i in range(250_000)}
+    started = time.perf_counter()
+    index = ExploitIndex.build({}, epss)
+    assert time.perf_counter() - started < 5
+    assert index.lookup("CVE-2024-9999")["epssPercentile"] == 0.5
+
+
+def test_published_index_is_preferred_and_raw_sources_are_the_fallback(fake_backend, sources, tmp_path,
+                                                                          monkeypatch):
+    location = "s3://ipo-compliance/exploit-intel/exploit_intel.idx"
+    monkeypatch.setattr(exploit_intel, "EXPLOIT_INTEL_CACHE_DIR", str(tmp_path / "cache"))
+
+    # Not published yet: the raw snapshots are parsed instead
+    assert exploit_intel.load(*sources, index_location=location).lookup("CVE-2023-4966")["kev"] is True
+
+    monkeypatch.setenv("KEV_SOURCE", sources[0])
+    monkeypatch.setenv("EPSS_SOURCE", sources[1])
+    monkeypatch.setenv("EXPLOIT_INTEL_INDEX", location)
+    assert exploit_intel.lambda_handler({}, None)["cves"] == 4
+    monkeypatch.setattr(exploit_intel, "build_from_sources", lambda *a: pytest.fail("rebuilt"))
+    assert exploit_intel.load(*sources, index_location=location).lookup("CVE-2021-44228")["ransomware"] is True
@@ -0,0 +1,87 @@
+import gzip
+import json
+
+import pytest
+
+import agent
+import export
+from scripts.bulk_load import generate_assets, generate_patches
+
+
+def read_export(backend, key):
+    body = backend.s3.get_object(Bucket="ipo-exports", Key=key)["Body"].read()
+    return [json.loads(line) for line in gzip.decompress(body).splitlines()]
+
+
+def test_export_streams_every_item_in_multiple_parts(fake_backend, monkeypatch):
+    fake_backend.load("PATCHES_TABLE_NAME", generate_patches(3000, 50))
+    # Store the parts uncompressed so a small table still spans several 5 MB parts
+    monkeypatch.setattr(export, "EXPORT_GZIP_LEVEL", 0)
+    monkeypatch.setattr(export, "EXPORT_PART_BYTES", 5 * 1024 * 1024)
+    table = fake_backend.table("PATCHES_TABLE_NAME")
+    source = {item["patchId"]: item for item in table.all_items()}
+    # Pad items so the export is about 15 MB
+    for item in source.values():
+        item["notes"] = "x" * 5000
+    fake_backend.load("PATCHES_TABLE_NAME", source.values())
+
+    result = export.export_table(table, fake_backend.s3, "ipo-exports", "exports/patches/test.ndjson.gz", segments=3)
+
+    assert result["items"] == 3000 and result["parts"] >= 3
+    rows = read_export(fake_backend, "exports/patches/test.ndjson.gz")
+    assert sorted(r["patchId"] for r in rows) == sorted(source)
+    assert fake_backend.s3.open_uploads == 0
+    calls = fake_backend.faults.stats()["calls"]
+    assert calls["s3.UploadPart"] == result["parts"]
+
+
+def test_export_action_runs_inline_and_writes_a_manifest(fake_backend):
+    fake_backend.load("ASSETS_TABLE_NAME", generate_assets(500))
+    resp = agent.lambda_handler({"httpMethod": "POST", "body": json.dumps({"action": "export", "table": "assets"})}, None)
+    body = json.loads(resp["body"])
+
+    assert resp["statusCode"] == 200 and body["status"] == "ok"
+    assert body["items"] == 500 and body["itemsPerSecond"] > 0
+    assert len(read_export(fake_backend, body["key"])) == 500
+    manifest = fake_backend.s3.get_object(Bucket="ipo-exports", Key=body["key"].replace(".ndjson.gz", ".manifest.json"))
+    assert json.loads(manifest["Body"].read())["items"] == 500
+
+
+def test_failed_scan_aborts_the_upload(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", generate_patches(200))
+    fake_backend.faults.configure("dynamodb", throttle_rate=1.0, operations=["Scan"])
+    result = export.run_export({"table": "patches"})
+    assert result["status"] == "error"
+    assert fake_backend.s3.open_uploads == 0
+
+
+def test_deadline_stops_the_export(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", generate_patches(200))
+    with pytest.raises(TimeoutError):
+        export.export_table(fake_backend.table("PATCHES_TABLE_NAME"), fake_backend.s3, "ipo-exports",
+                            "exports/patches/late.ndjson.gz", deadline=0)
+    assert fake_backend.s3.open_uploads == 0
+
+
+def test_inline_export_is_abandoned_at_its_time_limit(fake_backend, monkeypatch):
+    fake_backend.load("PATCHES_TABLE_NAME", generate_patches(200))
+    monkeypatch.setattr(export, "EXPORT_INLINE_SECONDS", -1)
+    status, body = export.start_export({"table": "patches", "wait": True})
+    assert status == 504 and "wait" in body["error"]
+    assert fake_backend.s3.open_uploads == 0
+
+def test_async_mode_invokes_the_export_function(fake_backend, monkeypatch):
+    invoked = []
+
+    class FakeLambda:
+        def invoke(self, **kwargs):
+            invoked.append(kwargs)
+
+    monkeypatch.setenv("EXPORT_FUNCTION_NAME", "IpoExportFunction")
+    monkeypatch.setattr(export, "_lambda_client", FakeLambda())
+    status, body = export.start_export({"table": "patches"})
+
+    assert status == 202 and body["status"] == "started"
+    assert invoked[0]["InvocationType"] == "Event"
+    assert json.loads(invoked[0]["Payload"])["key"] == body["key"]
+    assert export.start_export({"table": "events"})[0] == 400
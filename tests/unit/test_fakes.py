@@ -0,0 +1,195 @@
+import gzip
+from decimal import Decimal
+
+import pytest
+
+from tests.fakes import (ClientError, FakeDynamoDB, FakeS3, FaultInjector,
+                         text_response, tool_use_response)
+from tests.fakes.dynamodb import MAX_PAGE_BYTES
+
+
+def _code(excinfo):
+    return excinfo.value.response["Error"]["Code"]
+
+
+@pytest.fixture
+def table():
+    return FakeDynamoDB().create_table("patches", "patchId")
+
+
+def test_items_are_stored_like_boto3_returns_them(table):
+    table.put_item(Item={"patchId": "p-1", "score": 5, "tags": {"a"}})
+    item = table.get_item(Key={"patchId": "p-1"})["Item"]
+    assert item == {"patchId": "p-1", "score": Decimal(5), "tags": {"a"}}
+    item["score"] = Decimal(99)
+    assert table.get_item(Key={"patchId": "p-1"})["Item"]["score"] == 5
+    with pytest.raises(TypeError):
+        table.put_item(Item={"patchId": "p-2", "score": 1.5})
+
+
+def test_scan_filters_and_pages_by_limit(table):
+    for i in range(10):
+        table.put_item(Item={"patchId": f"p-{i}", "severity": "CRITICAL" if i % 2 else "LOW"})
+
+    seen, pages = [], 0
+    kwargs = {"Limit": 3, "FilterExpression": "#s = :c",
+              "ExpressionAttributeNames": {"#s": "severity"},
+              "ExpressionAttributeValues": {":c": "CRITICAL"}}
+    while True:
+        resp = table.scan(**kwargs)
+        pages += 1
+        assert resp["ScannedCount"] <= 3
+        seen += [i["patchId"] for i in resp["Items"]]
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    assert sorted(seen) == ["p-1", "p-3", "p-5", "p-7", "p-9"]
+    assert pages == 4
+
+
+def test_scan_pages_stop_at_one_megabyte(table):
+    blob = "x" * 100_000
+    for i in range(25):
+        table.put_item(Item={"patchId": f"p-{i}", "blob": blob})
+
+    counts, kwargs = [], {}
+    while True:
+        resp = table.scan(**kwargs)
+        counts.append(resp["Count"])
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    # Each page reads just past 1 MB, i.e. 11 items of ~100 KB
+    assert counts == [11, 11, 3]
+    assert counts[0] * 100_000 < MAX_PAGE_BYTES + 100_100
+
+
+def test_parallel_scan_segments_partition_the_table(table):
+    for i in range(50):
+        table.put_item(Item={"patchId": f"p-{i}"})
+    ids = []
+    for segment in range(4):
+        ids += [i["patchId"] for i in table.scan(Segment=segment, TotalSegments=4)["Items"]]
+    assert sorted(ids) == sorted(f"p-{i}" for i in range(50))
+
+
+def test_conditions_and_update_return_values(table):
+    table.put_item(Item={"patchId": "p-1", "status": "NEW"})
+    with pytest.raises(ClientError) as exc:
+        table.put_item(Item={"patchId": "p-1"}, ConditionExpression="attribute_not_exists(patchId)")
+    assert _code(exc) == "ConditionalCheckFailedException"
+
+    resp = table.update_item(
+        Key={"patchId": "p-1"},
+        UpdateExpression="SET #s = :s, hits = if_not_exists(hits, :zero) + :one REMOVE junk",
+        ConditionExpression="#s IN (:new, :analyzed) AND NOT attribute_exists(claimedBy)",
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={":s": "ANALYZED", ":zero": 0, ":one": 1,
+                                   ":new": "NEW", ":analyzed": "ANALYZED"},
+        ReturnValues="UPDATED_OLD")
+    assert resp["Attributes"] == {"status": "NEW"}
+    table.update_item(Key={"patchId": "p-1"}, UpdateExpression="ADD hits :n",
+                      ExpressionAttributeValues={":n": 2})
+    assert table.get_item(Key={"patchId": "p-1"}, ProjectionExpression="hits")["Item"] == {"hits": 3}
+
+
+def test_query_uses_key_condition_and_sort_order():
+    events = FakeDynamoDB().create_table("events", "eventId", "timestamp")
+    for ts in ("2024-01-03", "2024-01-01", "2024-01-02"):
+        events.put_item(Item={"eventId": "e-1", "timestamp": ts})
+    events.put_item(Item={"eventId": "e-2", "timestamp": "2024-01-01"})
+
+    resp = events.query(KeyConditionExpression="eventId = :e AND #ts >= :d",
+                        ExpressionAttributeNames={"#ts": "timestamp"},
+                        ExpressionAttributeValues={":e": "e-1", ":d": "2024-01-02"},
+                        ScanIndexForward=False)
+    assert [i["timestamp"] for i in resp["Items"]] == ["2024-01-03", "2024-01-02"]
+
+
+def test_batch_writer_resends_throttled_items():
+    faults = FaultInjector()
+    db = FakeDynamoDB(faults)
+    table = db.create_table("events", "eventId")
+    # The first five items of the first batch come back unprocessed
+    faults.configure("dynamodb", throttle_first=5)
+    with table.batch_writer() as batch:
+        for i in range(60):
+            batch.put_item(Item={"eventId": f"e-{i}"})
+
+    assert table.item_count == 60
+    assert faults.calls["dynamodb.BatchWriteItem"] == 3
+    assert faults.throttles["dynamodb.BatchWriteItem"] == 5
+
+
+def test_throttling_and_latency_injection():
+    slept = []
+    faults = FaultInjector(sleep=slept.append)
+    table = FakeDynamoDB(faults).create_table("patches", "patchId")
+    faults.configure("dynamodb", latency_ms=20, throttle_first=1, operations={"GetItem"})
+
+    with pytest.raises(ClientError) as exc:
+        table.get_item(Key={"patchId": "p-1"})
+    assert _code(exc) == "ProvisionedThroughputExceededException"
+    table.get_item(Key={"patchId": "p-1"})
+    table.put_item(Item={"patchId": "p-1"})
+
+    assert slept == [0.02]
+    assert faults.stats()["calls"] == {"dynamodb.GetItem": 2, "dynamodb.PutItem": 1}
+
+
+def test_s3_list_paginates_and_multipart_enforces_part_size():
+    s3 = FakeS3()
+    for i in range(5):
+        s3.put_object(Bucket="b", Key=f"events/{i}", Body=b"x")
+    first = s3.list_objects_v2(Bucket="b", Prefix="events/", MaxKeys=2)
+    assert first["IsTruncated"] and first["KeyCount"] == 2
+    keys = [c["Key"] for c in first["Contents"]]
+    token = first["NextContinuationToken"]
+    while token:
+        page = s3.list_objects_v2(Bucket="b", Prefix="events/", MaxKeys=2, ContinuationToken=token)
+        keys += [c["Key"] for c in page["Contents"]]
+        token = page.get("NextContinuationToken")
+    assert keys == [f"events/{i}" for i in range(5)]
+
+    with pytest.raises(ClientError) as exc:
+        s3.get_object(Bucket="b", Key="missing")
+    assert _code(exc) == "NoSuchKey"
+
+    upload = s3.create_multipart_upload(Bucket="b", Key="big.gz")["UploadId"]
+    parts = [{"PartNumber": n, "ETag": s3.upload_part(Bucket="b", Key="big.gz", PartNumber=n,
+                                                     UploadId=upload, Body=body)["ETag"]}
+             for n, body in ((1, b"a" * 10), (2, b"b"))]
+    with pytest.raises(ClientError) as exc:
+        s3.complete_multipart_upload(Bucket="b", Key="big.gz", UploadId=upload,
+                                     MultipartUpload={"Parts": parts})
+    assert _code(exc) == "EntityTooSmall"
+
+
+def test_installed_backend_serves_the_app(fake_backend):
+    import agent
+    import tools
+
+    fake_backend.load("PATCHES_TABLE_NAME", [{"patchId": "p-1", "severity": "CRITICAL"}])
+    fake_backend.bedrock.queue(tool_use_response("list_patches"), text_response("One patch."))
+
+    resp = agent.lambda_handler({"httpMethod": "POST", "body": '{"prompt": "What is pending?"}'}, None)
+
+    assert resp["statusCode"] == 200
+    assert "One patch." in resp["body"]
+    assert tools.list_patches()["patches"][0]["patchId"] == "p-1"
+    assert fake_backend.faults.calls["bedrock.Converse"] == 2
+    assert fake_backend.faults.calls["dynamodb.Scan"] >= 2
+
+
+def test_events_round_trip_through_archive(fake_backend):
+    import event_archive
+    from datetime import date
+
+    events = fake_backend.table("EVENTS_TABLE_NAME")
+    events.put_item(Item={"eventId": "e-1", "timestamp": "2024-05-01T10:00:00Z", "source": "test"})
+    result = event_archive.compact_day(events, fake_backend.s3, "ipo-event-archive", date(2024, 5, 1))
+
+    body = fake_backend.s3.get_object(Bucket="ipo-event-archive", Key=result["key"])["Body"].read()
+    assert b'"eventId":"e-1"' in gzip.decompress(body)
@@ -0,0 +1,47 @@
+import pytest
+
+from scripts import load_test
+
+
+def test_parse_mix_weights_and_defaults():
+    assert load_test.parse_mix("list_patches=3, prompt") == {"list_patches": 3.0, "prompt": 1.0}
+    with pytest.raises(ValueError):
+        load_test.parse_mix("list_patches=0")
+
+
+def test_classify_spots_throttles_and_errors():
+    assert load_test.classify(200, '{"patches": []}') == "ok"
+    assert load_test.classify(429, "Too Many Requests") == "throttled"
+    assert load_test.classify(500, '{"error": "ThrottlingException"}') == "throttled"
+    assert load_test.classify(200, '{"status": "error", "message": "x"}') == "error"
+
+
+def test_summarize_builds_histogram_and_timeline():
+    results = [(0.1, "list_patches", 3.0, "ok"), (0.5, "list_patches", 40.0, "error"),
+               (1.2, "prompt", 900.0, "throttled")]
+    report = load_test.summarize(results, duration=2.0, interval=1.0)
+
+    assert report["requests"] == 3
+    assert report["throughputRps"] == 1.5
+    assert report["errorRate"] == pytest.approx(1 / 3, abs=1e-3)
+    assert report["latency"]["buckets"] == {"<=5ms": 1, "<=50ms": 1, "<=1000ms": 1}
+    assert [s["requests"] for s in report["timeline"]] == [2, 1]
+    assert report["actions"]["prompt"]["p99Ms"] == 900.0
+
+
+def test_local_open_loop_run(tmp_path):
+    report = load_test.main(["--local", "--rps", "40", "--duration", "0.5", "--seed-size", "50",
+                             "--mix", "list_patches=2,list_events=1",
+                             "--output", str(tmp_path / "load.json")])
+
+    assert 15 <= report["requests"] <= 25
+    assert report["errorRate"] == 0
+    assert set(report["actions"]) <= {"list_patches", "list_events"}
+    assert (tmp_path / "load.json").exists()
+
+
+def test_local_target_only_offers_patches_run_sandbox_accepts():
+    target = load_test.LocalTarget(seed_size=200)
+    patch_ids = target.patch_ids()
+    statuses = {item["patchId"]: item["status"] for item in target.backend.table("PATCHES_TABLE_NAME").all_items()}
+    assert patch_ids and all(statuses[pid] in load_test.SANDBOX_STATUSES for pid in patch_ids)
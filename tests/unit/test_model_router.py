@@ -0,0 +1,97 @@
+from unittest import mock
+
+import pytest
+
+import model_router
+import resilience
+
+
+class Throttled(Exception):
+    def __init__(self):
+        super().__init__("slow down")
+        self.response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _router(client, clock):
+    return model_router.ModelRouter(
+        lambda: client, standard_models=["big", "backup"], fast_models=["small", "big"],
+        sleep=clock.sleep, clock=clock)
+
+
+def test_classify_prompt():
+    assert model_router.classify_prompt("list pending patches") == model_router.FAST
+    assert model_router.classify_prompt(
+        "Explain the rollout risk of CVE-2025-1 for our payment hosts") == model_router.STANDARD
+
+
+def test_falls_back_on_throttle_and_records_route():
+    clock = FakeClock()
+    client = mock.Mock()
+    client.converse.side_effect = [Throttled(), {"output": "ok"}]
+
+    response, route = _router(client, clock).converse(model_router.FAST, messages=[])
+
+    assert response == {"output": "ok"}
+    assert route["model"] == "big"
+    assert route["throttled"] == ["small"]
+    assert [c.kwargs["modelId"] for c in client.converse.call_args_list] == ["small", "big"]
+
+
+def test_backs_off_when_every_model_is_throttled():
+    clock = FakeClock()
+    client = mock.Mock()
+    client.converse.side_effect = [Throttled(), Throttled(), {"output": "ok"}]
+
+    _, route = _router(client, clock).converse(model_router.STANDARD, messages=[])
+
+    assert route["model"] == "big"
+    assert route["attempts"] == 2
+    assert clock.now > 0
+
+
+def test_non_throttle_errors_propagate():
+    client = mock.Mock()
+    client.converse.side_effect = ValueError("bad request")
+    with pytest.raises(ValueError):
+        _router(client, FakeClock()).converse(messages=[])
+
+
+def test_no_attempt_raises_a_real_error():
+    clock = FakeClock()
+    client = mock.Mock()
+    router = model_router.ModelRouter(lambda: client, standard_models=["big"], max_attempts=0,
+                                      sleep=clock.sleep, clock=clock)
+    with pytest.raises(RuntimeError, match="no attempts"):
+        router.converse(messages=[])
+    client.converse.assert_not_called()
+
+
+def test_open_breaker_falls_through_to_next_model():
+    clock = FakeClock()
+    client = mock.Mock()
+    client.converse.side_effect = [resilience.CircuitOpen("bedrock:big is unavailable"), {"output": "ok"}]
+
+    response, route = _router(client, clock).converse(model_router.STANDARD, messages=[])
+
+    assert response == {"output": "ok"}
+    assert route["model"] == "backup"
+    assert route["throttled"] == ["big"]
+
+
+def test_deadline_exceeded_is_not_retried():
+    client = mock.Mock()
+    client.converse.side_effect = resilience.DeadlineExceeded("out of time")
+    with pytest.raises(resilience.DeadlineExceeded):
+        _router(client, FakeClock()).converse(messages=[])
+    assert client.converse.call_count == 1
@@ -0,0 +1,144 @@
+import json
+import time
+
+import pytest
+
+import agent
+import patch_snapshot
+import tools
+
+NOW = 1_717_200_000.0  # 2024-06-01
+DAY = 86400
+
+
+def iso(ts):
+    from datetime import datetime
+    return datetime.utcfromtimestamp(ts).isoformat() + 'Z'
+
+
+PATCHES = [
+    {"patchId": "p-1", "cve": "CVE-2023-1", "status": "PENDING", "severity": "CRITICAL", "vendor": "acme",
+     "createdAt": iso(NOW - 30 * DAY), "updatedAt": iso(NOW - 30 * DAY)},
+    {"patchId": "p-2", "cve": "CVE-2024-2", "status": "PENDING", "severity": "CRITICAL", "vendor": "acme",
+     "createdAt": iso(NOW - 10 * DAY), "updatedAt": iso(NOW - 10 * DAY)},
+    {"patchId": "p-3", "cve": "CVE-2024-3", "status": "PENDING", "severity": "CRITICAL", "vendor": "globex",
+     "createdAt": iso(NOW - 1 * DAY), "updatedAt": iso(NOW - 1 * DAY)},
+    {"patchId": "p-4", "cve": "CVE-2024-4", "status": "ANALYZED", "severity": "HIGH", "vendor": "acme",
+     "impactScore": 80, "createdAt": iso(NOW - 20 * DAY), "updatedAt": iso(NOW - 2 * DAY)},
+    {"patchId": "p-5", "cve": "CVE-2024-5", "status": "ANALYZED", "severity": "CRITICAL", "vendor": "globex",
+     "impactScore": 95, "createdAt": iso(NOW - 20 * DAY), "updatedAt": iso(NOW - 2 * DAY)},
+]
+
+
+@pytest.fixture(params=["numpy", "array"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(patch_snapshot, "np", None)
+    return request.param
+
+
+@pytest.fixture
+def snapshot():
+    snap = patch_snapshot.PatchSnapshot()
+    for item in PATCHES:
+        snap.upsert(item)
+    return snap
+
+
+def test_old_critical_pending_grouped_by_cve_year(engine, snapshot):
+    result = snapshot.query({"severity": "CRITICAL", "status": "PENDING", "older_than_days": 7,
+                             "group_by": "cve_year"}, now=NOW)
+    assert result["matched"] == 2
+    assert result["groups"] == [{"key": {"cve_year": 2023}, "count": 1},
+                                {"key": {"cve_year": 2024}, "count": 1}]
+
+
+def test_group_by_two_columns_aggregates_scores(engine, snapshot):
+    result = snapshot.query({"status": "ANALYZED", "group_by": ["status", "vendor"]}, now=NOW)
+    assert result["groups"] == [
+        {"key": {"status": "ANALYZED", "vendor": "acme"}, "count": 1, "avgScore": 80.0, "maxScore": 80.0},
+        {"key": {"status": "ANALYZED", "vendor": "globex"}, "count": 1, "avgScore": 95.0, "maxScore": 95.0},
+    ]
+
+
+def test_ids_are_ranked_by_score_and_unscored_rows_fail_score_filters(engine, snapshot):
+    assert snapshot.query({"min_score": 50}, now=NOW)["patchIds"] == ["p-5", "p-4"]
+    assert snapshot.query({"vendor": "acme", "limit": 2}, now=NOW)["patchIds"] == ["p-4", "p-1"]
+    assert snapshot.query({"severity": "LOW"}, now=NOW) == {"matched": 0, "patchIds": []}
+
+
+def test_upsert_overwrites_the_existing_row(snapshot):
+    snapshot.upsert(dict(PATCHES[0], status="ANALYZED", impactScore=70, updatedAt=iso(NOW)))
+    assert len(snapshot) == len(PATCHES)
+    assert snapshot.query({"status": "ANALYZED"}, now=NOW)["matched"] == 3
+    assert snapshot.high_water == iso(NOW)
+
+
+def test_action_refreshes_incrementally_from_updated_at(fake_backend, monkeypatch):
+    monkeypatch.setattr(patch_snapshot, "_snapshot", None)
+    monkeypatch.setattr(patch_snapshot, "SNAPSHOT_REFRESH_SECONDS", 0)
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+
+    def query(params):
+        resp = agent.lambda_handler({"httpMethod": "POST", "body": json.dumps(dict(params, action="query_patches"))}, None)
+        return json.loads(resp["body"])
+
+    assert query({"status": "ANALYZED"})["matched"] == 2
+    fake_backend.faults.reset_counters()
+
+    # prioritize stamps updatedAt, so the next query sees the scored patch
+    tools.prioritize_patch("CVE-2023-1")
+    fake_backend.faults.reset_counters()
+    body = query({"status": "ANALYZED"})
+    assert body["matched"] == 3
+    assert body["snapshot"]["rows"] == len(PATCHES)
+    assert fake_backend.faults.stats()["calls"]["dynamodb.Scan"] == 1
+
+
+def test_unknown_group_is_rejected(fake_backend, monkeypatch):
+    monkeypatch.setattr(patch_snapshot, "_snapshot", None)
+    result = patch_snapshot.query_patches({"group_by": "owner"})
+    assert result["status"] == "error"
+
+
+def test_refresh_picks_up_late_commits_stamped_before_the_high_water(fake_backend, monkeypatch):
+    monkeypatch.setattr(patch_snapshot, "_snapshot", None)
+    table = tools.get_table("PATCHES_TABLE_NAME")
+    now = time.time()
+    fake_backend.load("PATCHES_TABLE_NAME", [
+        {"patchId": "p-new", "cve": "CVE-2024-9", "status": "PENDING", "updatedAt": iso(now)}])
+    snap = patch_snapshot._refresh(table, now)
+    assert snap.high_water == iso(now)
+
+    # Another Lambda stamped this write a second before our scan, but committed it after
+    table.put_item(Item={"patchId": "p-late", "cve": "CVE-2024-8", "status": "ANALYZED",
+                         "updatedAt": iso(now - 1)})
+    snap = patch_snapshot._refresh(table, now + patch_snapshot.SNAPSHOT_REFRESH_SECONDS)
+    assert snap.query({"status": "ANALYZED"}, now=now)["patchIds"] == ["p-late"]
+
+
+def test_deleted_patch_leaves_the_snapshot_on_the_next_refresh(fake_backend, monkeypatch):
+    monkeypatch.setattr(patch_snapshot, "_snapshot", None)
+    table = tools.get_table("PATCHES_TABLE_NAME")
+    now = time.time()
+    fake_backend.load("PATCHES_TABLE_NAME", PATCHES)
+    assert len(patch_snapshot._refresh(table, now)) == len(PATCHES)
+
+    tools.delete_patch("p-4")
+    snap = patch_snapshot._refresh(table, now + patch_snapshot.SNAPSHOT_REFRESH_SECONDS)
+    assert len(snap) == len(PATCHES) - 1
+    assert snap.query({"status": "ANALYZED"}, now=NOW)["patchIds"] == ["p-5"]
+
+
+@pytest.mark.parametrize("limit", ["0", "-5", "ten", ["1"]])
+def test_invalid_limit_is_rejected(fake_backend, monkeypatch, limit):
+    monkeypatch.setattr(patch_snapshot, "_snapshot", None)
+    result = patch_snapshot.query_patches({"limit": limit})
+    assert result["status"] == "error" and "limit" in result["message"]
+
+
+def test_limit_is_clamped(snapshot, monkeypatch):
+    monkeypatch.setattr(patch_snapshot, "QUERY_MAX_IDS", 2)
+    assert len(snapshot.query({"limit": "100000"}, now=NOW)["patchIds"]) == 2
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import cve_ingest
+import patch_state
+import summary
+import tools
+
+ENTRIES = [{"cve": "CVE-2024-0001", "description": "a", "severity": "CRITICAL"},
+           {"cve": "CVE-2024-0002", "description": "b", "severity": "LOW", "product": "openssl"},
+           {"cve": "cve-2024-0001", "description": "a again", "severity": "CRITICAL"}]
+
+
+def test_patch_ids_are_derived_from_cve_and_product():
+    assert patch_state.patch_id_for("CVE-2024-1") == patch_state.patch_id_for(" cve-2024-1 ")
+    assert patch_state.patch_id_for("CVE-2024-1", "openssl") != patch_state.patch_id_for("CVE-2024-1", "nginx")
+    assert patch_state.patch_id_for("CVE-2024-1").startswith("p-")
+
+
+def test_repeated_ingest_runs_do_not_duplicate_patches(fake_backend):
+    patches = fake_backend.table("PATCHES_TABLE_NAME")
+    summary_table = fake_backend.table("SUMMARY_TABLE_NAME")
+
+    assert cve_ingest.write_entries(ENTRIES, patches, summary_table) == 2
+    assert cve_ingest.write_entries(ENTRIES, patches, summary_table) == 0
+
+    items = patches.all_items()
+    assert len(items) == 2 and all(item["revision"] == 1 for item in items)
+    assert summary.read_summary(summary_table)["byStatus"]["PENDING"] == 2
+
+
+def test_concurrent_prioritize_scores_each_patch_once(fake_backend):
+    cve_ingest.write_entries([{"cve": f"CVE-2024-{i:04d}", "severity": "HIGH"} for i in range(6)],
+                             fake_backend.table("PATCHES_TABLE_NAME"), fake_backend.table("SUMMARY_TABLE_NAME"))
+    fake_backend.faults.configure("dynamodb", latency_ms=2)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: tools.prioritize_patch("next"), range(8)))
+
+    scored = [r["patchId"] for r in results if "patchId" in r]
+    assert len(scored) == len(set(scored)) == 6
+    assert sum(r.get("status") == "error" for r in results) == 2
+    counts = summary.read_summary(fake_backend.table("SUMMARY_TABLE_NAME"))["byStatus"]
+    assert counts["ANALYZED"] == 6 and counts["PENDING"] == 0
+    items = fake_backend.table("PATCHES_TABLE_NAME").all_items()
+    assert all(item["status"] == "ANALYZED" and item["revision"] == 2 for item in items)
+
+
+def test_transitions_check_status_and_revision(fake_backend):
+    table = fake_backend.table("PATCHES_TABLE_NAME")
+    patch_state.create(table, {"patchId": "p-1", "status": "PENDING"})
+
+    with pytest.raises(patch_state.Conflict):
+        patch_state.transition(table, "p-1", "SANDBOX_TESTING", "2024-01-01T00:00:00Z")
+    old = patch_state.transition(table, "p-1", "ANALYZED", "2024-01-01T00:00:00Z", revision=1)
+    assert old["status"] == "PENDING"
+    # A writer holding the old revision loses
+    with pytest.raises(patch_state.Conflict):
+        patch_state.transition(table, "p-1", "SANDBOX_TESTING", "2024-01-01T00:00:01Z", revision=1)
+    # Transitions never create patches
+    with pytest.raises(patch_state.Conflict):
+        patch_state.transition(table, "p-missing", "ANALYZED", "2024-01-01T00:00:00Z")
+    assert table.get_item(Key={"patchId": "p-missing"}).get("Item") is None
+
+
+def test_sandbox_test_requires_an_analyzed_patch(fake_backend, monkeypatch):
+    monkeypatch.setattr(tools.time, "sleep", lambda seconds: None)
+    table = fake_backend.table("PATCHES_TABLE_NAME")
+    patch_state.create(table, {"patchId": "p-1", "status": "PENDING"})
+    patch_state.create(table, {"patchId": "p-2", "status": "ANALYZED"})
+
+    assert tools.run_sandbox_test("p-1")["status"] == "error"
+    assert tools.run_sandbox_test("p-2")["testResult"] in ("PASS", "FAIL")
+
+    item = table.get_item(Key={"patchId": "p-2"})["Item"]
+    assert item["status"] in ("SANDBOX_PASSED", "SANDBOX_FAILED") and item["revision"] == 3
+
+
+def test_failed_writes_are_reported_not_swallowed(fake_backend, monkeypatch):
+    monkeypatch.setattr(tools.time, "sleep", lambda seconds: None)
+    table = fake_backend.table("PATCHES_TABLE_NAME")
+    patch_state.create(table, {"patchId": "p-1", "status": "PENDING", "severity": "HIGH"})
+    patch_state.create(table, {"patchId": "p-2", "status": "ANALYZED", "impactScore": 80})
+    fake_backend.faults.configure("dynamodb", throttle_rate=1.0, operations=["UpdateItem"])
+
+    result = tools.prioritize_patch("next")
+    assert result["status"] == "error" and "p-1" in result["message"]
+    result = tools.run_sandbox_test("p-2")
+    assert result["status"] == "error" and "start" in result["message"]
+    assert table.get_item(Key={"patchId": "p-2"})["Item"]["status"] == "ANALYZED"
@@ -0,0 +1,66 @@
+import base64
+import json
+
+import pytest
+
+import profiling
+
+
+def handler(event, context):
+    data = [str(i) for i in range(2000)]
+    return {"statusCode": 200, "headers": {}, "body": json.dumps({"count": len(data)})}
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SINK", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(profiling, "PROFILE_ALLOW_REQUEST_FLAG", True)
+    return tmp_path
+
+
+def test_disabled_hook_returns_handler_unchanged(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(profiling, "PROFILE_ALLOW_REQUEST_FLAG", False)
+    assert profiling.profiled(handler) is handler
+
+
+def test_unflagged_request_is_not_profiled(sink):
+    resp = profiling.profiled(handler)({"httpMethod": "POST", "body": json.dumps({"action": "list_patches"})}, None)
+    assert "X-Profile-Location" not in resp["headers"]
+    assert list(sink.iterdir()) == []
+
+
+def test_body_flag_writes_profile_and_report(sink):
+    event = {"httpMethod": "POST", "body": json.dumps({"action": "list_patches", "profile": True})}
+    resp = profiling.profiled(handler)(event, None)
+
+    location = resp["headers"]["X-Profile-Location"]
+    assert location.startswith(str(sink)) and location.endswith(".json")
+    assert len(list(sink.glob("*list_patches*.prof"))) == 1
+    with open(location) as f:
+        report = json.load(f)
+    assert report["label"] == "list_patches"
+    assert report["memory"]["peakKiB"] > 0
+    assert report["topAllocators"]
+    assert "handler" in report["stats"]
+
+
+def test_sampling_profiles_get_routes_to_s3(fake_backend, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SINK", "s3://ipo-compliance/profiles")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    resp = profiling.profiled(handler)({"httpMethod": "GET", "resource": "/patches"}, None)
+
+    assert resp["headers"]["X-Profile-Location"].startswith("s3://ipo-compliance/profiles/")
+    keys = [o["Key"] for o in fake_backend.s3.list_objects_v2(Bucket="ipo-compliance", Prefix="profiles/")["Contents"]]
+    assert len(keys) == 2
+    assert all("-patches-" in key for key in keys)
+
+
+def test_base64_body_flag_is_honoured(sink):
+    # binary_media_types=["*/*"] makes API Gateway base64-encode every POST body
+    raw = json.dumps({"action": "run_sandbox", "profile": True}).encode()
+    event = {"httpMethod": "POST", "isBase64Encoded": True, "body": base64.b64encode(raw).decode()}
+    resp = profiling.profiled(handler)(event, None)
+
+    assert "-run_sandbox-" in resp["headers"]["X-Profile-Location"]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import agent
+import projection
+import tools
+
+
+def patches(n):
+    return [{"patchId": f"p-{i}", "cve": f"CVE-2024-{i}", "severity": "HIGH", "status": "PENDING",
+             "description": "x" * 1000, "updatedAt": f"2024-01-01T00:00:{i:02d}.000000Z"} for i in range(n)]
+
+
+def test_resolve_defaults_custom_and_all():
+    read, returned = projection.resolve(None, "patches")
+    assert "description" not in read and "updatedAt" in read
+    # The key is always returned; the version and tombstone attributes are read but not returned
+    assert projection.resolve("status, impactScore", "patches") == (
+        ["patchId", "status", "impactScore", "updatedAt", "deleted"], ["patchId", "status", "impactScore"])
+    assert projection.resolve("*", "patches") == (None, None)
+    with pytest.raises(ValueError):
+        projection.resolve("status,a.b[0]", "patches")
+
+
+def test_list_patches_returns_only_the_requested_fields(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", patches(20))
+
+    result = tools.list_patches(fields=["status"])
+    assert all(set(p) == {"patchId", "status"} for p in result["patches"])
+    # The version still comes from updatedAt, read but not returned
+    assert result["version"] == "2024-01-01T00:00:19.000000Z"
+
+    assert all("description" not in p for p in tools.list_patches()["patches"])
+    assert all("description" in p for p in tools.list_patches(fields="*")["patches"])
+    assert tools.list_patches(fields="bad name")["status"] == "error"
+
+
+def test_default_fields_shrink_the_read_payload(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", patches(50))
+    fake_backend.faults.reset_counters()
+    tools.list_patches(fields="*")
+    full = fake_backend.faults.stats()["bytes"]["dynamodb"]
+    fake_backend.faults.reset_counters()
+    tools.list_patches()
+    assert fake_backend.faults.stats()["bytes"]["dynamodb"] < full / 5
+
+
+def test_delta_sync_honours_fields(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", patches(5))
+    result = tools.list_patches(since="2024-01-01T00:00:02Z", fields="severity")
+    assert [p["patchId"] for p in result["patches"]] == ["p-3", "p-4"]
+    assert all(set(p) == {"patchId", "severity"} for p in result["patches"])
+    assert result["version"] == "2024-01-01T00:00:04.000000Z"
+
+
+def test_get_route_passes_fields(fake_backend):
+    fake_backend.load("EVENTS_TABLE_NAME", [{"eventId": "e-1", "timestamp": "2024-01-01T00:00:00Z",
+                                             "source": "sandbox", "message": "m", "expiresAt": 1}])
+    resp = agent.lambda_handler({"httpMethod": "GET", "resource": "/events",
+                                 "queryStringParameters": {"fields": "source"}}, None)
+    assert json.loads(resp["body"])["events"] == [{"eventId": "e-1", "source": "sandbox"}]
+
+
+def test_prioritize_counts_critical_assets_without_reading_them(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", [{**patches(1)[0], "description": "x" * 5000}])
+    fake_backend.load("ASSETS_TABLE_NAME", [{"assetId": "a-1", "businessCriticality": "high", "notes": "y" * 5000}])
+    fake_backend.faults.reset_counters()
+
+    assert tools.prioritize_patch("next")["impactScore"] == 65
+    # Only the score write is sized by the whole item; reading the
+    # description and the asset as well would add another 10 KB
+    assert fake_backend.faults.stats()["bytes"]["dynamodb"] < 8000
+
+
+def test_dashboard_payload_keeps_patch_descriptions(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", patches(3))
+    resp = agent.lambda_handler({"httpMethod": "GET", "resource": "/dashboard"}, None)
+    listed = json.loads(resp["body"])["results"]["list_patches"]["body"]["patches"]
+    # The queue items render the description, so the dashboard asks for it
+    assert [p["description"] for p in listed] == ["x" * 1000] * 3
+    assert all(set(p) <= set(projection.PATCH_QUEUE_FIELDS) for p in listed)
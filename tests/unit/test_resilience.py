@@ -0,0 +1,205 @@
+import json
+import threading
+import time
+import types
+
+import pytest
+
+import agent
+import cve_ingest
+import model_router
+import resilience
+from tests.fakes.bedrock import text_response
+from tests.fakes.faults import client_error
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    resilience.reset()
+    yield
+    resilience.reset()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_on_unhealthy_failures_and_recovers_after_a_trial():
+    clock = Clock()
+    breaker = resilience.CircuitBreaker("dep", failure_threshold=3, reset_seconds=10, clock=clock)
+
+    def fail(code, status):
+        raise client_error(code, "boom", "GetItem", status)
+
+    # Request errors say nothing about the dependency's health
+    for _ in range(5):
+        with pytest.raises(Exception):
+            breaker.call(fail, "ValidationException", 400)
+    assert breaker.state == breaker.CLOSED
+
+    for _ in range(3):
+        with pytest.raises(Exception):
+            breaker.call(fail, "InternalServerError", 500)
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(resilience.CircuitOpen):
+        breaker.call(lambda: "not called")
+
+    clock.now = 10
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == breaker.CLOSED
+    assert resilience.stats()["dep"] == {"calls": 9, "failures": 3, "opened": 1, "rejected": 1}
+
+
+def test_failed_trial_reopens_the_breaker():
+    clock = Clock()
+    breaker = resilience.CircuitBreaker("dep", failure_threshold=1, reset_seconds=5, clock=clock)
+    with pytest.raises(TimeoutError):
+        breaker.call(lambda: (_ for _ in ()).throw(TimeoutError()))
+    clock.now = 5
+    with pytest.raises(TimeoutError):
+        breaker.call(lambda: (_ for _ in ()).throw(TimeoutError()))
+    assert breaker.state == breaker.OPEN
+
+
+def test_guarded_table_stops_calling_once_the_deadline_passes(fake_backend):
+    import tools
+
+    table = tools.get_table("PATCHES_TABLE_NAME")
+    with resilience.deadline(0):
+        with pytest.raises(resilience.DeadlineExceeded):
+            table.get_item(Key={"patchId": "p-1"})
+    assert fake_backend.faults.stats()["calls"].get("dynamodb.GetItem", 0) == 0
+    # Attributes pass straight through the proxy
+    assert table.table_name == "IPO-Patches"
+
+
+def test_nested_deadlines_only_shorten():
+    with resilience.deadline(5):
+        with resilience.deadline(60):
+            assert resilience.remaining() <= 5
+        assert resilience.timeout(10) <= 5
+    assert resilience.remaining() is None and resilience.timeout(10) == 10
+
+
+def test_hedged_read_returns_the_faster_attempt():
+    calls = []
+    lock = threading.Lock()
+
+    def read():
+        with lock:
+            calls.append(None)
+            first = len(calls) == 1
+        time.sleep(0.5 if first else 0)
+        return "slow" if first else "fast"
+
+    assert resilience.hedged("dynamodb", read, delay_ms=20) == "fast"
+    assert resilience.stats()["dynamodb"] == {"hedged": 1, "hedgeWins": 1}
+    # Fast answers are never hedged
+    assert resilience.hedged("dynamodb", lambda: "quick", delay_ms=200) == "quick"
+    assert resilience.stats()["dynamodb"]["hedged"] == 1
+
+
+def test_agent_answers_503_while_bedrock_is_failing(fake_backend, monkeypatch):
+    monkeypatch.setattr(agent.router, "_sleep", lambda seconds: None)
+    error = client_error("ServiceUnavailableException", "down", "Converse", 503)
+    fake_backend.bedrock.queue(*[error] * 20)
+    event = {"httpMethod": "POST", "body": json.dumps({"prompt": "Summarise risk"})}
+
+    statuses = [agent.lambda_handler(event, None)["statusCode"] for _ in range(3)]
+
+    assert statuses[-1] == 503
+    models = {name: s["state"] for name, s in resilience.stats().items() if name.startswith("bedrock:")}
+    assert models and set(models.values()) == {resilience.CircuitBreaker.OPEN}
+    # Once every model's breaker is open, prompts fail fast without reaching Bedrock
+    calls = len(fake_backend.bedrock.requests)
+    assert agent.lambda_handler(event, None)["statusCode"] == 503
+    assert len(fake_backend.bedrock.requests) == calls
+
+
+def test_throttled_primary_still_falls_back_after_its_breaker_opens(fake_backend, monkeypatch):
+    router = agent.router
+    monkeypatch.setattr(router, "_sleep", lambda seconds: None)
+    monkeypatch.setattr(router, "base_backoff", 0.0)
+    monkeypatch.setattr(router, "_throttles", {})
+    monkeypatch.setattr(router, "_cooldown_until", {})
+    monkeypatch.setitem(router.chains, model_router.STANDARD, ["primary", "backup"])
+
+    def primary_unavailable(request):
+        if request["modelId"] == "primary":
+            raise client_error("ServiceUnavailableException", "down", "Converse", 503)
+        return text_response("from backup")
+
+    fake_backend.bedrock.default = primary_unavailable
+    event = {"httpMethod": "POST", "body": json.dumps({"prompt": "Summarise risk"})}
+
+    statuses = [agent.lambda_handler(event, None)["statusCode"]
+                for _ in range(resilience.BREAKER_FAILURE_THRESHOLD + 2)]
+
+    assert set(statuses) == {200}
+    assert resilience.breaker("bedrock:primary").state == resilience.CircuitBreaker.OPEN
+    assert resilience.breaker("bedrock:backup").state == resilience.CircuitBreaker.CLOSED
+    # With the primary's breaker open, only the backup is still called
+    calls = len(fake_backend.bedrock.requests)
+    assert agent.lambda_handler(event, None)["statusCode"] == 200
+    assert fake_backend.bedrock.models[calls:] == ["backup"]
+
+def test_handler_deadline_comes_from_the_lambda_context(fake_backend, capsys):
+    context = types.SimpleNamespace(get_remaining_time_in_millis=lambda: 1000)
+    resp = agent.lambda_handler({"httpMethod": "POST", "body": json.dumps({"prompt": "hi"})}, context)
+
+    # 1s left minus the margin leaves no budget for Bedrock
+    assert resp["statusCode"] == 503
+    assert fake_backend.bedrock.requests == []
+    line = [l for l in capsys.readouterr().out.splitlines() if l.startswith("RESILIENCE")][-1]
+    assert json.loads(line.split(" ", 1)[1])["bedrock"]["deadlineExceeded"] == 1
+
+
+def test_feed_download_timeout_is_capped_by_the_deadline(monkeypatch):
+    seen = {}
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"CVE_Items": []}
+
+    def fake_get(url, timeout):
+        seen["timeout"] = timeout
+        return Response()
+
+    monkeypatch.setattr(cve_ingest.requests, "get", fake_get)
+    with resilience.deadline(3):
+        assert cve_ingest.fetch_feed() == {"CVE_Items": []}
+    assert seen["timeout"] <= 3
+
+
+def test_calls_are_abandoned_at_the_deadline():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "late"
+
+    started = time.monotonic()
+    with resilience.deadline(0.1):
+        with pytest.raises(resilience.DeadlineExceeded):
+            resilience.bounded("bedrock", slow)
+    release.set()
+    assert time.monotonic() - started < 1
+    assert resilience.stats()["bedrock"] == {"deadlineExceeded": 1}
+    # Without a deadline, or with more time left than the read timeout, calls run inline
+    assert resilience.bounded("bedrock", lambda: threading.current_thread().name) == "MainThread"
+
+
+def test_client_config_limits_botocore_retries():
+    bedrock = resilience.client_config("bedrock")
+    dynamodb = resilience.client_config("dynamodb")
+    assert bedrock.retries == {"max_attempts": 1, "mode": "standard"}
+    assert dynamodb.retries == {"max_attempts": 2, "mode": "standard"}
+    assert dynamodb.read_timeout == resilience.READ_TIMEOUT_SECONDS["dynamodb"]
@@ -0,0 +1,40 @@
+import base64
+import gzip
+import json
+from decimal import Decimal
+
+import responses
+
+
+def _items(n):
+    return [{"patchId": f"p-{i}", "impactScore": Decimal(80), "epss": Decimal("0.25"),
+             "tags": {"a"}, "status": "PENDING"} for i in range(n)]
+
+
+def test_decimal_and_set_conversion():
+    resp = responses.make_response(200, {"patches": _items(1)})
+    body = json.loads(resp["body"])
+    assert body["patches"][0]["impactScore"] == 80
+    assert isinstance(body["patches"][0]["impactScore"], int)
+    assert body["patches"][0]["epss"] == 0.25
+    assert body["patches"][0]["tags"] == ["a"]
+    assert "isBase64Encoded" not in resp
+
+
+def test_large_body_gzipped_only_when_accepted():
+    payload = {"patches": _items(2000)}
+    plain = responses.make_response(200, payload, {"headers": {}})
+    assert "Content-Encoding" not in plain["headers"]
+
+    event = {"headers": {"accept-encoding": "gzip, deflate, br"}}
+    packed = responses.make_response(200, payload, event)
+    assert packed["isBase64Encoded"] is True
+    assert packed["headers"]["Content-Encoding"] == "gzip"
+    raw = gzip.decompress(base64.b64decode(packed["body"]))
+    assert json.loads(raw) == json.loads(plain["body"])
+    assert len(packed["body"]) < len(plain["body"]) / 4
+
+
+def test_small_body_not_compressed():
+    resp = responses.make_response(200, {"ok": True}, {"headers": {"Accept-Encoding": "gzip"}})
+    assert "Content-Encoding" not in resp["headers"]
@@ -0,0 +1,107 @@
+import json
+import random
+import time
+
+import agent
+import scheduler
+
+# 2024-01-07 00:00 UTC, a Sunday
+SUNDAY = scheduler._epoch_hour('2024-01-07T00:00:00Z')
+
+
+def patch(pid, score, assets=(), created='2024-01-01T00:00:00Z'):
+    return {"patchId": pid, "impactScore": score, "createdAt": created, "affectedAssets": list(assets)}
+
+
+def ids(waves):
+    return [[p["patchId"] for p, _, _ in wave] for wave in waves]
+
+
+def test_waves_follow_impact_score_and_fill_every_slot():
+    patches = [patch(f"p-{i}", score) for i, score in enumerate([60, 95, 70, 80, 90])]
+    waves = scheduler.plan(patches, {}, SUNDAY, sandbox_slots=2)
+    assert ids(waves) == [["p-1", "p-4"], ["p-3", "p-2"], ["p-0"]]
+
+
+def test_asset_conflict_backfills_from_the_queue():
+    patches = [patch("p-a", 90, ["a-1"]), patch("p-b", 85, ["a-1", "a-2"]),
+               patch("p-c", 80, ["a-3"]), patch("p-d", 70, ["a-4"])]
+    waves = scheduler.plan(patches, {}, SUNDAY, sandbox_slots=2, asset_concurrency=1)
+    # p-b shares a-1 with p-a, so p-c takes its slot and p-b leads the next wave
+    assert ids(waves) == [["p-a", "p-c"], ["p-b", "p-d"]]
+
+
+def test_installs_land_in_the_next_free_maintenance_window():
+    assets = {"a-1": {"assetId": "a-1", "maintenanceWindow": {"day": "TUE", "startHour": 22, "hours": 4}}}
+    patches = [patch("p-a", 90, ["a-1"]), patch("p-b", 80, ["a-1"])]
+    waves = scheduler.plan(patches, assets, SUNDAY, sandbox_slots=1, sandbox_hours=2)
+
+    (_, first_start, first_end), = waves[0]
+    (_, second_start, _), = waves[1]
+    assert scheduler._iso(first_start) == "2024-01-09T22:00:00Z"
+    assert scheduler._iso(first_end) == "2024-01-10T02:00:00Z"
+    # Only one patch per asset per window, so the second waits a week
+    assert scheduler._iso(second_start) == "2024-01-16T22:00:00Z"
+
+
+def test_plan_rollout_action_reads_analyzed_patches(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", [
+        dict(patch("p-1", 90, ["a-1"]), status="ANALYZED", cve="CVE-1"),
+        dict(patch("p-2", 75, ["a-1"]), status="ANALYZED", cve="CVE-2"),
+        dict(patch("p-3", 99), status="PENDING"),
+    ])
+    fake_backend.load("ASSETS_TABLE_NAME", [
+        {"assetId": "a-1", "maintenanceWindow": {"day": "SAT", "startHour": 1, "hours": 2}}])
+
+    resp = agent.lambda_handler({"httpMethod": "GET", "resource": "/rollout", "queryStringParameters": {
+        "start": "2024-01-07T00:00:00Z", "sandbox_slots": "4"}}, None)
+    body = json.loads(resp["body"])
+
+    assert body["plan"]["patches"] == 2
+    assert body["plan"]["waves"] == 2
+    assert [w["patches"][0]["patchId"] for w in body["waves"]] == ["p-1", "p-2"]
+    assert body["waves"][0]["patches"][0]["rolloutStart"] == "2024-01-13T01:00:00Z"
+    assert body["plan"]["completeBy"] == "2024-01-20T03:00:00Z"
+
+
+def test_plan_rollout_rejects_bad_parameters(fake_backend):
+    assert scheduler.plan_rollout({"sandbox_slots": "0"})["status"] == "error"
+
+
+def test_plans_ten_thousand_patches_over_fifty_thousand_assets_in_under_a_second():
+    rng = random.Random(7)
+    assets = {f"a-{j}": {"assetId": f"a-{j}", "maintenanceWindow": {
+        "day": scheduler.DAYS[j % 7], "startHour": j % 24, "hours": 2}} for j in range(50_000)}
+    # Every patch touches one shared asset plus three others: one patch per wave
+    # on the shared asset, and its installs stack up a week apart
+    patches = [patch(f"p-{i}", rng.random() * 100, ["a-0"] + [f"a-{j}" for j in rng.sample(range(1, 50_000), 3)])
+               for i in range(10_000)]
+
+    started = time.perf_counter()
+    waves = scheduler.plan(patches, assets, SUNDAY)
+    elapsed = time.perf_counter() - started
+
+    assert len(waves) == 10_000 and all(len(wave) == 1 for wave in waves)
+    assert elapsed < 1.0
+
+
+def test_naive_start_is_read_as_utc():
+    assert scheduler._epoch_hour("2024-01-07T00:00:00") == SUNDAY
+    assert scheduler._epoch_hour("2024-01-07T00:30:00") == SUNDAY + 1
+
+
+def test_plan_rollout_reads_only_referenced_assets(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", [
+        dict(patch(f"p-{i}", 50, [f"a-{i % 150}"]), status="ANALYZED", cve=f"CVE-{i}") for i in range(300)])
+    fake_backend.load("ASSETS_TABLE_NAME", [
+        {"assetId": f"a-{i}", "maintenanceWindow": {"day": "SAT", "startHour": 1, "hours": 2}}
+        for i in range(1000)])
+    fake_backend.faults.reset_counters()
+
+    body = scheduler.plan_rollout({"start": "2024-01-07T00:00:00Z"})
+    calls = fake_backend.faults.stats()["calls"]
+
+    assert body["plan"]["assets"] == 150
+    # 150 distinct keys take two BatchGetItem calls; only the patches table is scanned
+    assert calls["dynamodb.BatchGetItem"] == 2
+    assert calls["dynamodb.Scan"] == 1
@@ -0,0 +1,77 @@
+import summary
+import tools
+
+
+class CounterTable:
+    """Just enough of a DynamoDB table for ADD/SET update expressions."""
+
+    def __init__(self):
+        self.item = {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, ConditionExpression=None):
+        names = ExpressionAttributeNames or {}
+        adds, _, sets = UpdateExpression.partition(' SET ')
+        if adds.startswith('SET '):
+            adds, sets = '', adds[4:]
+        for clause in filter(None, adds[4:].split(', ')):
+            name, value = clause.split(' ')
+            name = names.get(name, name)
+            self.item[name] = self.item.get(name, 0) + ExpressionAttributeValues[value]
+        for clause in filter(None, sets.split(', ')):
+            name, value = clause.split(' = ')
+            self.item[names.get(name, name)] = ExpressionAttributeValues[value]
+
+    def get_item(self, Key):
+        return {"Item": dict(self.item)} if self.item else {}
+
+
+def test_counters_follow_patch_lifecycle():
+    table = CounterTable()
+    summary.record_patch_change(table, created=True, severity='CRITICAL', new_status='PENDING')
+    summary.record_patch_change(table, created=True, severity='HIGH', new_status='PENDING')
+    summary.record_patch_change(table, old_status='PENDING', new_status='ANALYZED', new_score=95)
+    summary.record_patch_change(table, old_status='ANALYZED', new_status='SANDBOX_TESTING')
+    summary.record_ingest(table, '2025-01-01T00:00:00Z')
+
+    result = summary.read_summary(table)
+
+    assert result['total'] == 2
+    assert result['bySeverity'] == {'CRITICAL': 1, 'HIGH': 1}
+    assert result['byStatus'] == {'PENDING': 1, 'ANALYZED': 0, 'SANDBOX_TESTING': 1}
+    assert result['byScoreBand'] == {'90-100': 1}
+    assert result['lastIngestAt'] == '2025-01-01T00:00:00Z'
+
+
+def test_empty_summary():
+    assert summary.read_summary(CounterTable())['total'] == 0
+    assert summary.score_band(50) == '50-74'
+
+
+def test_recompute_repairs_drifted_counters(fake_backend):
+    fake_backend.load("PATCHES_TABLE_NAME", [
+        {"patchId": "p-1", "status": "PENDING", "severity": "HIGH"},
+        {"patchId": "p-2", "status": "ANALYZED", "severity": "CRITICAL", "impactScore": 95},
+        {"patchId": "p-3", "severity": "LOW"},
+        {"patchId": "p-4", "deleted": True, "updatedAt": "2025-01-01T00:00:00Z"},
+    ])
+    table = fake_backend.table("SUMMARY_TABLE_NAME")
+    # A summary update lost after its patch write, and a status nobody holds any more
+    summary.record_patch_change(table, created=True, severity="HIGH", new_status="PENDING")
+    summary.record_patch_change(table, old_status="PENDING", new_status="SANDBOX_TESTING")
+    summary.record_ingest(table, "2025-01-02T00:00:00Z")
+
+    result = tools.recompute_summary()["summary"]
+
+    assert result["total"] == 3
+    assert result["byStatus"] == {"PENDING": 2, "ANALYZED": 1, "SANDBOX_TESTING": 0}
+    assert result["bySeverity"] == {"HIGH": 1, "CRITICAL": 1, "LOW": 1}
+    assert result["byScoreBand"] == {"90-100": 1}
+    assert result["lastIngestAt"] == "2025-01-02T00:00:00Z"
+
+
+def test_last_ingest_only_moves_forward(fake_backend):
+    table = fake_backend.table("SUMMARY_TABLE_NAME")
+    summary.record_ingest(table, "2025-01-02T00:00:00Z")
+    summary.record_ingest(table, "2025-01-01T00:00:00Z")
+    assert summary.read_summary(table)["lastIngestAt"] == "2025-01-02T00:00:00Z"
@@ -1,15 +1,152 @@
+import json
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
+import pytest
 
 from super_hacks.super_hacks_stack import SuperHacksStack
 
-# example tests. To run these tests, uncomment this file along with the example
-# resource in super_hacks/super_hacks_stack.py
-def test_sqs_queue_created():
+
+@pytest.fixture(scope="module")
+def template():
     app = core.App()
     stack = SuperHacksStack(app, "super-hacks")
-    template = assertions.Template.from_stack(stack)
+    return assertions.Template.from_stack(stack)
+
+
+def _function(template, handler):
+    functions = template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"Handler": handler}
+    })
+    assert len(functions) == 1, f"expected one function for {handler}"
+    return next(iter(functions.values()))["Properties"]
+
+
+def test_sqs_queue_created(template):
+    # Six times the ingest worker's two minute timeout
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "VisibilityTimeout": 720,
+        "RedrivePolicy": {"maxReceiveCount": 3},
+    })
+
+
+def test_api_function_has_own_memory_and_concurrency(template):
+    api = _function(template, "agent.lambda_handler")
+    assert api["Timeout"] == 30
+    assert api["MemorySize"] == 1024
+    assert api["ReservedConcurrentExecutions"] == 20
+
+
+def test_ingest_function_is_separate_and_right_sized(template):
+    ingest = _function(template, "cve_ingest.lambda_handler")
+    assert ingest["Timeout"] == 900
+    assert ingest["MemorySize"] == 2048
+    env = ingest["Environment"]["Variables"]
+    assert "INGEST_QUEUE_URL" in env
+    assert env["INGEST_CHUNK_SIZE"] == "25"
+
+
+def test_worker_consumes_queue_in_batches(template):
+    worker = _function(template, "cve_ingest.worker_handler")
+    assert worker["Timeout"] == 120
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 10,
+        "MaximumBatchingWindowInSeconds": 5,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"],
+        "ScalingConfig": {"MaximumConcurrency": 5},
+    })
+
+
+def _rule_targets(template):
+    return {rule["Properties"]["Targets"][0]["Arn"]["Fn::GetAtt"][0]
+            for rule in template.find_resources("AWS::Events::Rule").values()}
+
+
+def test_schedule_targets_ingest_function(template):
+    targets = _rule_targets(template)
+    assert any("IpoIngestFunction" in t for t in targets)
+    assert not any("IpoAgentFunction" in t for t in targets)
+
+
+def test_invoke_uses_proxy_integration(template):
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+        "HttpMethod": "POST",
+        "Integration": {"Type": "AWS_PROXY"},
+    })
+
+
+def test_read_routes_are_cached_by_query_string(template):
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+        "HttpMethod": "GET",
+        "Integration": {
+            "Type": "AWS_PROXY",
+            "CacheKeyParameters": assertions.Match.array_with(
+                ["method.request.querystring.limit"]),
+        },
+    })
+    stages = template.find_resources("AWS::ApiGateway::Stage")
+    stage = next(iter(stages.values()))["Properties"]
+    assert stage["CacheClusterEnabled"] is True
+    cached = {s["ResourcePath"] for s in stage["MethodSettings"] if s.get("CachingEnabled")}
+    assert {"/~1patches", "/~1events", "/~1dashboard"} <= cached
+    assert all(s["CacheTtlInSeconds"] == 30 for s in stage["MethodSettings"])
+
+
+def test_events_expire_and_are_archived(template):
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TimeToLiveSpecification": {"AttributeName": "expiresAt", "Enabled": True},
+    })
+    archive = _function(template, "event_archive.lambda_handler")
+    env = archive["Environment"]["Variables"]
+    assert int(env["EVENTS_ARCHIVE_AFTER_DAYS"]) < int(env["EVENTS_TTL_DAYS"])
+    assert any("IpoEventArchiveFunction" in t for t in _rule_targets(template))
+
+
+def test_websocket_api_pushes_events_from_every_event_writer(template):
+    template.has_resource_properties("AWS::ApiGatewayV2::Api", {"ProtocolType": "WEBSOCKET"})
+    routes = {r["Properties"]["RouteKey"] for r in template.find_resources("AWS::ApiGatewayV2::Route").values()}
+    assert {"$connect", "$disconnect", "$default", "subscribe"} <= routes
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [{"AttributeName": "connectionId", "KeyType": "HASH"}],
+        "TimeToLiveSpecification": {"AttributeName": "expiresAt", "Enabled": True},
+    })
+    assert "WS_CONNECTIONS_TABLE_NAME" in _function(template, "ws_handler.lambda_handler")["Environment"]["Variables"]
+    for handler in ("agent.lambda_handler", "cve_ingest.lambda_handler", "cve_ingest.worker_handler"):
+        env = _function(template, handler)["Environment"]["Variables"]
+        assert {"WS_CONNECTIONS_TABLE_NAME", "WS_CALLBACK_URL"} <= set(env)
+
+
+def test_exports_run_on_their_own_long_running_function(template):
+    export = _function(template, "export.lambda_handler")
+    assert export["Timeout"] == 900
+    assert "EXPORT_BUCKET_NAME" in export["Environment"]["Variables"]
+    api_env = _function(template, "agent.lambda_handler")["Environment"]["Variables"]
+    assert {"EXPORT_BUCKET_NAME", "EXPORT_FUNCTION_NAME"} <= set(api_env)
+    [rule] = [rule["Properties"] for rule in template.find_resources("AWS::Events::Rule").values()
+              if "IpoExportFunction" in rule["Properties"]["Targets"][0]["Arn"]["Fn::GetAtt"][0]]
+    assert sorted(json.loads(t["Input"])["table"] for t in rule["Targets"]) == ["assets", "patches"]
+
+
+def test_scoring_functions_read_the_exploit_intel_snapshots(template):
+    for handler in ("agent.lambda_handler", "cve_ingest.lambda_handler", "cve_ingest.worker_handler"):
+        env = _function(template, handler)["Environment"]["Variables"]
+        assert {"KEV_SOURCE", "EPSS_SOURCE", "EXPLOIT_INTEL_INDEX"} <= set(env)
+
+
+def test_exploit_index_is_rebuilt_when_a_snapshot_is_uploaded(template):
+    env = _function(template, "exploit_intel.lambda_handler")["Environment"]["Variables"]
+    assert {"KEV_SOURCE", "EPSS_SOURCE", "EXPLOIT_INTEL_INDEX"} <= set(env)
+    notifications = template.find_resources("Custom::S3BucketNotifications")
+    configs = next(iter(notifications.values()))["Properties"]["NotificationConfiguration"]
+    prefixes = [rule["Value"] for config in configs["LambdaFunctionConfigurations"]
+                for rule in config["Filter"]["Key"]["FilterRules"]]
+    assert prefixes == ["exploit-intel/known_exploited_vulnerabilities.json",
+                        "exploit-intel/epss_scores-current.csv.gz"]
+
 
-#     template.has_resource_properties("AWS::SQS::Queue", {
-#         "VisibilityTimeout": 300
-#     })
+def test_unwritable_events_have_a_replayed_fallback_queue(template):
+    for handler in ("agent.lambda_handler", "cve_ingest.lambda_handler", "cve_ingest.worker_handler"):
+        assert "EVENTS_FALLBACK_QUEUE_URL" in _function(template, handler)["Environment"]["Variables"]
+    replay = _function(template, "event_buffer.replay_handler")
+    assert "EVENTS_TABLE_NAME" in replay["Environment"]["Variables"]
+    template.has_resource_properties("AWS::SQS::Queue", {"RedrivePolicy": {"maxReceiveCount": 5}})
@@ -0,0 +1,64 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+import agent
+import tool_results
+
+
+def _patches(n):
+    return [{"patchId": f"p-{i}", "cve": f"CVE-2025-{i:05d}", "description": "d" * 1000,
+             "severity": "CRITICAL" if i % 3 == 0 else "HIGH", "status": "PENDING",
+             "impactScore": Decimal(i % 100)} for i in range(n)]
+
+
+def test_shape_projects_ranks_and_fits_budget():
+    shaped = tool_results.shape_tool_result({"patches": _patches(500)}, token_budget=800)
+
+    assert tool_results.estimate_tokens(shaped) <= 800
+    assert shaped["truncated"] is True
+    assert shaped["patches_summary"]["total"] == 500
+    assert shaped["patches_summary"]["by_severity"] == {"HIGH": 333, "CRITICAL": 167}
+    top = shaped["patches"][0]
+    assert "description" not in top
+    assert top["impactScore"] == 99
+
+
+def test_small_result_passes_through():
+    shaped = tool_results.shape_tool_result({"patchId": "p-1", "impactScore": Decimal(80)})
+    assert shaped == {"patchId": "p-1", "impactScore": 80}
+
+
+def test_agent_sends_shaped_result_to_model(monkeypatch):
+    bedrock = mock.Mock()
+    bedrock.converse.side_effect = [
+        {"output": {"message": {"role": "assistant", "content": [
+            {"toolUse": {"toolUseId": "t-1", "name": "list_patches", "input": {}}}]}}},
+        {"output": {"message": {"role": "assistant", "content": [{"text": "done"}]}}},
+    ]
+    monkeypatch.setattr(agent, "get_bedrock_client", lambda: bedrock)
+    monkeypatch.setattr("tools.list_patches", lambda: {"patches": _patches(1000)})
+
+    resp = agent.lambda_handler({"body": json.dumps({"prompt": "list patches"})}, None)
+
+    assert json.loads(resp["body"])["response"] == "done"
+    messages = bedrock.converse.call_args_list[1].kwargs["messages"]
+    sent = messages[2]["content"][0]["toolResult"]["content"][0]["json"]
+    assert tool_results.estimate_tokens(sent) <= tool_results.TOOL_RESULT_TOKEN_BUDGET
+    assert sent["patches_summary"]["total"] == 1000
+
+
+def test_budget_is_a_hard_cap():
+    # Summaries and scalar fields alone exceed the budget
+    result = {"patches": [{"patchId": f"p-{i}", "status": f"S{i}", "severity": f"V{i}"} for i in range(300)],
+              **{f"note{i}": "n" * 500 for i in range(10)}}
+    shaped = tool_results.shape_tool_result(result, token_budget=200)
+    assert tool_results.estimate_tokens(shaped) <= 200
+    assert shaped["truncated"] is True
+
+
+def test_clipped_strings_mark_the_result_truncated():
+    shaped = tool_results.shape_tool_result({"message": "m" * 5000}, token_budget=300)
+    assert shaped["message"].endswith("...")
+    assert shaped["truncated"] is True
+    assert tool_results.estimate_tokens(shaped) <= 300
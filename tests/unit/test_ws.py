@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import event_buffer
+import tools
+import ws_handler
+import ws_publisher
+
+
+@pytest.fixture
+def local_ws():
+    registry, sender = ws_publisher.MemoryRegistry(), ws_publisher.MemorySender()
+    ws_publisher.configure(registry, sender)
+    yield registry, sender
+    ws_publisher.configure()
+
+
+def ws_event(route, connection_id, body=None, query=None):
+    return {"requestContext": {"routeKey": route, "connectionId": connection_id},
+            "body": json.dumps(body) if body is not None else None, "queryStringParameters": query}
+
+
+def pushed(sender, connection_id):
+    return [e for data in sender.sent.get(connection_id, []) for e in json.loads(data)["events"]]
+
+
+def test_handler_tracks_connections_and_filters(local_ws):
+    registry, _ = local_ws
+    assert ws_handler.lambda_handler(ws_event("$connect", "c-1", query={"sources": "sandbox"}), None)["statusCode"] == 200
+    ws_handler.lambda_handler(ws_event("$connect", "c-2"), None)
+    resp = ws_handler.lambda_handler(ws_event("subscribe", "c-2", {"action": "subscribe", "patchIds": ["p-1"]}), None)
+    assert json.loads(resp["body"]) == {"subscribed": {"sources": [], "patchIds": ["p-1"]}}
+    assert registry.connections() == {"c-1": {"sources": {"sandbox"}, "patchIds": set()},
+                                      "c-2": {"sources": set(), "patchIds": {"p-1"}}}
+
+    assert ws_handler.lambda_handler(ws_event("$default", "c-1", {"hello": 1}), None)["statusCode"] == 400
+    ws_handler.lambda_handler(ws_event("$disconnect", "c-1"), None)
+    assert set(registry.connections()) == {"c-2"}
+
+
+def test_publish_sends_each_connection_its_matching_events(local_ws, monkeypatch):
+    registry, sender = local_ws
+    registry.add("all")
+    registry.add("sandbox", sources=["sandbox"])
+    registry.add("p-9", patch_ids="p-9")
+    registry.add("none", sources=["cve_ingest"])
+    monkeypatch.setattr(ws_publisher, "WS_MAX_MESSAGE_EVENTS", 2)
+    events = [{"source": "sandbox", "patchId": f"p-{i}", "message": str(i)} for i in range(5)]
+
+    result = ws_publisher.publish(events)
+
+    assert result == {"connections": 2, "messages": 6, "gone": 0}
+    assert len(sender.sent["all"]) == 3 and len(pushed(sender, "all")) == 5
+    assert len(pushed(sender, "sandbox")) == 5
+    assert "p-9" not in sender.sent and "none" not in sender.sent
+
+
+def test_gone_connections_are_dropped(local_ws):
+    registry, sender = local_ws
+    registry.add("alive")
+    registry.add("closed")
+    sender.gone.add("closed")
+    assert ws_publisher.publish([{"source": "test"}])["gone"] == 1
+    assert set(registry.connections()) == {"alive"}
+
+
+def test_nothing_is_published_without_a_websocket_stage(monkeypatch):
+    ws_publisher.configure()
+    monkeypatch.delenv("WS_CALLBACK_URL", raising=False)
+    assert ws_publisher.publish([{"source": "test"}]) == {"connections": 0, "messages": 0, "gone": 0}
+
+
+def test_tool_events_reach_subscribers_after_the_flush(fake_backend):
+    connections = fake_backend.dynamodb.create_table("IPO-WsConnections", "connectionId")
+    registry, sender = ws_publisher.DynamoRegistry(connections), ws_publisher.MemorySender()
+    ws_publisher.configure(registry, sender)
+    try:
+        registry.add("c-1", patch_ids=["p-1"])
+        registry.add("c-2", sources="cve_ingest")
+        fake_backend.load("PATCHES_TABLE_NAME", [{"patchId": "p-1", "status": "PENDING", "severity": "HIGH"}])
+
+        tools.prioritize_patch("CVE-1")
+        assert sender.sent == {}  # still buffered
+        event_buffer.flush()
+        event_buffer.wait_published()
+
+        assert [e["source"] for e in pushed(sender, "c-1")] == ["prioritize"]
+        assert "c-2" not in sender.sent
+    finally:
+        ws_publisher.configure()
+
+
+def test_dynamo_registry_scans_once_per_cache_window(fake_backend):
+    connections = fake_backend.dynamodb.create_table("IPO-WsConnections", "connectionId")
+    now = [0.0]
+    registry = ws_publisher.DynamoRegistry(connections, cache_seconds=5, clock=lambda: now[0])
+    registry.add("c-1")
+    fake_backend.faults.reset_counters()
+
+    assert set(registry.connections()) == {"c-1"}
+    registry.add("c-2", sources="sandbox")
+    registry.remove("c-1")
+    assert registry.connections() == {"c-2": {"sources": {"sandbox"}, "patchIds": set()}}
+    assert fake_backend.faults.stats()["calls"]["dynamodb.Scan"] == 1
+
+    now[0] = 5
+    registry.connections()
+    assert fake_backend.faults.stats()["calls"]["dynamodb.Scan"] == 2